@@ -23,6 +23,7 @@ SPDX-License-Identifier: GPL-3.0-or-later
 
 import os
 import argparse
+from concurrent.futures.thread import ThreadPoolExecutor
 from src.main.PRINS import PRINS
 from src.utils.common import common_logger
 
@@ -54,12 +55,18 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
+    # the pdf file of m_sys is rendered in the background while m_sys is post-processed
+    pdf_executor = ThreadPoolExecutor(max_workers=1) if args.save_pdf else None
+
     instance = PRINS(args.system, args.structured_log_csv, os.path.join(args.output_dir, args.system))
     m_sys, _, _, _ = instance.run(mint_timeout=args.timeout,
                                   ignore_values=args.ignore_values,
                                   save_pdf=args.save_pdf,
                                   num_workers=args.num_workers,
-                                  use_pickle=args.use_pickle)
+                                  use_pickle=args.use_pickle,
+                                  pdf_executor=pdf_executor)
     if args.det != 'none':
         PRINS.postprocess(m_sys, determinize_technique=args.det)
+    if pdf_executor:
+        pdf_executor.shutdown()
     logger.info('run_PRINS ends without error(s).')
@@ -21,15 +21,62 @@ SPDX-FileCopyrightText: 2021 University of Luxembourg
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 
-import copy
+import ast
+import sys
+import numpy as np
 from typing import Set, Dict
-from natsort import natsorted
-from src.automata.automata_utils import save_pdf, evaluate
+from src.automata.automata_utils import save_pdf, select_guard, index_transitions, natural_sorted
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+def _dfa_walk(columns: dict, curr_state: int, l_vector: list) -> int:
+    """
+    Walk the compiled transitions of a DFA (see DFA.compile_table()) along l_vector.
+
+    :param columns: tid -> a list indexed by state id of either dst_id (unguarded), a pair of (guards, dst_ids)
+                    candidates (guarded), or None (no transition)
+    :param curr_state: id of the starting state
+    :param l_vector: a sequence of log entries
+    :return: id of the last state; -1 if l_vector cannot be walked through
+    """
+    for e in l_vector:
+        column = columns.get(e['tid'])
+        if column is None:
+            return -1
+        target = column[curr_state]
+        if type(target) is int:
+            curr_state = target
+            continue
+        if target is None:
+            return -1
+
+        guards, dsts = target
+        i = select_guard(guards, e['values'])
+        if i < 0:
+            # same as make_guarded_transition(ignore_guard=True); to bypass the bug of MINT
+            i = 0
+            logger.warning(f'DFA.check_acceptance() with ignore_guard=True; bypassing the bug of MINT')
+            print(f'WARNING: DFA.check_acceptance() with ignore_guard=True; bypassing the bug of MINT')
+        curr_state = dsts[i]
+    return curr_state
+
+
+def _dfa_walk_unguarded(columns: dict, curr_state: int, l_vector: list) -> int:
+    """
+    Same as _dfa_walk(), but for the columns of a DFA without guards (i.e., every entry is either dst_id or None).
+    """
+    for e in l_vector:
+        column = columns.get(e['tid'])
+        if column is None:
+            return -1
+        curr_state = column[curr_state]
+        if curr_state is None:
+            return -1
+    return curr_state
+
+
 class DFA:
     """
     A Guarded Finite State Machine (gFSM) model in the form of Deterministic Finite Automaton (DFA).
@@ -40,17 +87,52 @@ class DFA:
     accepting_states: Set[str]
     transitions: Dict  # (state, (tid, gid)) -> state
 
-    def __init__(self, component: str, ext_dfa: Dict):
+    def __init__(self, component: str, ext_dfa: Dict, own: bool = False):
+        """
+        :param component: component name
+        :param ext_dfa: dict of alphabet, states, initial_state, accepting_states, and transitions
+        :param own: (optional, default=False) take over the containers in ext_dfa instead of copying them;
+                    only for callers that build ext_dfa for this instance and do not use it afterwards
+        """
         # basic info
         self.component = component
 
         # guarded FSM
-        ext_dfa = copy.deepcopy(ext_dfa)
-        self.alphabet = ext_dfa['alphabet']
-        self.states = ext_dfa['states']
+        # NOTE: states and words are immutable (str and tuple), so copying the containers is enough
+        self.alphabet = ext_dfa['alphabet'] if own else set(ext_dfa['alphabet'])
+        self.states = ext_dfa['states'] if own else set(ext_dfa['states'])
         self.initial_state = ext_dfa['initial_state']
-        self.accepting_states = ext_dfa['accepting_states']
-        self.transitions = ext_dfa['transitions']
+        self.accepting_states = ext_dfa['accepting_states'] if own else set(ext_dfa['accepting_states'])
+        self.transitions = ext_dfa['transitions'] if own else dict(ext_dfa['transitions'])
+
+        # int ids of states, stable for the lifetime of the states (i.e., until they are renamed)
+        self._state_ids = dict()
+
+        # lookup structures derived from transitions; built on demand and reset whenever transitions change
+        self._reset_derived()
+
+    def _reset_derived(self):
+        self._index = None  # (state, tid) -> [(guard, dst), ...]
+        self._trans = None  # dense table (state id, tid id) -> cell id; see compile_table()
+        self._tid_ids = self._cells = self._columns = self._dst = self._accept = self._accept_array = None
+
+    def compact(self):
+        """
+        Drop the lookup structures derived from transitions (e.g., after a batch of acceptance checks);
+        they are rebuilt on demand.
+
+        :return: None
+        """
+        self._state_ids = dict()
+        self._reset_derived()
+
+    def __getstate__(self):
+        # do not pickle the derived lookup structures (e.g., when a model is sent to a worker process)
+        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compact()
 
     def dfa_check_acceptance(self, l_vector: list):
         """
@@ -63,18 +145,94 @@ class DFA:
 
         logger.debug('DFA.check_acceptance()')
 
-        curr_state = self.initial_state
-        for e in l_vector:
-            next_state = self.make_guarded_transition(curr_state, e)
-            if next_state is None:
-                next_state = self.make_guarded_transition(curr_state, e, ignore_guard=True)
-                if next_state is None:
-                    return False
-                else:
-                    logger.warning(f'DFA.check_acceptance() with ignore_guard=True; bypassing the bug of MINT')
-                    print(f'WARNING: DFA.check_acceptance() with ignore_guard=True; bypassing the bug of MINT')
-            curr_state = next_state
-        return curr_state in self.accepting_states
+        if self._trans is None:
+            self.compile_table()
+        walk = _dfa_walk if self._dst is None else _dfa_walk_unguarded
+        curr_state = walk(self._columns, self._state_ids[self.initial_state], l_vector)
+        return curr_state >= 0 and self._accept[curr_state]
+
+    def batch_check_acceptance(self, l_vectors: list) -> np.ndarray:
+        """
+        Check the acceptance of many l_vectors at once.
+        If the model has no guards, all l_vectors are walked together, one numpy gather per position;
+        otherwise, each l_vector is checked by dfa_check_acceptance().
+
+        :param l_vectors: a list of l_vectors
+        :return: np.ndarray of bool (True if the corresponding l_vector is accepted)
+        """
+
+        if self._trans is None:
+            self.compile_table()
+        if self._dst is None:
+            return np.array([self.dfa_check_acceptance(l_vector) for l_vector in l_vectors], dtype=bool)
+
+        # translate l_vectors into tid ids once; unknown tids (and padding) go to the last column of self._dst
+        unknown = len(self._tid_ids)
+        lens = np.array([len(l_vector) for l_vector in l_vectors], dtype=np.int64)
+        syms = np.full((len(l_vectors), lens.max(initial=0)), unknown, dtype=np.int32)
+        for i, l_vector in enumerate(l_vectors):
+            syms[i, :lens[i]] = [self._tid_ids.get(e['tid'], unknown) for e in l_vector]
+
+        states = np.full(len(l_vectors), self._state_ids[self.initial_state], dtype=np.int32)
+        alive = np.ones(len(l_vectors), dtype=bool)
+        for t in range(syms.shape[1]):
+            active = alive & (t < lens)
+            next_states = self._dst[states, syms[:, t]]
+            alive &= ~active | (next_states >= 0)
+            states = np.where(active & alive, next_states, states)
+        return alive & self._accept_array[states]
+
+    def compile_table(self):
+        """
+        Compile the transitions into a dense table for acceptance checking.
+        States and tids are numbered by int ids; `self._trans[state_id, tid_id]` is the id of a cell in `self._cells`
+        (-1 if there is no transition), and each cell is a tuple of (guard, dst_id) in the order of transitions.
+
+        :return: None (internally update the table)
+        """
+        for state in self.states:
+            self.state_id(state)
+        self._tid_ids = dict()
+        for _, (tid, _) in self.transitions.keys():
+            self._tid_ids.setdefault(tid, len(self._tid_ids))
+
+        self._trans = np.full((len(self._state_ids), len(self._tid_ids)), -1, dtype=np.int32)
+        self._cells = []
+        for (src, tid), candidates in self.transition_index().items():
+            self._trans[self.state_id(src), self._tid_ids[tid]] = len(self._cells)
+            self._cells.append(tuple((guard, self.state_id(dst)) for guard, dst in candidates))
+        self._accept = [False] * len(self._state_ids)
+        for state in self.accepting_states:
+            self._accept[self.state_id(state)] = True
+
+        # specialize the table for the walk: one column per tid, where unguarded cells are resolved to dst_id
+        # NOTE: plain lists are cheaper than numpy scalar indexing in an interpreted loop
+        self._columns = dict()
+        for tid, tid_id in self._tid_ids.items():
+            column = [None] * len(self._state_ids)
+            for state_id, cell_id in enumerate(self._trans[:, tid_id].tolist()):
+                if cell_id >= 0:
+                    cell = self._cells[cell_id]
+                    column[state_id] = cell[0][1] if len(cell) == 1 and cell[0][0] is None else \
+                        (tuple(guard for guard, _ in cell), tuple(dst for _, dst in cell))
+            self._columns[tid] = column
+
+        # without guards, (state id, tid id) determines dst_id directly; the last column is for unknown tids
+        self._dst = self._accept_array = None
+        if all(len(cell) == 1 and cell[0][0] is None for cell in self._cells):
+            self._dst = np.full((len(self._state_ids), len(self._tid_ids) + 1), -1, dtype=np.int32)
+            has_cell = self._trans >= 0
+            self._dst[:, :-1][has_cell] = [self._cells[cell_id][0][1] for cell_id in self._trans[has_cell]]
+            self._accept_array = np.array(self._accept, dtype=bool)  # self._accept for the vectorized walk
+
+    def state_id(self, state: str) -> int:
+        """
+        Return the int id of a state, assigning a new one if the state has none yet.
+
+        :param state: state name
+        :return: id of the state
+        """
+        return self._state_ids.setdefault(state, len(self._state_ids))
 
     def make_guarded_transition(self, source_state: str, log_entry: dict, ignore_guard=False):
         """
@@ -86,64 +244,52 @@ class DFA:
         :return: destination state; None if there is no available destination state
         """
         # get the next state with the caused label and guards
-        for (state, (tid, guard)) in self.transitions.keys():
-            if state == source_state and log_entry['tid'] == tid:
-                if guard is None or ignore_guard or evaluate(guard, log_entry['values']):
-                    return self.transitions[(state, (tid, guard))]
-        return None
+        candidates = self.transition_index().get((source_state, log_entry['tid']))
+        if not candidates:
+            return None
+        i = 0 if ignore_guard else select_guard(tuple(guard for guard, _ in candidates), log_entry['values'])
+        return candidates[i][1] if i >= 0 else None
+
+    def transition_index(self) -> dict:
+        """
+        Return the transitions indexed by (state, tid), building the index if needed.
+
+        :return: dict (key: (state, tid), value: a list of (guard, dst))
+        """
+        if self._index is None:
+            self._index = index_transitions(self.transitions)
+        return self._index
 
     def shorten_states(self, consider_set_names=False):
         """
         Shorten state names, similar to NFA.rename_states().
 
+        :param consider_set_names: (optional, default=False) Specify whether the states are sets of states, given
+                                   either as their str (e.g., "{'s0', 's1'}") or as frozensets
         :return:
         """
 
         logger.debug('shorten_states()')
 
-        # reorder states when consider_set_names==True
+        # parse each state name exactly once when consider_set_names==True (e.g., "{'s1', 's0'}" -> "['s0', 's1']");
+        # states that are already sets (e.g., frozenset({'s0', 's1'})) are used as they are
         if consider_set_names:
-            states = set()
-            for state in self.states:
-                state = natsorted(eval(state))
-                states.add(str(state))
+            canonical = {state: str(natural_sorted(ast.literal_eval(state) if isinstance(state, str) else state))
+                         for state in self.states}
         else:
-            states = self.states
-
-        # build rename map
-        states_list = natsorted(states)
-        rename_map = dict()
-        for i in range(len(states_list)):
-            if consider_set_names:
-                state = frozenset(eval(states_list[i]))
-            else:
-                state = states_list[i]
-            rename_map[state] = str(i)
+            canonical = {state: state for state in self.states}
+
+        # build rename map; states that name the same set are renamed to the same state
+        states_list = natural_sorted(set(canonical.values()))
+        new_names = {name: sys.intern(str(i)) for i, name in enumerate(states_list)}
+        rename_map = {state: new_names[name] for state, name in canonical.items()}
 
         # NOTE: similar to `rename_states()` in NFA.py
-        new_states = set()
-        new_accepting_states = set()
+        new_initial_state = rename_map[self.initial_state]
+        new_states = set(rename_map.values())
+        new_accepting_states = {rename_map[state] for state in self.accepting_states}
         new_transitions = dict()
-        if consider_set_names:
-            initial_state = frozenset(eval(self.initial_state))
-        else:
-            initial_state = self.initial_state
-        new_initial_state = rename_map[initial_state]
-
-        for state in self.states:
-            if consider_set_names:
-                state = frozenset(eval(state))
-            new_states.add(rename_map[state])
-
-        for state in self.accepting_states:
-            if consider_set_names:
-                state = frozenset(eval(state))
-            new_accepting_states.add(rename_map[state])
-
         for (src, (tid, gid)), dst in self.transitions.items():
-            if consider_set_names:
-                src = frozenset(eval(src))
-                dst = frozenset(eval(dst))
             new_transitions[(rename_map[src], (tid, gid))] = rename_map[dst]
 
         logger.debug(f'rename_states (from={self.initial_state}, to={new_initial_state}), component={self.component}')
@@ -151,11 +297,14 @@ class DFA:
         self.accepting_states = new_accepting_states
         self.initial_state = new_initial_state
         self.transitions = new_transitions
+        self._state_ids = dict()  # all states are renamed
+        self._reset_derived()
 
-    def save_pdf(self, output_dir: str = './'):
+    def save_pdf(self, output_dir: str = './', executor=None):
         """
         Save the model into a pdf file
         :param output_dir: output directory
+        :param executor: (optional) executor to render the pdf file in the background (see automata_utils.save_pdf())
         :return: None (save a pdf file)
         """
-        save_pdf(self, 'DFA', output_dir)
+        save_pdf(self, 'DFA', output_dir, executor=executor)
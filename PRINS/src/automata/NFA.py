@@ -21,13 +21,13 @@ SPDX-FileCopyrightText: 2021 University of Luxembourg
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 
+import sys
 import time
-import copy
-from natsort import natsorted
+from collections import deque
 from typing import Set, Dict, List
-from src.automata.DFA import DFA
-from src.automata.automata_utils import evaluate, save_pdf
-from PySimpleAutomata.NFA import nfa_determinization
+from src.automata.DFA import DFA, _dfa_walk_unguarded
+from src.automata.automata_utils import save_pdf, select_guard, index_transitions, intern_word, natural_key, \
+    natural_sorted, _natsort_key
 
 from config import STD_TIMEOUT
 from func_timeout import func_timeout
@@ -35,6 +35,9 @@ from func_timeout import func_timeout
 import logging
 logger = logging.getLogger(__name__)
 
+# nfa_check_acceptance(): the cached successor sets are dropped once there are more of them
+MAX_CACHED_LEVELS = 100000
+
 
 class NFA:
     """
@@ -46,17 +49,75 @@ class NFA:
     accepting_states: Set[str]
     transitions: Dict  # (state, (tid, guard)) -> Set of states
 
-    def __init__(self, component: str, ext_nfa: dict):
+    def __init__(self, component: str, ext_nfa: dict, own: bool = False):
+        """
+        :param component: component name
+        :param ext_nfa: dict of alphabet, states, initial_state, accepting_states, and transitions
+        :param own: (optional, default=False) take over the containers in ext_nfa instead of copying them;
+                    only for callers that build ext_nfa for this instance and do not use it afterwards
+        """
         # basic info
         self.component = component
 
         # guarded FSM
-        ext_nfa = copy.deepcopy(ext_nfa)
-        self.alphabet = ext_nfa['alphabet']
-        self.states = ext_nfa['states']
+        # NOTE: states and words are immutable (str and tuple), so copying the containers is enough
+        self.alphabet = ext_nfa['alphabet'] if own else set(ext_nfa['alphabet'])
+        self.states = ext_nfa['states'] if own else set(ext_nfa['states'])
         self.initial_state = ext_nfa['initial_state']
-        self.accepting_states = ext_nfa['accepting_states']
-        self.transitions = ext_nfa['transitions']
+        self.accepting_states = ext_nfa['accepting_states'] if own else set(ext_nfa['accepting_states'])
+        if own:
+            self.transitions = ext_nfa['transitions']
+        else:
+            self.transitions = {k: set(dst_states) for k, dst_states in ext_nfa['transitions'].items()}
+
+        # int ids of states, stable for the lifetime of the states (i.e., until they are renamed)
+        self._state_ids = dict()
+
+        # lookup structures derived from transitions; built on demand and reset whenever transitions change
+        self._reset_derived()
+
+    def _reset_derived(self):
+        self._index = None  # (state, tid) -> [(guard, dst_states), ...]
+        self._steps = None  # (state, tid) -> (dst_state, word) or [(guard, dst_states), ...]; see compile_steps()
+        self._guards = None  # (state, tid) -> (guards, words); see compile_steps()
+        self._succ = None  # tid -> state id -> (guards, dst_masks); see compile_masks()
+        self._sources = None  # tid -> mask of the states having an outgoing transition with the tid (guards ignored)
+        self._levels = dict()  # (tid, mask of states) -> mask of successor states, for unguarded steps only
+        self._columns = None  # tid -> state id -> dst_id (or None) if deterministic without guards; see compile_masks()
+        self._non_det_keys = None  # keys of non-deterministic transitions; see non_deterministic_keys()
+
+    def compact(self):
+        """
+        Drop the lookup structures derived from transitions (e.g., after a batch of acceptance checks);
+        they are rebuilt on demand.
+
+        :return: None
+        """
+        self._state_ids = dict()
+        self._reset_derived()
+
+    def __getstate__(self):
+        # do not pickle the derived lookup structures (e.g., when a model is sent to a worker process)
+        return {k: v for k, v in self.__dict__.items() if not k.startswith('_')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compact()
+
+    def own_copy(self) -> 'NFA':
+        """
+        Return a copy of self that shares no containers with self (cheaper than copy.deepcopy()).
+
+        :return: NFA
+        """
+        ext_nfa = {
+            'alphabet': self.alphabet,
+            'states': self.states,
+            'initial_state': self.initial_state,
+            'accepting_states': self.accepting_states,
+            'transitions': self.transitions
+        }
+        return NFA(component=self.component, ext_nfa=ext_nfa)  # NOTE: the constructor copies the containers
 
     def __str__(self):
         return f'alphabet={self.alphabet}\n' \
@@ -77,11 +138,47 @@ class NFA:
         """
 
         # get the next state with the caused label and guards
-        for (state, (tid, guard)) in self.transitions.keys():
-            if state == source_state and log_entry['tid'] == tid:
-                if guard is None or ignore_guard or evaluate(guard, log_entry['values']):
-                    return self.transitions[(state, (tid, guard))], (tid, guard)
-        return None, None
+        tid = log_entry['tid']
+        candidates = self.transition_index().get((source_state, tid))
+        if not candidates:
+            return None, None
+        if self._steps is None:
+            self.compile_steps()
+        guards, words = self._guards[(source_state, tid)]
+        i = 0 if ignore_guard else select_guard(guards, log_entry['values'])
+        if i < 0:
+            return None, None
+        return candidates[i][1], words[i]
+
+    def transition_index(self) -> dict:
+        """
+        Return the transitions indexed by (state, tid), building the index if needed.
+
+        :return: dict (key: (state, tid), value: a list of (guard, dst_states))
+        """
+        if self._index is None:
+            self._index = index_transitions(self.transitions)
+        return self._index
+
+    def compile_steps(self):
+        """
+        Compile the transitions for walking the model deterministically (see slice()): `self._steps[(state, tid)]` is
+        (dst_state, (tid, None)) if there is a single unguarded transition to a single state, and the list of
+        (guard, dst_states) of transition_index() otherwise; for the latter, `self._guards[(state, tid)]` is the pair of
+        the guards and the words (tid, guard) of the candidates for nfa_guarded_transition().
+
+        :return: None (internally update the steps)
+        """
+        self._steps = dict()
+        self._guards = dict()
+        for (src, tid), candidates in self.transition_index().items():
+            guard, dst_states = candidates[0]
+            if len(candidates) == 1 and guard is None and len(dst_states) == 1:
+                self._steps[(src, tid)] = (next(iter(dst_states)), intern_word((tid, None)))
+            else:
+                self._steps[(src, tid)] = candidates
+            self._guards[(src, tid)] = (tuple(guard for guard, _ in candidates),
+                                        tuple(intern_word((tid, guard)) for guard, _ in candidates))
 
     def slice(self, l_vector: list, slice_starting_states: dict) -> 'NFA':
         """Slice a model with respect to the given l_vector.
@@ -93,8 +190,9 @@ class NFA:
         :return: a sliced NFA
         """
 
-        logger.debug(f'slice(l_vector={l_vector})')
-        logger.debug(f'initial_state_slice={slice_starting_states[self]}')
+        if logger.isEnabledFor(logging.DEBUG):  # called many times in stitching
+            logger.debug(f'slice(l_vector={l_vector})')
+            logger.debug(f'initial_state_slice={slice_starting_states[self]}')
 
         # initialize
         sliced_nfa = {
@@ -106,9 +204,25 @@ class NFA:
         }
 
         # do the slice
+        if self._steps is None:
+            self.compile_steps()
+        steps = self._steps
+        visited = set()  # unguarded steps already added to the sliced model
         curr_state = slice_starting_states[self]
         sliced_nfa['states'].add(curr_state)
         for e in l_vector:
+            key = (curr_state, e['tid'])
+            step = steps.get(key)
+            if type(step) is tuple:  # a single unguarded transition to a single state
+                next_state, word = step
+                if key not in visited:
+                    visited.add(key)
+                    sliced_nfa['states'].add(next_state)
+                    sliced_nfa['alphabet'].add(word)
+                    sliced_nfa['transitions'].setdefault((curr_state, word), set()).add(next_state)
+                curr_state = next_state
+                continue
+
             next_states, word = self.nfa_guarded_transition(curr_state, e)
 
             if next_states is None:
@@ -125,19 +239,16 @@ class NFA:
                     print(f'WARNING: NFA.slice() with ignore_guard=True; bypassing the bug of MINT')
 
             assert len(next_states) < 2  # this is because MINT's output is DFA in principle
-            next_state = natsorted(next_states)[0]
+            next_state = next(iter(next_states)) if len(next_states) == 1 else natural_sorted(next_states)[0]
 
             sliced_nfa['states'].add(next_state)
             sliced_nfa['alphabet'].add(word)
-            if (curr_state, word) in sliced_nfa['transitions'].keys():
-                sliced_nfa['transitions'][(curr_state, word)].add(next_state)
-            else:
-                sliced_nfa['transitions'][(curr_state, word)] = {next_state}
+            sliced_nfa['transitions'].setdefault((curr_state, word), set()).add(next_state)
             curr_state = next_state
 
         sliced_nfa['accepting_states'].add(curr_state)
         slice_starting_states[self] = curr_state
-        return NFA(component=self.component, ext_nfa=sliced_nfa)
+        return NFA(component=self.component, ext_nfa=sliced_nfa, own=True)
 
     def append(self, nfa: 'NFA'):
         """
@@ -150,7 +261,8 @@ class NFA:
         :return: (update self)
         """
 
-        logger.debug(f'append(nfa={nfa})')
+        if logger.isEnabledFor(logging.DEBUG):  # called many times in stitching
+            logger.debug(f'append(nfa={nfa})')
 
         # accepting_states check
         assert len(self.accepting_states) == 1
@@ -166,13 +278,14 @@ class NFA:
         self.accepting_states = nfa.accepting_states
 
         # states
-        self.states = self.states.union(nfa.states)
+        self.states.update(nfa.states)
 
         # alphabet
-        self.alphabet = self.alphabet.union(nfa.alphabet)
+        self.alphabet.update(nfa.alphabet)
 
         # transitions
-        self.transitions = {**self.transitions, **nfa.transitions}
+        self.transitions.update(nfa.transitions)
+        self._reset_derived()
 
         # merge s_x (self.accepting_states) and s_y (model.initial_state)
         self.merge_states({s_x, nfa.initial_state})
@@ -192,9 +305,10 @@ class NFA:
         for s in merge_states:
             assert s in self.states
 
-        logger.debug(f'merge_states: {merge_states}')
+        if logger.isEnabledFor(logging.DEBUG):  # called many times in stitching
+            logger.debug(f'merge_states: {merge_states}')
 
-        s_m = ','.join(natsorted(merge_states))  # TODO: how to shorten this?
+        s_m = sys.intern(','.join(natural_sorted(merge_states)))  # TODO: how to shorten this?
 
         # check initial_state
         if any(s == self.initial_state for s in merge_states):
@@ -209,22 +323,25 @@ class NFA:
             self.states.remove(s)
         self.states.add(s_m)
 
-        # redirect transitions
+        # redirect transitions in a single pass; the destination sets without merged states are kept as they are
+        # NOTE: the kept sets may be shared with another model (see append()), so they are never updated in place
         new_transitions = dict()
+        non_det_keys = dict()
         for (src, word), dst_set in self.transitions.items():  # for each transition
             if src in merge_states:  # update source state
                 src = s_m
-            if merge_states.intersection(dst_set):  # update destination state
+            if not merge_states.isdisjoint(dst_set):  # update destination state
                 dst_set = dst_set - merge_states
                 dst_set.add(s_m)
-
-            # update new_transitions
-            if (src, word) in new_transitions.keys():
-                new_transitions[(src, word)] = new_transitions[(src, word)].union(dst_set)
-            else:
-                new_transitions[(src, word)] = dst_set
+            key = (src, word)
+            new_dst_set = new_transitions.get(key)
+            new_dst_set = new_transitions[key] = dst_set if new_dst_set is None else new_dst_set | dst_set
+            if len(new_dst_set) > 1:
+                non_det_keys[key] = None
         # end of for loop
         self.transitions = new_transitions
+        self._reset_derived()
+        self._non_det_keys = non_det_keys
 
         # return the merged_state
         return s_m
@@ -240,44 +357,64 @@ class NFA:
         assert type(padding) == int
 
         # build rename map
-        states_list = natsorted(self.states)
-        rename_map = dict()
-        for i in range(len(states_list)):
-            rename_map[states_list[i]] = str(i + padding)
-
-        new_states = set()
-        new_accepting_states = set()
-        new_transitions = dict()
+        rename_map = {state: sys.intern(str(i)) for i, state in enumerate(natural_sorted(self.states), start=padding)}
         new_initial_state = rename_map[self.initial_state]
+        new_states = set(rename_map.values())
+        new_accepting_states = {rename_map[state] for state in self.accepting_states}
 
-        for state in self.states:
-            new_states.add(rename_map[state])
-
-        for state in self.accepting_states:
-            new_accepting_states.add(rename_map[state])
-
-        for (src, (tid, gid)), dst_set in self.transitions.items():
-            for dst in dst_set:
-                if (rename_map[src], (tid, gid)) in new_transitions.keys():
-                    new_transitions[(rename_map[src], (tid, gid))].add(rename_map[dst])
-                else:
-                    new_transitions[(rename_map[src], (tid, gid))] = {rename_map[dst]}
+        # renaming is one-to-one, so no two transitions are renamed to the same key and the non-deterministic
+        # transitions are found along the way (in the same order as non_deterministic_keys() would find them)
+        new_transitions = {(rename_map[src], word): {rename_map[dst] for dst in dst_set}
+                           for (src, word), dst_set in self.transitions.items()}
+        non_det_keys = {k: None for k, dst_set in new_transitions.items() if len(dst_set) > 1}
 
         logger.debug(f'rename_states (from={self.initial_state}, to={new_initial_state}), component={self.component}')
         self.states = new_states
         self.accepting_states = new_accepting_states
         self.initial_state = new_initial_state
         self.transitions = new_transitions
+        self._state_ids = dict()  # all states are renamed
+        self._reset_derived()
+        if all(self.transitions.values()):  # otherwise, let non_deterministic_keys() report the empty transitions
+            self._non_det_keys = non_det_keys
+
+    def remove_unreachable_states(self):
+        """
+        Remove the states unreachable from the initial state (with their transitions) and the transitions without
+        dst_states, which subset construction does not consider either.
 
-    def save_pdf(self, output_dir: str = './', label_dict: dict = None):
+        :return: None
+        """
+        successors = dict()
+        for (src, word), dst_states in self.transitions.items():
+            successors.setdefault(src, set()).update(dst_states)
+        reachable = {self.initial_state}
+        working_stack = [self.initial_state]
+        while working_stack:
+            for dst_state in successors.get(working_stack.pop(), ()):
+                if dst_state not in reachable:
+                    reachable.add(dst_state)
+                    working_stack.append(dst_state)
+
+        if len(reachable) == len(self.states) and all(self.transitions.values()):
+            return  # nothing to remove
+        self.states = self.states.intersection(reachable)
+        self.accepting_states = self.accepting_states.intersection(reachable)
+        self.transitions = {(src, word): dst_states for (src, word), dst_states in self.transitions.items()
+                            if dst_states and src in reachable}
+        self._state_ids = dict()  # some states are removed
+        self._reset_derived()
+
+    def save_pdf(self, output_dir: str = './', label_dict: dict = None, executor=None):
         """
         Save the model into a pdf file.
 
         :param output_dir: output directory
         :param label_dict: to change label - from tid to SOMETHING
+        :param executor: (optional) executor to render the pdf file in the background (see automata_utils.save_pdf())
         :return: None (save a pdf file)
         """
-        save_pdf(self, 'NFA', output_dir, label_dict=label_dict)
+        save_pdf(self, 'NFA', output_dir, label_dict=label_dict, executor=executor)
 
     def check_and_remove_redundant_states(self, nfa: 'NFA'):
         """
@@ -287,10 +424,11 @@ class NFA:
         :return: (Internally update nfa)
         """
 
-        logger.debug(f'check_and_remove_redundant_states(nfa={nfa})')
+        if logger.isEnabledFor(logging.DEBUG):  # called many times in stitching
+            logger.debug(f'check_and_remove_redundant_states(nfa={nfa})')
 
         if self.states.intersection(nfa.states):
-            max_state = natsorted(list(self.states))[-1].split(',')[-1]  # guaranteed max_state in self
+            max_state = max(self.states, key=natural_key).split(',')[-1]  # guaranteed max_state in self
             nfa.rename_states(int(max_state) + 1)
         assert not self.states.intersection(nfa.states)  # assert: no intersection
 
@@ -312,41 +450,52 @@ class NFA:
         logger.debug(f'union_nfa_models(len(models)={len(models)}, system={system})')
         start_time = time.time()
 
-        # rename states per model
+        # rename the states of each model by consecutive ids (as `rename_states()` does)
+        rename_maps = []
         starting_state_index = 0
         for model in models:
-            model.rename_states(padding=starting_state_index)
-            starting_state_index += len(model.states)
+            rename_maps.append({state: sys.intern(str(i)) for i, state in
+                                enumerate(natural_sorted(model.states), start=starting_state_index)})
+            starting_state_index += len(rename_maps[-1])
+
+        # all initial states are merged (as `merge_states()` does), which is done along with the renaming so that the
+        # transitions are rewritten only once; the given models are left unchanged
+        initial_states = {rename_map[model.initial_state] for model, rename_map in zip(models, rename_maps)}
+        assert len(initial_states) > 1
+        s_m = sys.intern(','.join(natural_sorted(initial_states)))
+        for model, rename_map in zip(models, rename_maps):
+            rename_map[model.initial_state] = s_m
+
+        # accumulate everything directly into the resulting containers
+        alphabet = set()
+        states = set()
+        accepting_states = set()
+        transitions = dict()
+        non_det_keys = dict()
+        for model, rename_map in zip(models, rename_maps):
+            alphabet.update(model.alphabet)
+            states.update(rename_map.values())
+            accepting_states.update(rename_map[state] for state in model.accepting_states)
+            for (src, word), dst_set in model.transitions.items():
+                key = (rename_map[src], word)
+                new_dst_set = transitions.get(key)
+                if new_dst_set is None:
+                    new_dst_set = transitions[key] = {rename_map[dst] for dst in dst_set}
+                else:  # from the initial states of different models
+                    new_dst_set.update(rename_map[dst] for dst in dst_set)
+                if len(new_dst_set) > 1:
+                    non_det_keys[key] = None
 
         # initialize output model
         nfa = {
-            'alphabet': set(),
-            'states': set(),
-            'initial_state': None,
-            'accepting_states': set(),
-            'transitions': dict()
+            'alphabet': alphabet,
+            'states': states,
+            'initial_state': s_m,
+            'accepting_states': accepting_states,
+            'transitions': transitions
         }
-        resulting_model = NFA(component=system, ext_nfa=nfa)
-
-        initial_states = set()
-        for model in models:
-            # alphabet
-            resulting_model.alphabet = resulting_model.alphabet.union(model.alphabet)
-
-            # states
-            resulting_model.states = resulting_model.states.union(model.states)
-
-            # initial states (collect all initial states)
-            initial_states.add(model.initial_state)
-
-            # accepting states
-            resulting_model.accepting_states = resulting_model.accepting_states.union(model.accepting_states)
-
-            # transitions
-            resulting_model.transitions = {**resulting_model.transitions, **model.transitions}
-
-        # merge all initial states
-        resulting_model.initial_state = resulting_model.merge_states(initial_states)
+        resulting_model = NFA(component=system, ext_nfa=nfa, own=True)
+        resulting_model._non_det_keys = non_det_keys
 
         # slice_starting_state (to be complete ...)
         resulting_model.slice_starting_state = resulting_model.initial_state
@@ -365,22 +514,96 @@ class NFA:
 
         logger.debug('NFA.check_acceptance()')
 
-        current_level = {self.initial_state}
-        next_level = set()
+        if self._succ is None:
+            self.compile_masks()
+        if self._columns is not None:  # deterministic without guards: a single current state
+            curr_state = _dfa_walk_unguarded(self._columns, self._state_ids[self.initial_state], l_vector)
+            return curr_state >= 0 and (self._accept_mask >> curr_state) & 1 == 1
+        succ = self._succ
+        sources = self._sources
+        levels = self._levels
+        if len(levels) > MAX_CACHED_LEVELS:
+            levels.clear()
+
+        # the set of current states is a bitset over state ids
+        current_level = 1 << self._state_ids[self.initial_state]
         for e in l_vector:
-            for src_state in current_level:
-                dst_states, _ = self.nfa_guarded_transition(src_state, e)
-                if dst_states:
-                    next_level.update(dst_states)
-            if len(next_level) < 1:
+            tid = e['tid']
+            next_level = levels.get((tid, current_level))
+            if next_level is None:
+                if not sources.get(tid, 0) & current_level:  # rejected without evaluating any guard
+                    return False
+                per_src = succ[tid]
+                next_level = 0
+                guarded = False
+                level = current_level
+                while level:
+                    low = level & -level
+                    level ^= low
+                    candidates = per_src[low.bit_length() - 1]
+                    if type(candidates) is int:  # unguarded (or no) transition; no need to look at the values
+                        next_level |= candidates
+                        continue
+                    # same as nfa_guarded_transition(): the first satisfied guard wins
+                    guarded = True
+                    guards, dst_masks = candidates
+                    i = select_guard(guards, e['values'])
+                    if i >= 0:
+                        next_level |= dst_masks[i]
+                if not guarded:  # the successors depend only on the states and the tid
+                    levels[(tid, current_level)] = next_level
+            if not next_level:
                 return False
             current_level = next_level
-            next_level = set()
 
-        if current_level.intersection(self.accepting_states):
-            return True
-        else:
-            return False
+        return (current_level & self._accept_mask) != 0
+
+    def compile_masks(self):
+        """
+        Compile the transitions into per-(state, tid) successor bitsets for acceptance checking.
+        States are numbered by int ids; `self._succ[tid][state_id]` is a pair of (guards, dst_masks) in the order of
+        transitions, where bit i of a dst_mask is set if the state of id i is a destination.
+        A single unguarded transition is stored as its dst_mask only (0 if there is no transition).
+        `self._sources[tid]` is the mask of the states having a transition with tid.
+
+        :return: None (internally update the masks)
+        """
+        for state in self.states:
+            self.state_id(state)
+        self._succ = dict()
+        self._sources = dict()
+        for (src, tid), candidates in self.transition_index().items():
+            per_src = self._succ.setdefault(tid, [0] * len(self._state_ids))
+            self._sources[tid] = self._sources.get(tid, 0) | (1 << self.state_id(src))
+            if len(candidates) == 1 and candidates[0][0] is None:
+                per_src[self.state_id(src)] = self._states_to_mask(candidates[0][1])
+            else:
+                per_src[self.state_id(src)] = (tuple(guard for guard, _ in candidates),
+                                               tuple(self._states_to_mask(dst_states) for _, dst_states in candidates))
+        self._accept_mask = self._states_to_mask(self.accepting_states)
+
+        # without guards and non-determinism, each (state, tid) has at most one destination; walk the state ids directly
+        self._columns = None
+        if all(type(dst_mask) is int and dst_mask & (dst_mask - 1) == 0
+               for per_src in self._succ.values() for dst_mask in per_src):
+            self._columns = {tid: [dst_mask.bit_length() - 1 if dst_mask else None for dst_mask in per_src]
+                             for tid, per_src in self._succ.items()}
+
+    def state_id(self, state: str) -> int:
+        """
+        Return the int id of a state, assigning a new one if the state has none yet.
+        Merged states get new ids while the other states keep theirs.
+
+        :param state: state name
+        :return: id of the state
+        """
+        return self._state_ids.setdefault(state, len(self._state_ids))
+
+    def _states_to_mask(self, states: set) -> int:
+        mask = 0
+        for state in states:
+            mask |= 1 << self.state_id(state)
+        return mask
 
     def find_non_deterministic_states(self, merge_count_per_state: dict = None, per_state_merge_limit: int = None):
         """Find a set of non-deterministic dst_states (NOTE: not necessarily starting from the initial state).
@@ -396,16 +619,100 @@ class NFA:
                 if count >= per_state_merge_limit:
                     excluding_dst_states.add(state)
 
-        for k in self.transitions.keys():
-            dst_states = self.transitions[k]
-            if len(dst_states - excluding_dst_states) > 1:
-                return dst_states - excluding_dst_states
-            elif len(dst_states) == 0:
-                logger.error(f'Empty Transition: from {k} to {dst_states}.')
-                exit(-1)
+        for k in self.non_deterministic_keys():
+            dst_states = self.transitions[k] - excluding_dst_states
+            if len(dst_states) > 1:
+                return dst_states
 
         return None
 
+    def non_deterministic_keys(self) -> dict:
+        """
+        Return the keys (state, word) of the transitions having more than one dst_states.
+        The keys are found by a full scan only once; merge_states() and merge_state_groups() keep them up to date.
+
+        :return: dict (key: (state, word), value: None) used as an ordered set
+        """
+        if self._non_det_keys is None:
+            self._non_det_keys = dict()
+            for k, dst_states in self.transitions.items():
+                if len(dst_states) > 1:
+                    self._non_det_keys[k] = None
+                elif len(dst_states) == 0:
+                    logger.error(f'Empty Transition: from {k} to {dst_states}.')
+                    exit(-1)
+        return self._non_det_keys
+
+    def find_all_non_deterministic_states(self) -> list:
+        """Find all groups of states to be merged to remove the non-determinism visible in a single scan.
+        Any two states in the same non-deterministic dst_states end up in the same group (using union-find).
+
+        :return: a list of groups (set of states), each of which has more than one state
+        """
+
+        parent = dict()
+
+        def find(state):
+            root = parent.setdefault(state, state)
+            while parent[root] != root:
+                root = parent[root]
+            while state != root:  # path compression
+                parent[state], state = root, parent[state]
+            return root
+
+        for k in self.non_deterministic_keys():
+            states = iter(self.transitions[k])
+            root = find(next(states))
+            for state in states:
+                other = find(state)
+                if other != root:
+                    parent[other] = root
+
+        groups = dict()
+        for state in parent:
+            groups.setdefault(find(state), set()).add(state)
+        return [group for group in groups.values() if len(group) > 1]
+
+    def merge_state_groups(self, groups: list):
+        """
+        Merge disjoint groups of states at once; same as calling merge_states() per group, but rewriting the
+        transitions only once.
+
+        :param groups: a list of disjoint sets of states
+        :return: a dict mapping each merged state to its merged state (s_m)
+        """
+
+        merged = dict()
+        for group in groups:
+            assert len(group) > 1
+            s_m = sys.intern(','.join(natural_sorted(group)))
+            for s in group:
+                assert s in self.states
+                merged[s] = s_m
+
+        logger.debug(f'merge_state_groups: {groups}')
+
+        self.initial_state = merged.get(self.initial_state, self.initial_state)
+        self.accepting_states = {merged.get(s, s) for s in self.accepting_states}
+        self.states = {merged.get(s, s) for s in self.states}
+
+        # redirect transitions (in a single pass, as in merge_states())
+        new_transitions = dict()
+        non_det_keys = dict()
+        for (src, word), dst_set in self.transitions.items():
+            key = (merged.get(src, src), word)
+            if not merged.keys().isdisjoint(dst_set):
+                dst_set = {merged.get(dst, dst) for dst in dst_set}
+            new_dst_set = new_transitions.get(key)
+            new_dst_set = new_transitions[key] = dst_set if new_dst_set is None else new_dst_set | dst_set
+            if len(new_dst_set) > 1:
+                non_det_keys[key] = None
+        self.transitions = new_transitions
+        self._reset_derived()
+        self._non_det_keys = non_det_keys
+
+        return merged
+
     def heuristic_determinize(self) -> 'DFA':
         """
         Heuristic NFA->DFA function (using state merges without considering transition order).
@@ -417,27 +724,29 @@ class NFA:
         logger.debug(f'heuristic_determinize() ...')
         start_time = time.time()
 
+        # merge all non-deterministic dst_states found in one scan at once, until no more non-determinism emerges
         count_merged_states = 0
         while True:
-            non_det_states = self.find_non_deterministic_states()
-            if non_det_states is None:
+            groups = self.find_all_non_deterministic_states()
+            if not groups:
                 break
             else:
-                self.merge_states(non_det_states)
-                count_merged_states += len(non_det_states)
+                self.merge_state_groups(groups)
+                count_merged_states += sum(len(group) for group in groups)
                 logger.debug(f'count_merged_states={count_merged_states}')
 
         # build an instance of DFA
+        # NOTE: shorten_states() below replaces states and accepting_states, so they are not shared afterwards
         ext_dfa = {
-            'alphabet': copy.deepcopy(self.alphabet),
-            'states': copy.deepcopy(self.states),
+            'alphabet': set(self.alphabet),
+            'states': self.states,
             'initial_state': self.initial_state,
-            'accepting_states': copy.deepcopy(self.accepting_states),
+            'accepting_states': self.accepting_states,
             'transitions': {}
         }
         for k, dst_states in self.transitions.items():
             ext_dfa['transitions'][k] = dst_states.pop()
-        dfa = DFA(component=self.component, ext_dfa=ext_dfa)
+        dfa = DFA(component=self.component, ext_dfa=ext_dfa, own=True)
         dfa.shorten_states(consider_set_names=False)
 
         execution_time = time.time() - start_time
@@ -470,16 +779,23 @@ class NFA:
             merge_count_per_state[state] = 0
 
         # start determinization from the initial state (using BFS-style)
-        working_set = [self.initial_state]
+        # NOTE: working_queue keeps the FIFO order and working_set the membership; merged states are removed from
+        # working_set only and skipped when they are popped from working_queue
+        working_queue = deque([self.initial_state])
+        working_set = {self.initial_state}
         visited = set()
         excluding_dst_states = set()
+        alphabet = natural_sorted(self.alphabet)  # merge_states() does not change the alphabet
 
-        while working_set:
-            curr = working_set.pop(0)
+        while working_queue:
+            curr = working_queue.popleft()
+            if curr not in working_set:
+                continue  # merged away after it was added
+            working_set.remove(curr)
             visited.add(curr)
 
-            for word in natsorted(self.alphabet):
-                if (curr, word) in self.transitions.keys():
+            for word in alphabet:
+                if (curr, word) in self.transitions:
                     # for each transition determined by (curr, word) from curr
                     dst_states = self.transitions[(curr, word)]
 
@@ -494,8 +810,7 @@ class NFA:
                             max_merged_count = max(merge_count_per_state.pop(merged_state) + 1, max_merged_count)
 
                             # remove merged_state previously added into working_set
-                            if merged_state in working_set:
-                                working_set.remove(merged_state)
+                            working_set.discard(merged_state)
                         merge_count_per_state[s_m] = max_merged_count
 
                         # update excluding_dst_states
@@ -503,14 +818,16 @@ class NFA:
                             excluding_dst_states.add(s_m)
 
                         # update working_set
-                        for dst_state in natsorted(dst_states.union({s_m}) - non_det_states):
+                        for dst_state in natural_sorted(dst_states.union({s_m}) - non_det_states):
                             if dst_state not in visited and dst_state not in working_set:
-                                working_set.append(dst_state)
+                                working_queue.append(dst_state)
+                                working_set.add(dst_state)
 
                     else:  # when len(dst_states - excluding_dst_states) <= 1
-                        for dst_state in natsorted(dst_states):
+                        for dst_state in natural_sorted(dst_states):
                             if dst_state not in visited and dst_state not in working_set:
-                                working_set.append(dst_state)
+                                working_queue.append(dst_state)
+                                working_set.add(dst_state)
 
         print(f'(hybrid) heuristic part done. [Time taken: {time.time() - start_time:.3f} sec]')
         logger.info(f'(hybrid) heuristic part done. [Time taken: {time.time() - start_time:.3f} sec]')
@@ -530,16 +847,8 @@ class NFA:
         logger.debug(f'standard_determinize() ...')
         start_time = time.time()
 
-        ext_nfa = {
-            'alphabet': self.alphabet,
-            'states': self.states,
-            'initial_states': {self.initial_state},
-            'accepting_states': self.accepting_states,
-            'transitions': self.transitions
-        }
-        ext_dfa = nfa_determinization(ext_nfa)  # NOTE: state names (orders) can vary randomly due to this function
-        dfa = DFA(component=self.component, ext_dfa=ext_dfa)
-        dfa.shorten_states(consider_set_names=True)
+        ext_dfa = self.subset_construction()  # NOTE: states are already shortened
+        dfa = DFA(component=self.component, ext_dfa=ext_dfa, own=True)
 
         execution_time = time.time() - start_time
         logger.info(f'standard_determinize(): '
@@ -549,3 +858,65 @@ class NFA:
                     f'transitions={len(dfa.transitions)}')
         print(f'done. [Time taken: {execution_time:.3f} sec]')
         return dfa
+
+    def subset_construction(self) -> dict:
+        """
+        Subset construction over the subsets reachable from the initial state only.
+        Each subset is hash-consed to an int id when first reached (BFS) and only the words leaving its states are
+        considered. The resulting states are named as `DFA.shorten_states(consider_set_names=True)` would name them,
+        i.e., by the natsorted order of the str of the natsorted subsets (e.g., "['s1', 's2']").
+
+        :return: dict (ext_dfa) of alphabet, states, initial_state, accepting_states, and transitions
+        """
+
+        # outgoing transitions per state; the destinations are frozen once, so that the successors of a single state
+        # are subsets as they are (with their hash computed once)
+        outgoing = dict()
+        for (src, word), dst_states in self.transitions.items():
+            if dst_states:
+                outgoing.setdefault(src, []).append((word, frozenset(dst_states)))
+
+        subset_ids = dict()  # subset (frozenset) -> id
+        subsets = []  # id -> subset
+        subset_transitions = []  # id -> [(word, dst id), ...]
+
+        def intern(subset):
+            subset_id = subset_ids.get(subset)
+            if subset_id is None:
+                subset_id = subset_ids[subset] = len(subsets)
+                subsets.append(subset)
+            return subset_id
+
+        intern(frozenset({self.initial_state}))
+        curr = 0
+        while curr < len(subsets):  # subsets[curr:] is the BFS queue
+            subset = subsets[curr]
+            if len(subset) == 1:
+                for state in subset:
+                    subset_transitions.append([(word, intern(dst_states))
+                                               for word, dst_states in outgoing.get(state, ())])
+            else:
+                next_subsets = dict()  # word -> set of dst_states
+                for state in subset:
+                    for word, dst_states in outgoing.get(state, ()):
+                        next_subsets.setdefault(word, set()).update(dst_states)
+                subset_transitions.append([(word, intern(frozenset(next_subset)))
+                                           for word, next_subset in next_subsets.items()])
+            curr += 1
+
+        # name the subsets
+        keys = [str(natural_sorted(subset)) for subset in subsets]
+        names = [''] * len(subsets)
+        for i, subset_id in enumerate(sorted(range(len(subsets)), key=lambda j: _natsort_key(keys[j]))):
+            names[subset_id] = sys.intern(str(i))
+
+        ext_dfa = {
+            'alphabet': set(self.alphabet),
+            'states': set(names),
+            'initial_state': names[0],
+            'accepting_states': {names[i] for i, subset in enumerate(subsets)
+                                 if not self.accepting_states.isdisjoint(subset)},
+            'transitions': {(names[i], word): names[dst_id]
+                            for i, words in enumerate(subset_transitions) for word, dst_id in words}
+        }
+        return ext_dfa
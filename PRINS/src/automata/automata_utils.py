@@ -21,49 +21,259 @@ SPDX-FileCopyrightText: 2021 University of Luxembourg
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 
-import re
+import ast
 import os
 import time
 import graphviz
+from functools import lru_cache
+from natsort import natsort_keygen
 
 import logging
 logger = logging.getLogger(__name__)
 
+_DELETE_PARENTHESES = str.maketrans('', '', '()')
+
+
+# save_pdf(): models with more transitions are not rendered; models with more states are laid out by neato
+PDF_MAX_TRANSITIONS = 10000
+PDF_NEATO_MIN_STATES = 200
+
 
 def evaluate(guard: str, values: str):
     """
     Return the evaluation result of the guard for the values
 
     :param guard: guard condition (e.g., 'val0=="ok"')
-    :param values: values to be inserted in the guard (e.g., "['ok']")
+    :param values: values to be inserted in the guard (e.g., ('ok',) or "['ok']")
     :return: True if the values satisfy the guard condition; False otherwise
     """
 
     if guard is None:
         return True
 
-    # convert str into list; the list format is determined in _find_matching_template@LogParser.py
-    values = eval(values)  # values become a list
-    if len(values) == 0:
-        return False
+    return _evaluate_values(guard, tuple(values) if type(values) is list else values)
+
 
-    # prepare dict as an input of eval()
-    values_dict = dict()
-    for i in range(len(values)):
-        value = re.sub(r'\(|\)', '', values[i])
-        values_dict[f'var{i}'] = re.sub(r'\s+', '', value)  # mint's value must not include whitespace
+@lru_cache(maxsize=65536)
+def _evaluate_values(guard: str, values):
+    # evaluate() memoized; the same (guard, values) pairs recur across log entries (values are hashable here)
+    return _evaluate_parsed(guard, parse_values(values), values)
+
+
+def _evaluate_parsed(guard: str, values_dict: dict, values):
+    # same as evaluate(guard, values) for a (not None) guard, where values_dict = parse_values(values)
+    if len(values_dict) == 0:
+        return False
 
     # evaluate the guard condition using values_dict
     try:
-        return eval(guard, values_dict)
-    except (NameError, TypeError):
+        return compile_guard(guard)(values_dict)
+    except (KeyError, TypeError):
         # not enough values in values_dict
         logger.error(f'evaluate(guard={guard}, values={values})')
         print(f'evaluate(guard={guard}, values={values})')
         exit(-1)
 
 
-def save_pdf(model, model_type: str, output_dir: str = './', label_dict: dict = None):
+@lru_cache(maxsize=65536)
+def parse_values(values) -> dict:
+    """
+    Parse the values of a log entry into the dict used by evaluate(); the same values recur across log entries.
+    NOTE: the returned dict is shared by all callers and must not be modified
+
+    :param values: values of a log entry, either a tuple (e.g., ('ok',); see convert_df_into_l_vectors()) or its str
+                   form (e.g., "['ok']"); the list format is determined in _find_matching_template@LogParser.py
+    :return: dict (key: 'var0', 'var1', ..., value: the value without parentheses and whitespace)
+    """
+    if isinstance(values, str):
+        values = ast.literal_eval(values)
+    return {f'var{i}': ''.join(str(value).translate(_DELETE_PARENTHESES).split())  # no whitespace in mint's value
+            for i, value in enumerate(values)}
+
+
+class _GuardVariables(ast.NodeTransformer):
+    # var0 -> _values['var0']
+    def visit_Name(self, node):
+        return ast.copy_location(ast.Subscript(value=ast.Name(id='_values', ctx=ast.Load()),
+                                               slice=ast.Constant(value=node.id), ctx=node.ctx), node)
+
+
+@lru_cache(maxsize=None)
+def compile_guard(guard: str):
+    """
+    Compile a guard condition once into a function of the values dict (e.g., 'var0=="ok"' into
+    `lambda _values: _values['var0']=="ok"`); models share a small set of distinct guards that are evaluated per log
+    entry, and calling the function is cheaper than eval() of the guard.
+
+    :param guard: guard condition (e.g., 'val0=="ok"')
+    :return: function taking the values dict (see parse_values()); raises KeyError if a variable is not in the dict
+    """
+    body = ast.parse(guard, '<guard>', 'eval').body
+
+    # the common shapes of MINT's guards, 'var0=="a" or var0=="b" or ...' and its negation 'var0!="a" and ...', are
+    # lookups in the set of the constants
+    equalities = body.values if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.Or) else [body]
+    if all(_is_comparison(e, ast.Eq) for e in equalities) and len({e.left.id for e in equalities}) == 1:
+        return _equality_guard(equalities[0].left.id, frozenset(e.comparators[0].value for e in equalities))
+    inequalities = body.values if isinstance(body, ast.BoolOp) and isinstance(body.op, ast.And) else [body]
+    if all(_is_comparison(e, ast.NotEq) for e in inequalities) and len({e.left.id for e in inequalities}) == 1:
+        return _equality_guard(inequalities[0].left.id, frozenset(e.comparators[0].value for e in inequalities),
+                               negated=True)
+
+    body = _GuardVariables().visit(body)
+    function = ast.Lambda(args=ast.arguments(posonlyargs=[], args=[ast.arg(arg='_values')], kwonlyargs=[],
+                                             kw_defaults=[], defaults=[]), body=body)
+    return eval(compile(ast.fix_missing_locations(ast.Expression(function)), '<guard>', 'eval'), {})
+
+
+def _is_comparison(node, op) -> bool:
+    # varN == "constant" (op=ast.Eq) or varN != "constant" (op=ast.NotEq)
+    return isinstance(node, ast.Compare) and isinstance(node.left, ast.Name) and len(node.ops) == 1 \
+        and isinstance(node.ops[0], op) and isinstance(node.comparators[0], ast.Constant) \
+        and isinstance(node.comparators[0].value, str)
+
+
+def _equality_guard(name: str, constants: frozenset, negated=False):
+    if negated:
+        def guard(values: dict) -> bool:
+            return values[name] not in constants
+    else:
+        def guard(values: dict) -> bool:
+            return values[name] in constants
+    guard.name, guard.constants, guard.negated = name, constants, negated  # see guard_table()
+    return guard
+
+
+def select_guard(guards: tuple, values) -> int:
+    """
+    Return the index of the first guard satisfied by the values, in the way the guarded transitions from a state with
+    the same tid are tried one by one; a single lookup in guard_table() if possible.
+
+    :param guards: guards in the order of the transitions (None for an unguarded transition)
+    :param values: values to be inserted in the guards (see evaluate())
+    :return: index of the first satisfied guard; -1 if no guard is satisfied
+    """
+    if guards[0] is None:
+        return 0
+
+    # the values are parsed once for all the guards
+    values_dict = parse_values(tuple(values) if type(values) is list else values)
+    table = guard_table(guards)
+    if table is not None:
+        name, first, default = table
+        if name in values_dict:  # otherwise, evaluate as usual (e.g., to report the missing value)
+            return first.get(values_dict[name], default)
+
+    for i, guard in enumerate(guards):
+        if guard is None or _evaluate_parsed(guard, values_dict, values):
+            return i
+    return -1
+
+
+@lru_cache(maxsize=65536)
+def guard_table(guards: tuple):
+    """
+    Compile the guards of the transitions from a state with the same tid into a table from the value of their
+    variable to the index of the first guard satisfied by it; possible only if each guard is an equality (disjunction)
+    or an inequality (conjunction) on the same variable (see compile_guard()).
+
+    :param guards: guards in the order of the transitions (None for an unguarded transition)
+    :return: (name of the variable, dict (key: value, value: index of the guard or -1), index of the guard for the
+             other values or -1); None if the guards cannot be compiled into a table
+    """
+    names = set()
+    first = dict()  # value -> index of the first guard satisfied by the value (-1 for none)
+    default = -1  # index of the first guard satisfied by the other values
+    undecided = None  # once default is set, the values not decided yet (i.e., not satisfying the default guard)
+    for i, guard in enumerate(guards):
+        if guard is None:
+            constants, negated = frozenset(), True  # satisfied by any value
+        else:
+            function = compile_guard(guard)
+            if not hasattr(function, 'constants'):
+                return None
+            names.add(function.name)
+            constants, negated = function.constants, function.negated
+
+        if undecided is None:
+            if not negated:  # satisfied by the constants only
+                for constant in constants:
+                    first.setdefault(constant, i)
+                continue
+            default = i  # satisfied by the values other than the constants
+            undecided = constants.difference(first)
+        elif not negated:
+            for constant in undecided.intersection(constants):
+                first[constant] = i
+            undecided = undecided.difference(constants)
+        else:
+            for constant in undecided.difference(constants):
+                first[constant] = i
+            undecided = undecided.intersection(constants)
+        if not undecided:
+            break
+    for constant in undecided or ():
+        first[constant] = -1
+
+    if len(names) != 1:
+        return None
+    return names.pop(), first, default
+
+
+_WORDS = dict()
+
+
+def intern_word(word: tuple) -> tuple:
+    """
+    Return the canonical object of a word, similar to sys.intern() for str; the same words label the transitions of
+    many models (e.g., sliced models), so sharing one tuple per word saves memory and makes comparisons by identity.
+
+    :param word: word (tid, guard) whose tid and guard are interned
+    :return: the canonical word equal to the given word
+    """
+    return _WORDS.setdefault(word, word)
+
+
+def index_transitions(transitions: dict) -> dict:
+    """
+    Index transitions by (source state, tid) so that the outgoing transitions for a log entry can be found directly.
+
+    :param transitions: transitions of a model (key: (state, (tid, guard)), value: destination state(s))
+    :return: dict (key: (state, tid), value: a list of (guard, destination state(s)) in the order of transitions)
+    """
+
+    index = dict()
+    for (src, (tid, guard)), dst in transitions.items():
+        index.setdefault((src, tid), []).append((guard, dst))
+    return index
+
+
+_natsort_key = natsort_keygen()
+
+
+@lru_cache(maxsize=65536)
+def natural_key(x):
+    """
+    Return the natsort key of x, cached since the same state names and words are sorted over and over (use
+    _natsort_key for one-off values, such as the names of the subsets in subset construction).
+
+    :param x: a hashable object to be sorted (e.g., a state name or a word (tid, guard))
+    :return: natsort key of x
+    """
+    return _natsort_key(x)
+
+
+def natural_sorted(xs) -> list:
+    """
+    Same as natsort.natsorted(xs), but using the cached keys of natural_key().
+
+    :param xs: an iterable of hashable objects
+    :return: a sorted list
+    """
+    return sorted(xs, key=natural_key)
+
+
+def save_pdf(model, model_type: str, output_dir: str = './', label_dict: dict = None, executor=None):
     """
     Save the model into a pdf file.
 
@@ -71,12 +281,24 @@ def save_pdf(model, model_type: str, output_dir: str = './', label_dict: dict =
     :param model_type: DFA or NFA
     :param output_dir: output directory
     :param label_dict: to change label - from tid to SOMETHING
-    :return: None (save a pdf file)
+    :param executor: (optional) executor to render the pdf file in the background; the graph is built right away, so
+                     the model can be changed afterwards (default=None, i.e., render the pdf file before returning)
+    :return: True if the pdf file is saved; False if the model is too large to be rendered
+             (if the executor is given, a future of the result, once the model is not too large)
     """
 
-    print('Saving pdf ...', end=' ')
+    # graphviz cannot lay out huge models in a reasonable time, so do not even try
+    if len(model.transitions) > PDF_MAX_TRANSITIONS:
+        print(f'Do not save pdf because of too many transitions: {len(model.transitions)}')
+        logger.warning(f'Do not save pdf because of too many transitions: {len(model.transitions)}')
+        return False
+
+    print('Saving pdf ...', end=' ' if executor is None else '(in background)\n')
     start_time = time.time()
-    g = graphviz.Digraph(format='pdf')
+    if len(model.states) > PDF_NEATO_MIN_STATES:
+        g = graphviz.Digraph(format='pdf', engine='neato')  # much faster than dot for mid-size models
+    else:
+        g = graphviz.Digraph(format='pdf')
 
     # nodes
     g.node('fake', style='invisible')
@@ -93,37 +315,36 @@ def save_pdf(model, model_type: str, output_dir: str = './', label_dict: dict =
 
     # edges
     g.edge('fake', model.initial_state, style='bold')
-    if model_type == 'DFA':
-        for (source, (tid, guard)), dst in model.transitions.items():
-            if label_dict:
-                g.edge(source, dst, label=f'{label_dict[tid]}')
-            else:
-                if guard is None:
-                    g.edge(source, dst, label=f'{tid}')
-                else:
-                    g.edge(source, dst, label=f'{tid} ({guard})')
-    elif model_type == 'NFA':
-        for (source, (tid, guard)), dst_states in model.transitions.items():
-            for dst in dst_states:
-                if label_dict:
-                    g.edge(source, dst, label=f'{label_dict[tid]}')
-                else:
-                    if guard is None:
-                        g.edge(source, dst, label=f'{tid}')
-                    else:
-                        g.edge(source, dst, label=f'{tid} ({guard})')
+    for (source, (tid, guard)), dst in model.transitions.items():
+        if label_dict:
+            label = f'{label_dict[tid]}'
+        elif guard is None:
+            label = f'{tid}'
+        else:
+            label = f'{tid} ({guard})'
+        for dst_state in (dst if model_type == 'NFA' else (dst,)):
+            g.edge(source, dst_state, label=label)
 
     # save the pdf file
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    filename = os.path.join(output_dir, model.component)
+    if executor is not None:
+        return executor.submit(_render_pdf, g, filename, start_time, in_background=True)
+    return _render_pdf(g, filename, start_time)
+
 
+def _render_pdf(g: graphviz.Digraph, filename: str, start_time: float, in_background: bool = False) -> bool:
+    # render the graph into `filename`.pdf (the graph source is kept in `filename`); see save_pdf()
     try:
-        g.render(filename=os.path.join(output_dir, model.component), cleanup=False)
+        g.render(filename=filename, cleanup=False)
     except graphviz.backend.CalledProcessError:
-        print(f'too large edge length; skip rendering pdf')
+        print(f'too large edge length; skip rendering pdf' + (f': {filename}' if in_background else ''))
         logger.warning(f'Too large edge length; skip rendering dot')
         return False
 
-    print('done. [Time taken: %.3f sec]' % (time.time() - start_time))
+    if in_background:
+        print('Saving pdf done: %s.pdf [Time taken: %.3f sec]' % (filename, time.time() - start_time))
+    else:
+        print('done. [Time taken: %.3f sec]' % (time.time() - start_time))
     logger.debug('Saving pdf done. [Time taken: %.3f sec]' % (time.time() - start_time))
     return True
@@ -24,61 +24,76 @@ SPDX-License-Identifier: GPL-3.0-or-later
 import os
 import time
 import pickle
-import concurrent
-import pandas as pd
-from copy import deepcopy
+from itertools import groupby, repeat
+from operator import itemgetter
+from collections import defaultdict
 from natsort import natsorted
 from src.automata.NFA import NFA
-from src.utils.common import convert_df_into_l_vectors
-from src.main.mint_helper import infer_model_by_mint
+from src.automata.automata_utils import natural_sorted
+from src.utils.common import read_csv_into_l_vectors
+from src.main.mint_helper import l_vectors_to_columns, prepare_mint_input_from_columns, run_mint_using_mint_input
 from concurrent.futures.process import ProcessPoolExecutor
 
 import logging
 logger = logging.getLogger(__name__)
 
 
+# component models of a stitching worker process; see PRINS.run()
+_stitch_component_models = None
+
+
+def _init_stitch_worker(component_models: dict):
+    global _stitch_component_models
+    _stitch_component_models = component_models
+
+
+def _stitch_worker(log_id, l_vector: list):
+    return PRINS.stitch(log_id, l_vector, _stitch_component_models)
+
+
 class PRINS:
     """
     Main class for PRINS, which takes as input structured (preprocessed) logs and returns system-level model (gFSM).
     """
     system: str
-    logs_df: pd.DataFrame
     l_vectors: dict
     components: list
     output_dir: str
 
-    def __init__(self, system: str, logs, output_dir: str):
+    def __init__(self, system: str, logs, output_dir: str, cache_dir: str = None):
         """
 
         :param system: system name
         :param logs: logs (either csv file or l_vectors)
         :param output_dir: output directory
+        :param cache_dir: (optional) directory to cache the l_vectors read from the csv file (default=None)
         """
         self.system = system
         self.output_dir = output_dir
 
         if type(logs) == dict:  # logs is l_vectors
-            self.logs_df = None
             self.l_vectors = logs
-            components = set()
-            for _, l_vector in self.l_vectors.items():
-                for e in l_vector:
-                    components.add(e['component'])
-            self.components = natsorted(components)
-        else:  # logs is a pointer for the csv file
-            self.logs_df = pd.read_csv(logs, dtype={'tid': str})
-            self.l_vectors = convert_df_into_l_vectors(self.logs_df, include_component=True)
-            self.components = natsorted(self.logs_df.component.unique())
-
-    def run(self, mint_timeout=3600, mint_param=2, ignore_values=False, save_pdf=True, num_workers=4, use_pickle=False):
+        else:  # logs is a pointer for the csv file; read chunk by chunk without keeping the whole DataFrame
+            self.l_vectors = read_csv_into_l_vectors(logs, include_component=True, cache_dir=cache_dir)
+
+        components = set()
+        for _, l_vector in self.l_vectors.items():
+            for e in l_vector:
+                components.add(e['component'])
+        self.components = natsorted(components)
+
+    def run(self, mint_timeout=3600, mint_param=2, ignore_values=False, save_pdf=True, num_workers=4, use_pickle=False,
+            pdf_executor=None):
         """Run PRINS (main algorithm).
 
         :param mint_timeout: mint timeout (sec) (default=3600)
         :param mint_param: the parameter `k` of MINT (default=2)
         :param ignore_values: whether to ignore values in generating a model (default=False)
         :param save_pdf: True if to save the final model as pdf (default=True)
-        :param num_workers: the number of workers for parallel component model inference (default=2)
+        :param num_workers: the number of workers for parallel component model inference and stitching (default=4)
         :param use_pickle: use pickle to save and load component models with logs (default=False)
+        :param pdf_executor: (optional) executor to save the pdf file in the background; it must be shut down before
+                             self.output_dir is removed (default=None, i.e., save the pdf file before returning)
         :return: DFA (system-level model)
         """
 
@@ -116,14 +131,19 @@ class PRINS:
             inference_start = time.time()
             component_models = {}
             with ProcessPoolExecutor(max_workers=num_workers) as executor:
-                futures = {executor.submit(self.component_model_inference,
-                                           component, l_vectors, mint_timeout, mint_param, ignore_values)
-                           for component, l_vectors in component_logs.items()}
-
-                for future in concurrent.futures.as_completed(futures):
-                    if future.result():
-                        component, component_model = future.result()
-                        component_models[component] = component_model
+                # NOTE: only tids and values are sent to the workers, as columns (see l_vectors_to_columns());
+                # component_model_inference() is static so that `self` (with all logs) is not pickled per task
+                components = list(component_logs.keys())
+                chunksize = max(1, len(components) // (num_workers * 4))
+                results = executor.map(PRINS.component_model_inference,
+                                       components,
+                                       [l_vectors_to_columns(component_logs[component]) for component in components],
+                                       repeat(self.output_dir), repeat(mint_timeout), repeat(mint_param),
+                                       repeat(ignore_values),
+                                       chunksize=chunksize)
+                # results come in the order of components; an exception in a worker is raised here
+                for component, component_model in results:
+                    component_models[component] = component_model
             inference_time = time.time() - inference_start
             print(f'Inference done. [Time taken: {inference_time:.3f} sec]')
             logger.info(f'Inference done. [Time taken: {inference_time:.3f} sec]')
@@ -146,9 +166,18 @@ class PRINS:
         # stitch component-level models according to system-level logs
         appended_models = []
 
-        # sequential stitch
-        for log_id, l_vector in self.l_vectors.items():
-            model_appended, components = self.stitch(log_id, l_vector, component_models)
+        if num_workers > 1 and len(self.l_vectors) > 1:
+            # parallel stitch: logs are stitched independently of each other, so each worker receives the component
+            # models once (initializer) and then only logs; results come back in the order of self.l_vectors
+            chunksize = max(1, len(self.l_vectors) // (num_workers * 4))
+            with ProcessPoolExecutor(max_workers=num_workers,
+                                     initializer=_init_stitch_worker, initargs=(component_models,)) as executor:
+                results = list(executor.map(_stitch_worker, self.l_vectors.keys(), self.l_vectors.values(),
+                                            chunksize=chunksize))
+        else:
+            # sequential stitch
+            results = [self.stitch(log_id, l_vector, component_models) for log_id, l_vector in self.l_vectors.items()]
+        for model_appended, components in results:
             all_components.append(components)
             appended_models.append(model_appended)
 
@@ -172,41 +201,61 @@ class PRINS:
         # (optional) Saving the Results as a pdf file
         if save_pdf:
             if len(m_sys.states) < 1000:
-                m_sys.save_pdf(output_dir=self.output_dir)
+                m_sys.save_pdf(output_dir=self.output_dir, executor=pdf_executor)
             else:
                 print(f'Do not save model.pdf because of too many states: {len(m_sys.states)}')
 
         return m_sys, projection_time, inference_time, stitching_time
 
-    def component_model_inference(self, component: str, l_vectors: dict, mint_timeout: int, mint_param: int, ignore_values: bool):
-        component_model = infer_model_by_mint(component, l_vectors, os.path.join(self.output_dir, component),
-                                              allow_non_det=False, timeout=mint_timeout, k=mint_param, ignore_values=ignore_values)
+    @staticmethod
+    def component_model_inference(component: str, log_columns: dict, output_dir: str,
+                                  mint_timeout: int, mint_param: int, ignore_values: bool):
+        """
+        Infer a component-level model (worker of STEP2).
+
+        :param component: component name
+        :param log_columns: component logs as columns (see l_vectors_to_columns())
+        :param output_dir: output directory of PRINS (the model is inferred in its subdirectory for the component)
+        :param mint_timeout: mint timeout (sec)
+        :param mint_param: the parameter `k` of MINT
+        :param ignore_values: whether to ignore values in generating a model
+        :return: component and its model
+        """
+        output_dir = os.path.join(output_dir, component)
+        mint_input = prepare_mint_input_from_columns(component, log_columns, output_dir, ignore_values)
+        component_model = run_mint_using_mint_input(component, mint_input, output_dir,
+                                                    k=mint_param, timeout=mint_timeout, allow_non_det=False)
         return component, component_model
 
-    def stitch(self, log_id, l_vector, component_models):
-        logger.debug(f'Stitching (log_id={log_id}) ...')
+    @staticmethod
+    def stitch(log_id, l_vector, component_models):
+        is_debug = logger.isEnabledFor(logging.DEBUG)  # called for every log
+        if is_debug:
+            logger.debug(f'Stitching (log_id={log_id}) ...')
 
         # initialize
-        partitioned_log = self.partition_log_by_component(l_vector)
+        partitioned_log = PRINS.partition_log_by_component(l_vector)
         slice_starting_states = {}
         for _, component_model in component_models.items():
             slice_starting_states[component_model] = component_model.initial_state
 
         # expand model_appended
-        logger.debug(f'Slicing component-level models')
+        if is_debug:
+            logger.debug(f'Slicing component-level models')
         model_appended = None
         for component, component_l_vector in partitioned_log:
             # NOTE: slice() does not change the internal states of individual component models
             model_sliced = component_models[component].slice(component_l_vector, slice_starting_states)
 
-            logger.debug(f'Appending sliced models')
+            if is_debug:
+                logger.debug(f'Appending sliced models')
             if model_appended is None:
-                model_appended = deepcopy(model_sliced)
+                model_appended = model_sliced  # a fresh model built by slice(); no need to copy
             else:
                 model_appended.append(model_sliced)
 
-        # for the calculation of the component set uniqueness score
-        components = frozenset({component for component, _ in partitioned_log})
+        # for the calculation of the component set uniqueness score (from the partitions already built for slicing)
+        components = frozenset(component for component, _ in partitioned_log)
 
         return model_appended, components
 
@@ -219,17 +268,17 @@ class PRINS:
         """
 
         # initialize component_logs (dict)
-        component_logs = {}
-        for component in self.components:
-            component_logs[component] = {}
+        component_logs = {component: {} for component in self.components}
 
-        # for each log entry, append it on the proper l_vector of the corresponding component
-        for log_id, l_vector in self.l_vectors.items():
+        # group the log entries of each log by component (one pass per log), then file them per component
+        # NOTE: logs are visited in the natural order of log_ids, so that component logs are already sorted for MINT
+        for log_id in natural_sorted(self.l_vectors.keys()):
+            l_vector = self.l_vectors[log_id]
+            grouped = defaultdict(list)
             for log_entry in l_vector:
-                if log_id in component_logs[log_entry['component']].keys():
-                    component_logs[log_entry['component']][log_id].append(log_entry)
-                else:
-                    component_logs[log_entry['component']][log_id] = [log_entry]
+                grouped[log_entry['component']].append(log_entry)
+            for component, component_l_vector in grouped.items():
+                component_logs[component][log_id] = component_l_vector
 
         return component_logs
 
@@ -243,14 +292,7 @@ class PRINS:
         :return: a list of tuples where each tuple is composed of (component, sequence of log entries)
         """
 
-        partitioned_log = []
-        component_l_vector = []
-        for i in range(len(l_vector)):
-            component_l_vector.append(l_vector[i])
-            if i+1 == len(l_vector) or l_vector[i+1]['component'] != l_vector[i]['component']:
-                partitioned_log.append((l_vector[i]['component'], component_l_vector))
-                component_l_vector = []
-        return partitioned_log
+        return [(component, list(entries)) for component, entries in groupby(l_vector, key=itemgetter('component'))]
 
     @staticmethod
     def postprocess(m_sys: 'NFA', determinize_technique: str = 'hybrid-1'):
@@ -264,7 +306,7 @@ class PRINS:
         """
 
         start_time = time.time()
-        m_sys = deepcopy(m_sys)
+        m_sys = m_sys.own_copy()
         dfa_sys = None
         if determinize_technique == 'standard':
             dfa_sys = m_sys.standard_determinize()
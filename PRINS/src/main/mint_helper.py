@@ -22,11 +22,11 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 
 import os
-import re
+import ast
 import copy
-from natsort import natsorted
 from src.utils.MINT import MINT
 from src.automata.NFA import NFA
+from src.automata.automata_utils import natural_sorted
 
 import logging
 logger = logging.getLogger(__name__)
@@ -68,10 +68,27 @@ def run_mint_using_mint_input(component: str, mint_input: str, output_dir: str,
     """
     ext_nfa = MINT.run(component, mint_input, output_dir, k=k, timeout=timeout)
     ext_nfa = remove_end_marker(ext_nfa)
-    nfa = NFA(component, ext_nfa)
+    nfa = NFA(component, ext_nfa, own=True)
 
     if allow_non_det:
         return nfa
+    return determinize_mint_model(nfa)
+
+
+def determinize_mint_model(nfa: 'NFA') -> 'NFA':
+    """
+    Remove non-determinism from the model inferred by MINT, keeping it as an NFA (each dst_states is a singleton).
+
+    :param nfa: the model inferred by MINT (updated in place if it is deterministic already)
+    :return: a deterministic model (type=NFA)
+    """
+    # subset construction only keeps the states reachable from the initial state and the transitions having dst_states;
+    # MINT often returns a model that is deterministic once the others are removed, and then subset construction would
+    # only rename the states
+    nfa.remove_unreachable_states()
+    if not nfa.non_deterministic_keys():
+        nfa.rename_states(padding=0)
+        return nfa
     else:
         # remove non-determinism
         dfa = nfa.standard_determinize()  # NOTE: this may take much time ...
@@ -86,7 +103,18 @@ def run_mint_using_mint_input(component: str, mint_input: str, output_dir: str,
         }
         for (src, word), dst in dfa.transitions.items():
             new_nfa['transitions'][(src, word)] = {dst}
-        return NFA(component, new_nfa)
+        return NFA(nfa.component, new_nfa, own=True)
+
+
+def l_vectors_to_columns(l_vectors: dict) -> dict:
+    """
+    Convert l_vectors into per-log columns of tids and values, the only fields used for model inference.
+
+    :param l_vectors: logs (each entry in l_vector must have 'tid' and 'values' at least)
+    :return: dict (key: log_id, value: a tuple of (tids, values) where tids and values are tuples)
+    """
+    return {log_id: (tuple(e['tid'] for e in l_vector), tuple(e['values'] for e in l_vector))
+            for log_id, l_vector in l_vectors.items()}
 
 
 def prepare_mint_input_from_l_vectors(component: str, l_vectors: dict, output_dir: str, ignore_values=False):
@@ -99,72 +127,82 @@ def prepare_mint_input_from_l_vectors(component: str, l_vectors: dict, output_di
     :param ignore_values: Specify whether to ignore values in generating a model (default=False)
     :return: mint input artifacts (mint types and mint traces)
     """
+    return prepare_mint_input_from_columns(component, l_vectors_to_columns(l_vectors), output_dir, ignore_values)
+
+
+def prepare_mint_input_from_columns(component: str, log_columns: dict, output_dir: str, ignore_values=False):
+    """
+    Same as prepare_mint_input_from_l_vectors(), but taking the logs as columns (see l_vectors_to_columns()).
+
+    :param component: component name
+    :param log_columns: logs (dict; key: log_id, value: a tuple of (tids, values))
+    :param output_dir: output directory
+    :param ignore_values: Specify whether to ignore values in generating a model (default=False)
+    :return: mint input artifacts (mint types and mint traces)
+    """
     # initialize
     mint_types = set()  # (ex) {template} var1:S ...
-    mint_traces = []
+    lines = []  # lines of traces, each of which starts with 'trace'
+    events = dict()  # (tid, values) -> (type_line, trace_line); the same events recur across logs
 
     # for each trace (log), collect templates and values
-    for execution_id in natsorted(l_vectors.keys()):
+    for execution_id in natural_sorted(log_columns.keys()):
 
         # build a trace from log
-        mint_trace = []
-        for log_entry in l_vectors[execution_id]:
-            # init
-            template_id = str(log_entry['tid'])  # to make sure
-            if template_id == '_init_' or template_id == '_fin_':  # DEBUG
-                print(f"Instrumented templates remaining: {template_id}")
-                exit(-1)
-
-            # for types
-            type_line = template_id
-
-            # if there are values, both type_line and trace_line should be updated
-            values = ""
-            if (not ignore_values) and log_entry['values']:
-                i = 0
-                for value in eval(log_entry['values']):
-                    # add the values to trace
-                    values += " " + re.sub(r'\s+', '', str(value))  # mint's value must not include whitespace
-                    type_line += f" var{i}:S"
-                    i += 1
-
-            # build one line (single event) of trace
-            trace_line = template_id + str(values)
-
-            # add type_line and trace_line
-            mint_types.add(type_line)
-            mint_trace.append(trace_line)
+        lines.append('trace')
+        tids, entry_values = log_columns[execution_id]
+        for tid, raw_values in zip(tids, entry_values):
+            event = events.get((tid, raw_values))
+            if event is None:
+                event = events[(tid, raw_values)] = _mint_event(tid, raw_values, ignore_values)
+                mint_types.add(event[0])
+            lines.append(event[1])
 
         # add END_MARKER event at the end of each trace; to bypass MINT's bug
-        mint_trace.append(END_MARKER)
-
-        # add trace
-        mint_traces.append(mint_trace)
+        lines.append(END_MARKER)
 
     # sort types (for easy view)
-    mint_types = natsorted(list(mint_types))
+    mint_types = natural_sorted(mint_types)
 
     # add END_MARKER event at the end of types; to bypass MINT's bug
     mint_types.append(END_MARKER)
 
     # make dir
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
 
-    # create the MINT input file
+    # create the MINT input file (written at once)
     mint_input = os.path.join(output_dir, f'{component}_mint_in.txt')
     with open(mint_input, 'w') as f:
-        f.write('types\n')
-        for line in mint_types:
-            f.write(line+'\n')
-        for line in mint_traces:
-            f.write('trace\n')
-            for event in line:
-                f.write(event+'\n')
+        f.write('\n'.join(['types', *mint_types, *lines, '']))
 
     return mint_input
 
 
+def _mint_event(tid, raw_values, ignore_values: bool) -> (str, str):
+    """
+    Build the MINT type line and trace line of a log entry.
+
+    :param tid: template id
+    :param raw_values: values of the log entry (e.g., ('X', 'A') or "['X', 'A']")
+    :param ignore_values: Specify whether to ignore values
+    :return: type_line (e.g., 'e1 var0:S var1:S') and trace_line (e.g., 'e1 X A')
+    """
+    template_id = str(tid)  # to make sure
+    if template_id == '_init_' or template_id == '_fin_':  # DEBUG
+        print(f"Instrumented templates remaining: {template_id}")
+        exit(-1)
+
+    # if there are values, both type_line and trace_line should be updated
+    type_words = [template_id]
+    trace_words = [template_id]
+    if (not ignore_values) and raw_values:
+        for i, value in enumerate(ast.literal_eval(raw_values) if isinstance(raw_values, str) else raw_values):
+            trace_words.append(''.join(str(value).split()))  # mint's value must not include whitespace
+            type_words.append(f'var{i}:S')
+
+    return ' '.join(type_words), ' '.join(trace_words)
+
+
 def remove_end_marker(deterministic_ext_nfa: dict):
 
     # initialize
@@ -181,20 +219,20 @@ def remove_end_marker(deterministic_ext_nfa: dict):
         new_ext_nfa['states'].add(src)
         if word[0] == END_MARKER:  # tid (label) == END_marker
             new_ext_nfa['accepting_states'].add(src)
-            for dst in dst_set:
-                end_states.add(dst)
+            end_states.update(dst_set)
         else:
-            new_ext_nfa['states'] = new_ext_nfa['states'].union(dst_set)
+            new_ext_nfa['states'].update(dst_set)
             new_ext_nfa['transitions'][(src, word)] = dst_set
             new_ext_nfa['alphabet'].add(word)
 
-    # asserts
-    for (src, word), dst_set in deterministic_ext_nfa['transitions'].items():
-        # all end_states should not have outgoing edges
-        assert src not in end_states
+    # asserts (skipped entirely with `python -O`)
+    if __debug__:
+        for (src, word), dst_set in deterministic_ext_nfa['transitions'].items():
+            # all end_states should not have outgoing edges
+            assert src not in end_states
 
-        # all end_states should not have incoming edges other then END_MARKER
-        if end_states.intersection(dst_set):
-            assert word[0] == END_MARKER
+            # all end_states should not have incoming edges other then END_MARKER
+            if not end_states.isdisjoint(dst_set):
+                assert word[0] == END_MARKER
 
     return new_ext_nfa
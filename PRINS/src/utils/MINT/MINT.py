@@ -22,15 +22,27 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 
 import os
+import sys
 import re
 import time
+import tempfile
+import threading
 import subprocess
+from collections import defaultdict
 from natsort import natsorted
 from PySimpleAutomata import automata_IO
+from src.automata.automata_utils import intern_word
 
 import logging
 logger = logging.getLogger(__name__)
 
+# each MINT run starts its own JVM, possibly next to other MINT runs in parallel workers: a single-threaded GC starts
+# faster and does not compete with the other JVMs for cores, and class data sharing saves loading the JDK classes
+JVM_OPTIONS = ['-Xss64M', '-Xmx4G', '-XX:+UseSerialGC', '-Xshare:auto']
+
+_GUARD_CHARS = re.compile(r'[=<>|&]')
+_COMPARED_VALUE = re.compile(r'(==|!=|<=|>=|<|>)([^\s]+)')
+
 
 def run(system: str, input_file: str, output_dir: str, k: int = 2, timeout: int = 3600):
     """
@@ -45,51 +57,69 @@ def run(system: str, input_file: str, output_dir: str, k: int = 2, timeout: int
     # run MINT to infer the system model
     output_file = os.path.join(output_dir, f'{system}_mint_out.txt')
     mint_jar = os.path.join(os.path.dirname(__file__), 'mint-inference.jar')
-    cmd = ['java', '-Xss64M', '-Xmx4G', '-jar', f'{mint_jar}', '-input', f'{input_file}',
+    cmd = ['java'] + JVM_OPTIONS + ['-jar', f'{mint_jar}', '-input', f'{input_file}',
            '-k', f'{k}', '-algorithm', 'AdaBoostDiscrete', '>', f'{output_file}', '2>&1']
     print(f'Running MINT: {system} (timeout={timeout})', flush=True)
     logger.info(f'Starting MINT for {system} (timeout={timeout})')
 
+    # stream the output of MINT; only the dot part is kept, written to a temporary dot file while MINT is running
+    model_dot = os.path.join(output_dir, system + '.dot')
+    model_dot_part = model_dot + '.part'  # replaces model_dot only if MINT ends successfully
+    num_dot_file_lines = 0
+    is_read = False
+    is_debug = logger.isEnabledFor(logging.DEBUG)  # MINT may print millions of lines
     start = time.time()
-    p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=timeout)
-    p.check_returncode()
+    try:
+        with tempfile.TemporaryFile() as stderr, open(model_dot_part, 'w', encoding='utf-8') as f, \
+                subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, encoding='utf-8') as p:
+            timer = threading.Timer(timeout, p.kill)
+            timer.start()
+            try:
+                for line in p.stdout:
+                    line = line.rstrip('\n')
+                    if is_debug:
+                        logger.debug(line)
+                    if 'Error occurred during initialization of VM' in line:
+                        raise Exception(f'{os.getpid()}: FATAL - VM initialization error; {output_file}')
+
+                    if 'digraph Automaton {' == line.strip():
+                        is_read = True
+                    if is_read:
+                        if 'initial [shape=plaintext]' in line:
+                            continue
+                        elif 'initial -> 0' in line:
+                            continue
+                        elif '0 [label="0",shape=doublecircle]' in line:
+                            f.write('0 [root=true,label="0",shape=doublecircle];\n')
+                        else:
+                            f.write(line + '\n')
+                        num_dot_file_lines += 1
+                    if '}' == line.strip():
+                        is_read = False
+                p.wait()
+            finally:
+                timed_out = not timer.is_alive()
+                timer.cancel()
+                p.kill()  # no effect if MINT has already ended
+
+            if timed_out:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            if p.returncode != 0:
+                stderr.seek(0)
+                raise subprocess.CalledProcessError(p.returncode, cmd, stderr=stderr.read())
+        os.replace(model_dot_part, model_dot)
+    finally:
+        if os.path.exists(model_dot_part):
+            os.remove(model_dot_part)
+    assert is_read is False
     end = time.time()
     logger.info(f'MINT ended for {system} [Time taken: {end - start:.3f} sec]')
     print(f'Inferring model for {system} done. [Time taken: {end-start:.3f} sec]')
 
-    # read output_file and perform post-process
-    dot_file_lines = list()
-    is_read = False
-    for line in p.stdout.decode("utf-8").split('\n'):
-        logger.debug(line)
-        if 'Error occurred during initialization of VM' in line:
-            raise Exception(f'{os.getpid()}: FATAL - VM initialization error; {output_file}')
-
-        if 'digraph Automaton {' == line.strip():
-            is_read = True
-        if is_read:
-            if 'initial [shape=plaintext]' in line:
-                continue
-            elif 'initial -> 0' in line:
-                continue
-            elif '0 [label="0",shape=doublecircle]' in line:
-                dot_file_lines.append('0 [root=true,label="0",shape=doublecircle];')
-            else:
-                dot_file_lines.append(line)
-        if '}' == line.strip():
-            is_read = False
-    assert is_read is False
-
-    if len(dot_file_lines) == 0:
+    if num_dot_file_lines == 0:
         print(f'MINT execution error; input_file={input_file}, working_dir={os.getcwd()}')
         exit(-1)
 
-    # save dot file
-    model_dot = os.path.join(output_dir, system + '.dot')
-    with open(model_dot, 'w') as f:
-        for line in dot_file_lines:
-            f.write(line + '\n')
-
     # load the machine as DFA using
     nfa = automata_IO.nfa_dot_importer(model_dot)
 
@@ -97,34 +127,37 @@ def run(system: str, input_file: str, output_dir: str, k: int = 2, timeout: int
     extended_alphabet = set()  # tuple: (tid, gid)
     extended_transitions = dict()
 
+    # group transitions by word, so that each word only visits the transitions labeled by it
+    transitions_by_word = defaultdict(list)
+    # NOTE: states, tids, and guards are interned; they are hashed and compared over and over in the models
+    states = {state: sys.intern(state) for state in nfa['states']}
+    for (src, word), dst_set in nfa['transitions'].items():
+        transitions_by_word[word].append((states[src], {states[dst] for dst in dst_set}))
+
     for word in natsorted(list(nfa['alphabet'])):  # must be sorted to be deterministic
         tokens = word.split('\\n')
         index = 0
         while index < len(tokens):
             # first token = tid
-            tid = tokens[index]
+            tid = sys.intern(tokens[index])
             guard = None
 
             # check following guard
-            if index+1 < len(tokens) and re.search(r'[=<>|&]', tokens[index+1]):
+            if index+1 < len(tokens) and _GUARD_CHARS.search(tokens[index+1]):
                 guard = tokens[index+1]
                 guard = guard.replace("&&", " and ")
                 guard = guard.replace("||", " or ")
                 guard = guard.replace("\'", "")
-                guard = re.sub(r'(==|!=|<=|>=|<|>)([^\s]+)', r'\1"\2"', guard)
+                guard = sys.intern(_COMPARED_VALUE.sub(r'\1"\2"', guard))
                 index += 1
 
             # extent alphabet
-            extended_alphabet.add((tid, guard))
+            ext_word = intern_word((tid, guard))
+            extended_alphabet.add(ext_word)
 
             # extend transitions
-            for src in nfa['states']:
-                if (src, word) in nfa['transitions'].keys():
-                    if (src, (tid, guard)) in extended_transitions.keys():
-                        extended_transitions[(src, (tid, guard))] = \
-                            extended_transitions[(src, (tid, guard))].union(nfa['transitions'][(src, word)])
-                    else:
-                        extended_transitions[(src, (tid, guard))] = nfa['transitions'][(src, word)]
+            for src, dst_set in transitions_by_word[word]:
+                extended_transitions.setdefault((src, ext_word), set()).update(dst_set)
 
             # end of one loop
             index += 1
@@ -135,9 +168,9 @@ def run(system: str, input_file: str, output_dir: str, k: int = 2, timeout: int
 
     extended_nfa = {
         'alphabet': extended_alphabet,
-        'states': nfa['states'],
-        'initial_state': list(nfa['initial_states'])[0],
-        'accepting_states': nfa['accepting_states'],
+        'states': set(states.values()),
+        'initial_state': states[list(nfa['initial_states'])[0]],
+        'accepting_states': {states[state] for state in nfa['accepting_states']},
         'transitions': extended_transitions
     }
 
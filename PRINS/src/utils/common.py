@@ -23,16 +23,54 @@ SPDX-License-Identifier: GPL-3.0-or-later
 
 import os
 import re
+import ast
+import hashlib
+import sys
 import copy
+import pickle
 import natsort
 import random
 import argparse
 import pandas as pd
+from functools import lru_cache
+from itertools import repeat
+from concurrent.futures.process import ProcessPoolExecutor
 from datetime import datetime
 
+try:
+    import re2  # optional (google-re2): linear-time matching without backtracking
+except ImportError:
+    re2 = None
+
 import logging
 logger = logging.getLogger(__name__)
 
+_ESCAPED_WHITESPACE = re.compile(r'\\\s+')
+
+# read_csv_into_l_vectors(): the number of log entries read and converted at once
+CSV_CHUNKSIZE = 2 ** 16
+
+# the columns of a structured logs csv file used by convert_df_into_l_vectors() (e.g., not the message and template);
+# pd.read_csv(..., usecols=lambda column: column in L_VECTORS_COLUMNS) skips parsing the others
+L_VECTORS_COLUMNS = frozenset(['logID', 'lineID', 'month', 'date', 'time', 'component', 'tid', 'values'])
+
+
+@lru_cache(maxsize=1024)
+def _compile(pattern: str):
+    """
+    Compile a pattern with RE2 if it is installed and supports the pattern, otherwise with re.
+    Compiled patterns are cached, e.g., the pattern of a log format is compiled once per process, not once per file.
+
+    :param pattern: regular expression (flags, if any, must be given inline, e.g., `(?m)`)
+    :return: compiled pattern, having the same match/finditer/findall interface as re.Pattern
+    """
+    if re2 is not None:
+        try:
+            return re2.compile(pattern)
+        except re2.error:
+            logger.debug(f'RE2 does not support the pattern, falling back to re: {pattern}')
+    return re.compile(pattern)
+
 
 def read_templates_into_df(system: str, template_dir: str):
     """
@@ -45,7 +83,7 @@ def read_templates_into_df(system: str, template_dir: str):
     # read templates (if exist)
     template_file = os.path.join(template_dir, f'{system}_templates.csv')
     if os.path.isfile(template_file):
-        templates_df = pd.read_csv(os.path.join(template_file), index_col='tid')
+        templates_df = pd.read_csv(template_file, index_col='tid', dtype={'template': 'string'}, engine='c')
         print(f'Total number of templates loaded: {len(templates_df)}')
         logger.info(f'Total number of templates loaded: {len(templates_df)}')
     else:
@@ -61,31 +99,47 @@ def read_templates_into_df(system: str, template_dir: str):
 
 def get_log_files_under_dir(log_dir: str, file_ext='.log'):
     """
-    Return a list of log files (with path, as tuple) under the given log_dir
+    Return a list of log files (with path) under the given log_dir
     :param log_dir: the root directory for searching log files
     :param file_ext: (optional) log file extension; `.log` by default
-    :return: a (sorted) list of tuples composed of (log_path, log_file)
+    :return: a (sorted) list of log file paths
     """
-    raw_logs = []
-    for root, dirs, files in os.walk(log_dir):
-        for file in files:
-            if file.endswith(file_ext):
-                raw_logs.append((root, file))
-                logger.debug('collected log file: %s/%s' % (root, file))
+    raw_logs = list(_walk_log_files(log_dir, file_ext))
+    if logger.isEnabledFor(logging.DEBUG):
+        for log_file in raw_logs:
+            logger.debug('collected log file: %s' % log_file)
     print('Total number of logs: %d' % len(raw_logs))
 
     if len(raw_logs) == 0:
         print(f'ERROR: No log files detected under: {log_dir}')
         exit(0)
 
-    return natsort.humansorted(raw_logs)
+    return natsort.humansorted(raw_logs, key=os.path.split)  # sorted by (log_path, log_file)
 
 
-def load_logs_into_df(log_format: str, log_files: list):
+def _walk_log_files(root: str, file_ext: str):
+    # same files as os.walk(root), filtered by the extension while scanning; symlinked dirs are not followed
+    # NOTE: directories are visited with an explicit stack, instead of recursive generators that pass every file
+    #       path up through each level of nesting (and that are limited by the recursion depth)
+    dirs = [root]
+    while dirs:
+        with os.scandir(dirs.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        dirs.append(entry.path)
+                elif entry.name.endswith(file_ext):
+                    yield entry.path
+
+
+def load_logs_into_df(log_format: str, log_files: list, num_workers: int = None, cache_dir: str = None):
     """
     Load logs with parsing according to the given log format.
     :param log_format:
-    :param log_files:
+    :param log_files: log file paths (see get_log_files_under_dir())
+    :param num_workers: (optional) the number of processes parsing the files in parallel (default=os.cpu_count())
+    :param cache_dir: (optional) directory to pickle the parsed logs into, to reuse them as long as the log format and
+                      the log files (paths, sizes, and modification times) are the same; no cache by default
     :return:
     """
     header, pattern = generate_pattern_from_log_format(log_format)
@@ -93,47 +147,143 @@ def load_logs_into_df(log_format: str, log_files: list):
         print(f'ERROR: <message> is not in log_format={log_format}')
         exit(-1)
 
+    cache_file = None
+    if cache_dir:
+        cache_file = os.path.join(cache_dir, f'logs_{_logs_cache_key(log_format, log_files)}.pickle')
+        if os.path.isfile(cache_file):
+            logs_df = pd.read_pickle(cache_file)
+            print(f'Total number of log messages in raw logs: %d (cached)' % len(logs_df))
+            logger.info(f'loaded parsed logs from cache: {cache_file}')
+            return logs_df
+
+    # parse the files in parallel; map() keeps the order of the files, so log ids are the same as in sequential parsing
+    if num_workers is None:
+        num_workers = os.cpu_count() or 1
+    if num_workers > 1 and len(log_files) > 1:
+        with ProcessPoolExecutor(max_workers=min(num_workers, len(log_files))) as executor:
+            parsed_files = list(executor.map(_parse_log_file, log_files, repeat(pattern), repeat(header)))
+    else:
+        parsed_files = [_parse_log_file(log_file, pattern, header) for log_file in log_files]
+
+    # collect the matched lines of all files, then build a single DataFrame at the end
+    log_lines = []
+    log_ids = []
+    line_ids = []
     log_id = 1
-    log_dfs = []
-    for path, file in log_files:
-        log_lines = []
-        with open(os.path.join(path, file), 'r', errors='replace') as log:
-            for line in log:
-                m = re.match(pattern, line.strip())
-                if m:
-                    log_line = [m.group(h) for h in header]
-                    log_lines.append(log_line)
-                else:
-                    logger.debug(f'Skip non-matched log_line={line.strip()}')
-        log_df = pd.DataFrame(log_lines, columns=header)
-        log_df['message'] = log_df['message'].str.strip()
+    for log_file, file_lines in zip(log_files, parsed_files):
+        log_lines.extend(file_lines)
         if 'logID' not in header:
-            log_df.insert(0, 'lineID', None)
-            log_df['lineID'] = [i + 1 for i in range(len(log_lines))]
-            log_df.insert(0, 'logID', log_id)
+            line_ids.extend(range(1, len(file_lines) + 1))
+            log_ids.extend([log_id] * len(file_lines))
             log_id += 1
-        log_dfs.append(log_df)
-        logger.info(f'loaded log file (lines=%d): %s' % (len(log_lines), os.path.join(path, file)))
-
-    logs_df = pd.concat(log_dfs, ignore_index=True)
+        logger.info(f'loaded log file (lines=%d): %s' % (len(file_lines), log_file))
+
+    logs_df = pd.DataFrame(log_lines, columns=header)
+    logs_df['message'] = logs_df['message'].str.strip()
+    if 'logID' not in header:
+        logs_df.insert(0, 'lineID', line_ids)
+        logs_df.insert(0, 'logID', log_ids)
+    _categorize_columns(logs_df)
     print(f'Total number of log messages in raw logs: %d' % len(logs_df))
 
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        logs_df.to_pickle(cache_file)
+        logger.info(f'saved parsed logs to cache: {cache_file}')
+
     return logs_df
 
 
+def _categorize_columns(logs_df: pd.DataFrame):
+    # few distinct values repeated over many rows; category codes make grouping by them cheaper and save memory
+    for column in ['tid', 'component', 'logID']:
+        if column in logs_df.columns and not isinstance(logs_df[column].dtype, pd.CategoricalDtype):
+            logs_df[column] = logs_df[column].astype('category')
+
+
+def _logs_cache_key(log_format: str, log_files: list) -> str:
+    # any change of the log format or of a log file (path, size, modification time) results in a different key
+    h = hashlib.blake2b(log_format.encode(), digest_size=16)
+    for log_file in log_files:
+        stat = os.stat(log_file)
+        h.update(f'\0{log_file}\0{stat.st_size}\0{stat.st_mtime_ns}'.encode())
+    return h.hexdigest()
+
+
+def _parse_log_file(log_file: str, pattern: str, header: list) -> list:
+    """
+    Parse a single log file according to the pattern of a log format (worker of load_logs_into_df()).
+
+    :param log_file: log file path
+    :param pattern: pattern generated by generate_pattern_from_log_format()
+    :param header: field names in the pattern
+    :return: a list of matched lines, each of which is a sequence of field values in the order of header
+    """
+    compiled_pattern = _compile(_multiline_pattern(pattern))
+    is_debug = logger.isEnabledFor(logging.DEBUG)
+    single_field = len(header) == 1
+
+    # the whole file is scanned at once, instead of matching each line separately
+    with open(log_file, 'r', errors='replace') as log:
+        text = log.read()
+
+    log_lines = []
+    append = log_lines.append
+    prev_end = 0
+    for m in compiled_pattern.finditer(text):
+        append([m.group(*header)] if single_field else m.group(*header))
+        if is_debug:
+            _log_skipped_lines(text[prev_end:m.start()])
+            prev_end = m.end()
+    if is_debug:
+        _log_skipped_lines(text[prev_end:])
+    return log_lines
+
+
+def _multiline_pattern(pattern: str) -> str:
+    """
+    Convert a pattern generated by generate_pattern_from_log_format() into a pattern that matches a whole line in a
+    multi-line text (in multi-line mode) as the original pattern matches the stripped line.
+
+    :param pattern: pattern generated by generate_pattern_from_log_format()
+    :return: the multi-line pattern
+    """
+    body = pattern[1:-1].replace(r'\s+', r'[^\S\n]+')  # whitespace must not span lines
+    if body.endswith('.+)'):
+        body = body[:-3] + r'.*\S)'  # the last field ends with a non-whitespace, as in the stripped line
+    return r'(?m)^[^\S\n]*' + body + r'[^\S\n]*$'
+
+
+def _log_skipped_lines(text: str):
+    for line in text.split('\n'):
+        if line.strip():
+            logger.debug(f'Skip non-matched log_line={line.strip()}')
+
+
 def generate_pattern_from_log_format(log_format: str):
     header = re.findall(r'<(\S+?)>', log_format)
     pattern = re.sub(r'(<\S+?>)', r'(?P\1.+?)', log_format)
     pattern = re.sub(r'<(\S+)_ext>\.\+\?', r'<\1_ext>.+', pattern)  # bypassing the issue of `test_generate_pattern_from_format_Zookeeper`
     pattern = re.sub(r'\s+', r'\\s+', pattern)
+    # a field followed by whitespace ends at the first whitespace, and the last field takes the rest of the line;
+    # matching them as such avoids trying every possible end of each field (backtracking) for every log line
+    pattern = re.sub(r'\.\+\?\)\\s\+', r'\\S+)\\s+', pattern)
+    pattern = re.sub(r'\.\+\?\)$', r'.+)', pattern)
     pattern = '^' + pattern + '$'
     return header, pattern
 
 
+@lru_cache(maxsize=65536)
 def generate_pattern_from_template(template: str):
-    escaped = re.escape(template)
-    spaced_escape = re.sub(r'\\\s+', "\\\s+", escaped)
-    return "^" + spaced_escape.replace(r"<\*>", r"(.*?)") + "$"  # a single <*> can consume multiple tokens
+    # escape the constant parts between <*> and let each escaped whitespace match any whitespace
+    escaped_parts = [_ESCAPED_WHITESPACE.sub(r'\\s+', re.escape(part)) for part in template.split('<*>')]
+    return "^" + "(.*?)".join(escaped_parts) + "$"  # a single <*> can consume multiple tokens
+
+
+@lru_cache(maxsize=None)
+def compile_template(template: str):
+    # templates recur over many log messages; compile each of them once
+    return _compile(generate_pattern_from_template(template))
 
 
 def get_parameter_list(row):
@@ -141,8 +291,7 @@ def get_parameter_list(row):
     if "<*>" not in template:
         return []
 
-    pattern = generate_pattern_from_template(template)
-    parameter_list = re.findall(pattern, row['message'])
+    parameter_list = compile_template(template).findall(row['message'])
     parameter_list = parameter_list[0] if parameter_list else ()
     parameter_list = list(parameter_list) if isinstance(parameter_list, tuple) else [parameter_list]
     return parameter_list
@@ -157,20 +306,109 @@ def convert_df_into_l_vectors(logs_df: pd.DataFrame, num_logs=None, include_comp
     :param include_component: (optional, default=False) True to include component information in l_vectors
     :return: l_vectors (dict, key: log_id, value: a log = a list of log entries)
     """
-    logs_df = logs_df.copy()
     print(f'Total number of log entries in logs_df: {len(logs_df.index)}')
+
+    # use subset of all logs if specified; the logs are sampled first, so that only the sampled ones are converted
+    log_ids = list(logs_df['logID'].unique()) if num_logs else []
+    if num_logs and num_logs < len(log_ids):
+        print(f'Use only {num_logs} logs among {len(log_ids)} logs')
+        logger.info(f'Use only {num_logs} logs among {len(log_ids)} logs')
+        logs_df = logs_df[logs_df['logID'].isin(random.sample(log_ids, k=num_logs))].copy()
+    else:
+        logs_df = logs_df.copy()  # all logs (also when there are no more than num_logs logs)
+
+    l_vectors = dict()
+    _add_df_into_l_vectors(logs_df, l_vectors, include_component)
+
+    if not num_logs:
+        logger.info(f'Total number of logs: {len(l_vectors.keys())}')
+
+    return l_vectors
+
+
+def read_csv_into_l_vectors(logs_csv: str, include_component=False, chunksize=CSV_CHUNKSIZE, cache_dir: str = None,
+                            num_logs=None):
+    """
+    Same as convert_df_into_l_vectors(pd.read_csv(logs_csv, dtype={'tid': str}), num_logs), but the csv file is read
+    and converted chunk by chunk, so that the whole DataFrame is never in memory together with the l_vectors.
+
+    :param logs_csv: structured logs (csv file)
+    :param include_component: (optional, default=False) True to include component information in l_vectors
+    :param chunksize: (optional) the number of log entries converted at once
+    :param cache_dir: (optional) directory to pickle the l_vectors into, to reuse them as long as the csv file (path,
+                      size, and modification time) is the same; no cache by default (and not used with num_logs)
+    :param num_logs: (optional) the number of logs want to convert / for experiments
+    :return: l_vectors (dict, key: log_id, value: a log = a list of log entries)
+    """
+    sampled_log_ids = None
+    if num_logs:
+        # sample the logs as convert_df_into_l_vectors() does, from the logIDs only; the other logs are not converted
+        log_ids = list(pd.read_csv(logs_csv, usecols=['logID'])['logID'].unique())
+        if num_logs < len(log_ids):
+            print(f'Use only {num_logs} logs among {len(log_ids)} logs')
+            logger.info(f'Use only {num_logs} logs among {len(log_ids)} logs')
+            sampled_log_ids = set(random.sample(log_ids, k=num_logs))
+        cache_dir = None  # a different sample every time
+
+    cache_file = None
+    if cache_dir:
+        key = _logs_cache_key(f'l_vectors(include_component={include_component})', [logs_csv])
+        cache_file = os.path.join(cache_dir, f'l_vectors_{key}.pickle')
+        if os.path.isfile(cache_file):
+            with open(cache_file, 'rb') as f:
+                l_vectors = pickle.load(f)
+            _intern_l_vectors(l_vectors)
+            print(f'Total number of log entries in logs_df: {sum(map(len, l_vectors.values()))} (cached)')
+            logger.info(f'loaded l_vectors from cache: {cache_file}')
+            return l_vectors
+
+    l_vectors = dict()
+    num_entries = 0
+    with pd.read_csv(logs_csv, dtype={'tid': str}, usecols=lambda column: column in L_VECTORS_COLUMNS,
+                     chunksize=chunksize) as chunks:
+        for logs_df in chunks:
+            num_entries += len(logs_df.index)
+            if sampled_log_ids is not None:
+                logs_df = logs_df[logs_df['logID'].isin(sampled_log_ids)].copy()
+            _add_df_into_l_vectors(logs_df, l_vectors, include_component)  # a log may span multiple chunks
+    print(f'Total number of log entries in logs_df: {num_entries}')
+    if not num_logs:
+        logger.info(f'Total number of logs: {len(l_vectors.keys())}')
+
+    if cache_file:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_file, 'wb') as f:
+            pickle.dump(l_vectors, f, protocol=pickle.HIGHEST_PROTOCOL)
+        logger.info(f'saved l_vectors to cache: {cache_file}')
+
+    return l_vectors
+
+
+def _intern_l_vectors(l_vectors: dict):
+    # unpickled strings are not interned (see _add_df_into_l_vectors()); each distinct string is a single object though
+    for l_vector in l_vectors.values():
+        for log_entry in l_vector:
+            for key in ('tid', 'component'):
+                value = log_entry.get(key)
+                if isinstance(value, str):
+                    log_entry[key] = sys.intern(value)
+
+
+def _add_df_into_l_vectors(logs_df: pd.DataFrame, l_vectors: dict, include_component: bool):
+    # convert logs_df (modified in place) and add its log entries into l_vectors
     header = set(logs_df.columns)
 
     if 'component' not in header:
         logs_df['component'] = 'system'
+    _categorize_columns(logs_df)
 
     if {'month', 'date', 'time'}.issubset(header):
         # (ex) month = Jun, date = 9, time = 06:06:20
-        logs_df['ts'] = logs_df.apply(lambda x: ' '.join([str(x['month']), str(x['date']), str(x['time'])]), axis=1)
+        logs_df['ts'] = _join_columns(logs_df, ['month', 'date', 'time'])
     elif {'date', 'time'}.issubset(header):
         # (ex) date = 2015-10-17, time = 15:37:56,547
         # (ex) date = 16/04/07, time=10:46:05
-        logs_df['ts'] = logs_df.apply(lambda x: ' '.join([str(x['date']), str(x['time'])]), axis=1)
+        logs_df['ts'] = _join_columns(logs_df, ['date', 'time'])
     elif {'time'}.issubset(header):
         # (ex) time = 2020-03-08T23:01:10.016Z
         logs_df = logs_df.rename(columns={'time': 'ts'})
@@ -178,27 +416,61 @@ def convert_df_into_l_vectors(logs_df: pd.DataFrame, num_logs=None, include_comp
         print(f'WARNING: No timestamp in the logs:\n{logs_df.head()}')
         logs_df['ts'] = logs_df['lineID']
 
-    l_vectors = dict()
     reduced_header = ['ts', 'tid', 'values']
     if include_component:
         reduced_header.append('component')
-    # logs_df = logs_df[['logID'] + reduced_header]
-    for log_id in logs_df['logID'].unique():
-        log_df = logs_df[logs_df['logID'] == log_id][reduced_header]
-        l_vector = log_df.to_dict('records')
-        l_vectors[log_id] = l_vector
 
-    # use subset of all logs if specified
-    if num_logs:
-        print(f'Use only {num_logs} logs among {len(l_vectors.keys())} logs')
-        logger.info(f'Use only {num_logs} logs among {len(l_vectors.keys())} logs')
-        log_ids = random.sample(list(l_vectors.keys()), k=len(l_vectors.keys()) - num_logs)
-        for log_id in log_ids:
-            del l_vectors[log_id]
-    else:
-        logger.info(f'Total number of logs: {len(l_vectors.keys())}')
+    # parse values once here (e.g., "['x', 'y']" -> ('x', 'y')), instead of every time a log entry is used
+    if not pd.api.types.is_numeric_dtype(logs_df['values']):
+        logs_df['values'] = logs_df['values'].map(parse_values_list)
+
+    # intern tids and components; they are hashed and compared against the models for every log entry
+    # (only the categories are mapped, not every row)
+    for column in ['tid', 'component']:
+        if column in reduced_header and not pd.api.types.is_numeric_dtype(logs_df[column].cat.categories):
+            logs_df[column] = logs_df[column].map(lambda x: sys.intern(x) if isinstance(x, str) else x)
+    # a single pass over the column lists (instead of a DataFrame and a dict per row for each log), where the log
+    # entries are split by logID in the order of appearance; the keys of the log entries are shared
+    keys = [sys.intern(key) for key in reduced_header]
+    columns = [logs_df[key].tolist() for key in reduced_header]
+    for log_id, entry in zip(logs_df['logID'].tolist(), zip(*columns)):
+        log = l_vectors.get(log_id)
+        if log is None:
+            log = l_vectors[log_id] = []
+        log.append(dict(zip(keys, entry)))
+
+
+def _join_columns(df: pd.DataFrame, columns: list) -> pd.Series:
+    # same as ' '.join(str(x[c]) for c in columns) per row, but vectorized
+    first, *others = [df[c].astype(str) for c in columns]
+    return first.str.cat(others, sep=' ', na_rep='nan')
+
+
+@lru_cache(maxsize=65536)
+def _literal_values(values: str) -> tuple:
+    # fast path for the repr of a list of strings without quotes and escapes (e.g., "['x', 'y']"), which most of the
+    # values are: such strings cannot contain "', '", so splitting gives the items; others go to ast.literal_eval()
+    if values == '[]':
+        return ()
+    if values.startswith("['") and values.endswith("']") and '\\' not in values and '"' not in values:
+        items = values[2:-2].split("', '")
+        if all("'" not in item for item in items):
+            return tuple(items)
+    return tuple(ast.literal_eval(values))
+
+
+def parse_values_list(values):
+    """
+    Convert the values of a log entry into a tuple, the form of values in l_vectors.
 
-    return l_vectors
+    :param values: values as a str of a list (e.g., "['x', 'y']"), a list, or a tuple
+    :return: tuple of values (e.g., ('x', 'y')); other objects (e.g., NaN) are returned as they are
+    """
+    if isinstance(values, str):
+        return _literal_values(values)
+    if isinstance(values, list):
+        return tuple(values)
+    return values
 
 
 def generate_map_from_tid_to_components(l_vectors: dict) -> dict:
@@ -209,13 +481,14 @@ def generate_map_from_tid_to_components(l_vectors: dict) -> dict:
     :return: a dict from tid to component
     """
     tid_to_components = {}
-    for log_id, l_vector in l_vectors.items():
+    short_names = {}  # component -> component without the package prefix; there are only a few distinct components
+    for l_vector in l_vectors.values():
         for e in l_vector:
-            e['component'] = e['component'].replace('org.apache.hadoop.', '')
-            if e['tid'] in tid_to_components.keys():
-                tid_to_components[e['tid']].add(e['component'])
-            else:
-                tid_to_components[e['tid']] = {e['component']}
+            component = short_names.get(e['component'])
+            if component is None:
+                component = short_names[e['component']] = e['component'].replace('org.apache.hadoop.', '')
+            e['component'] = component
+            tid_to_components.setdefault(e['tid'], set()).add(component)
     return tid_to_components
 
 
@@ -232,6 +505,14 @@ def common_arg_parser(systems, name: str = ''):
                         type=str, default='1,1')
     parser.add_argument('-r', '--repetitions', help="Number of repetitions (default=1)",
                         type=int, default=1)
+    parser.add_argument('--reuse_determinization',
+                        help="Specify this to reuse the determinization results of duplicate_factor=1 for the "
+                             "duplicated logs when PRINS infers the same m_sys (time_s='reused'; hybrid-1, used for "
+                             "RQ4, is still determinized and timed)",
+                        dest='reuse_determinization', action='store_true', default=False)
+    parser.add_argument('--resume',
+                        help="Timestamp of a previous run to resume from its summary csv file (default=None)",
+                        type=str, default=None)
     args = parser.parse_args()
 
     # specify target systems
@@ -243,8 +524,7 @@ def common_arg_parser(systems, name: str = ''):
 
 
 def common_logger(name: str, level='DEBUG'):
-    if not os.path.exists('_logs'):
-        os.makedirs(os.path.join('_logs'))
+    os.makedirs('_logs', exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     log_id = timestamp + f'_{os.getpid()}'
     log_file = os.path.join('_logs', f'{name}_{log_id}.log')
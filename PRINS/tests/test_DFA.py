@@ -21,7 +21,9 @@ SPDX-FileCopyrightText: 2021 University of Luxembourg
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 
+import pickle
 import unittest
+import numpy as np
 from src.automata.DFA import DFA
 
 
@@ -66,6 +68,18 @@ class TestDFA(unittest.TestCase):
         ]
         self.assertEqual(False, model.dfa_check_acceptance(l_vector))
 
+    def test_check_acceptance_after_shorten_states(self):
+        model = DFA(self.component, self.ext_dfa)
+        l_vector = [
+            {'ts': 1, 'tid': 'a', 'values': "['1']"},
+            {'ts': 2, 'tid': 'c', 'values': "[]"},
+            {'ts': 3, 'tid': 'b', 'values': "[]"},
+        ]
+        self.assertEqual(True, model.dfa_check_acceptance(l_vector))
+        model.shorten_states()  # the compiled table should be rebuilt with the new state names
+        self.assertEqual(True, model.dfa_check_acceptance(l_vector))
+        self.assertEqual(False, model.dfa_check_acceptance(l_vector[:2]))
+
     def test_make_guarded_transition(self):
         model = DFA(self.component, self.ext_dfa)
         self.assertEqual('s1', model.make_guarded_transition('s0', {'ts': None, 'tid': 'a', 'values': "['1']"}))
@@ -73,6 +87,18 @@ class TestDFA(unittest.TestCase):
         self.assertEqual(None, model.make_guarded_transition('s0', {'ts': None, 'tid': 'b', 'values': "[]"}))
         self.assertEqual('s1', model.make_guarded_transition('s1', {'ts': None, 'tid': 'c', 'values': "[]"}))
 
+    def test_make_guarded_transition_compiled_guards(self):
+        # compiled guards give the same results as evaluating the guard strings
+        guards = ['var0=="1" and var1!="x"', 'var0=="2" or var1=="x"', 'not (var0=="1")']
+        for values in [('1', 'y'), ('2', 'x'), ('1', 'x'), ('3', 'z')]:
+            for guard in guards:
+                ext_dfa = {'alphabet': {('a', guard)}, 'states': {'s0', 's1'}, 'initial_state': 's0',
+                           'accepting_states': {'s1'}, 'transitions': {('s0', ('a', guard)): 's1'}}
+                model = DFA(self.component, ext_dfa)
+                expected = 's1' if eval(guard, {}, {'var0': values[0], 'var1': values[1]}) else None
+                log_entry = {'ts': None, 'tid': 'a', 'values': values}
+                self.assertEqual(expected, model.make_guarded_transition('s0', log_entry))
+
     def test_shorten_states(self):
         model = DFA(self.component, self.ext_dfa)
         model.shorten_states()
@@ -107,3 +133,91 @@ class TestDFA(unittest.TestCase):
                           ('1', ('c', None)): '1',
                           ('2', ('c', None)): '0'}, model.transitions)
         self.assertEqual({('a', 'var0=="1"'), ('a', 'var0!="1"'), ('b', None), ('c', None)}, model.alphabet)
+
+    def test_shorten_states_natsorted_set_names(self):
+        ext_dfa = {'alphabet': {('a', None), ('b', None)},
+                   'states': {"{'s0'}", "{'s2', 's10'}", "{'s1', 's2'}"}, 'initial_state': "{'s0'}",
+                   'accepting_states': {"{'s2', 's10'}"},
+                   'transitions': {
+                       ("{'s0'}", ('a', None)): "{'s1', 's2'}",
+                       ("{'s1', 's2'}", ('b', None)): "{'s2', 's10'}"
+                   }}
+        model = DFA(self.component, ext_dfa)
+        model.shorten_states(consider_set_names=True)  # ['s0'] -> 0, ['s1', 's2'] -> 1, ['s2', 's10'] -> 2
+        self.assertEqual('0', model.initial_state)
+        self.assertEqual({'0', '1', '2'}, model.states)
+        self.assertEqual({'2'}, model.accepting_states)
+        self.assertEqual({('0', ('a', None)): '1', ('1', ('b', None)): '2'}, model.transitions)
+
+    def test_batch_check_acceptance(self):
+        l_vectors = [
+            [{'ts': 1, 'tid': 'a', 'values': "['1']"}, {'ts': 2, 'tid': 'b', 'values': "[]"}],
+            [{'ts': 1, 'tid': 'a', 'values': "['2']"}],
+            [{'ts': 1, 'tid': 'a', 'values': "['2']"}, {'ts': 2, 'tid': 'c', 'values': "[]"}],
+            [{'ts': 1, 'tid': 'x', 'values': "[]"}],
+            []
+        ]
+
+        # with guards
+        model = DFA(self.component, self.ext_dfa)
+        self.assertEqual([True, False, True, False, True], model.batch_check_acceptance(l_vectors).tolist())
+
+        # without guards (vectorized)
+        ext_dfa = {'alphabet': {('a', None), ('b', None), ('c', None)},
+                   'states': {'s0', 's1'}, 'initial_state': 's0', 'accepting_states': {'s0'},
+                   'transitions': {('s0', ('a', None)): 's1', ('s1', ('b', None)): 's0', ('s1', ('c', None)): 's1'}}
+        model = DFA(self.component, ext_dfa)
+        expected = [model.dfa_check_acceptance(l_vector) for l_vector in l_vectors]
+        self.assertEqual([True, False, False, False, True], expected)
+        self.assertEqual(expected, model.batch_check_acceptance(l_vectors).tolist())
+
+    def test_compile_table(self):
+        ext_dfa = {'alphabet': {('a', None), ('b', None)},
+                   'states': {'s0', 's1'}, 'initial_state': 's0', 'accepting_states': {'s0'},
+                   'transitions': {('s0', ('a', None)): 's1', ('s1', ('b', None)): 's0'}}
+        model = DFA(self.component, ext_dfa)
+        model.compile_table()
+        s0, s1 = model.state_id('s0'), model.state_id('s1')
+        a, b = model._tid_ids['a'], model._tid_ids['b']
+        self.assertEqual(np.int32, model._trans.dtype)
+        self.assertEqual((2, 2), model._trans.shape)
+        self.assertEqual(-1, model._trans[s0, b])
+        self.assertEqual(((None, s1),), model._cells[model._trans[s0, a]])
+
+        # without guards: (state id, tid id) -> dst id, -1 for no transition and unknown tids (last column)
+        expected = np.full((2, 3), -1, dtype=np.int32)
+        expected[s0, a], expected[s1, b] = s1, s0
+        self.assertEqual(expected.tolist(), model._dst.tolist())
+        self.assertEqual((True, False), (model._accept[s0], model._accept[s1]))
+        self.assertEqual([True, False], model._accept_array[[s0, s1]].tolist())
+
+        # guarded cells are kept as candidates
+        model = DFA(self.component, self.ext_dfa)
+        model.compile_table()
+        self.assertIsNone(model._dst)
+        self.assertEqual(2, len(model._cells[model._trans[model.state_id('s0'), model._tid_ids['a']]]))
+
+    def test_shorten_states_frozenset_names(self):
+        ext_dfa = {'alphabet': {('a', None)},
+                   'states': {frozenset({'s0'}), frozenset({'s1', 's10'})}, 'initial_state': frozenset({'s0'}),
+                   'accepting_states': {frozenset({'s1', 's10'})},
+                   'transitions': {(frozenset({'s0'}), ('a', None)): frozenset({'s10', 's1'})}}
+        model = DFA(self.component, ext_dfa)
+        model.shorten_states(consider_set_names=True)
+        self.assertEqual('0', model.initial_state)
+        self.assertEqual({'1'}, model.accepting_states)
+        self.assertEqual({('0', ('a', None)): '1'}, model.transitions)
+
+    def test_pickle_without_derived(self):
+        model = DFA(self.component, self.ext_dfa)
+        l_vector = [{'ts': 1, 'tid': 'a', 'values': "['1']"}, {'ts': 2, 'tid': 'b', 'values': "[]"}]
+        self.assertEqual(True, model.dfa_check_acceptance(l_vector))  # builds the table
+
+        restored = pickle.loads(pickle.dumps(model))
+        self.assertIsNone(restored._trans)
+        self.assertEqual(model.transitions, restored.transitions)
+        self.assertEqual(True, restored.dfa_check_acceptance(l_vector))
+
+        model.compact()
+        self.assertIsNone(model._trans)
+        self.assertEqual(True, model.dfa_check_acceptance(l_vector))
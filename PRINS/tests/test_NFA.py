@@ -25,6 +25,8 @@ import os
 import tempfile
 import unittest
 import copy
+import pickle
+from unittest import mock
 from src.automata.NFA import NFA
 from src.main.mint_helper import run_mint_using_mint_input
 
@@ -63,6 +65,15 @@ class TestNFA(unittest.TestCase):
         ]
         self.assertEqual(False, model.nfa_check_acceptance(l_vector))
 
+    def test_check_acceptance_rejects_before_guards(self):
+        model = NFA(self.component, self.ext_nfa)
+        with mock.patch('src.automata.NFA.select_guard') as select_guard:
+            # no transition with 'b' from the initial state; the guards on 'a' are not evaluated
+            self.assertEqual(False, model.nfa_check_acceptance([{'tid': 'b', 'values': ()},
+                                                                {'tid': 'a', 'values': ('1',)}]))
+            self.assertEqual(False, model.nfa_check_acceptance([{'tid': 'x', 'values': ()}]))
+            select_guard.assert_not_called()
+
     def test_check_acceptance2(self):
         model = NFA(self.component, self.ext_nfa)
         l_vector = [
@@ -72,6 +83,74 @@ class TestNFA(unittest.TestCase):
         ]
         self.assertEqual(True, model.nfa_check_acceptance(l_vector))
 
+    def test_check_acceptance_non_deterministic(self):
+        model = NFA(self.component, self.ext_nfa2)
+        l_vector = [{'tid': 'a', 'values': "[]"}, {'tid': 'b', 'values': "[]"}]
+        self.assertEqual(True, model.nfa_check_acceptance(l_vector))  # via s1
+        l_vector = [{'tid': 'a', 'values': "[]"}, {'tid': 'b', 'values': "[]"}, {'tid': 'b', 'values': "[]"}]
+        self.assertEqual(False, model.nfa_check_acceptance(l_vector))  # only s2 remains
+        l_vector.append({'tid': 'c', 'values': "[]"})
+        self.assertEqual(True, model.nfa_check_acceptance(l_vector))
+        l_vector.append({'tid': 'd', 'values': "[]"})
+        self.assertEqual(False, model.nfa_check_acceptance(l_vector))
+
+        self.assertNotEqual({}, model._levels)  # unguarded steps are cached
+
+        # the compiled masks (and the cached steps) must follow state merges
+        model.merge_states({'s1', 's2'})
+        self.assertEqual({}, model._levels)
+        l_vector = [{'tid': 'a', 'values': "[]"}, {'tid': 'b', 'values': "[]"}, {'tid': 'b', 'values': "[]"}]
+        self.assertEqual(True, model.nfa_check_acceptance(l_vector))
+
+    def test_check_acceptance_deterministic_unguarded(self):
+        ext_nfa = {'alphabet': {('a', None), ('b', None)}, 'states': {'s0', 's1'}, 'initial_state': 's0',
+                   'accepting_states': {'s0'},
+                   'transitions': {('s0', ('a', None)): {'s1'}, ('s1', ('b', None)): {'s0'}}}
+        model = NFA(self.component, ext_nfa)
+        self.assertEqual(True, model.nfa_check_acceptance([{'tid': 'a', 'values': ()}, {'tid': 'b', 'values': ()}]))
+        self.assertIsNotNone(model._columns)  # walked state by state
+        self.assertEqual(False, model.nfa_check_acceptance([{'tid': 'a', 'values': ()}]))
+        self.assertEqual(False, model.nfa_check_acceptance([{'tid': 'b', 'values': ()}]))
+        self.assertEqual(False, model.nfa_check_acceptance([{'tid': 'x', 'values': ()}]))
+
+        # non-deterministic models are walked with sets of states
+        model = NFA(self.component, self.ext_nfa2)
+        self.assertEqual(True, model.nfa_check_acceptance([{'tid': 'a', 'values': ()}, {'tid': 'b', 'values': ()}]))
+        self.assertIsNone(model._columns)
+
+    def test_state_id(self):
+        model = NFA(self.component, self.ext_nfa2)
+        ids = {state: model.state_id(state) for state in model.states}
+        self.assertEqual(set(range(4)), set(ids.values()))
+
+        # merging keeps the ids of the other states and assigns a new id to the merged state
+        model.merge_states({'s1', 's2'})
+        self.assertEqual(ids['s0'], model.state_id('s0'))
+        self.assertEqual(ids['s3'], model.state_id('s3'))
+        self.assertEqual(4, model.state_id('s1,s2'))
+
+        # renaming starts over
+        model.rename_states(padding=0)
+        self.assertEqual(0, model.state_id(model.initial_state))
+
+    def test_pickle_without_derived(self):
+        model = NFA(self.component, self.ext_nfa2)
+        l_vector = [{'tid': 'a', 'values': "[]"}, {'tid': 'b', 'values': "[]"}]
+        self.assertEqual(True, model.nfa_check_acceptance(l_vector))  # builds the masks
+
+        restored = pickle.loads(pickle.dumps(model))
+        self.assertIsNone(restored._succ)
+        self.assertEqual(model.transitions, restored.transitions)
+        self.assertEqual(True, restored.nfa_check_acceptance(l_vector))
+
+    def test_own_copy(self):
+        model = NFA(self.component, self.ext_nfa)
+        copied = model.own_copy()
+        self.assertEqual(model.transitions, copied.transitions)
+        copied.merge_states({'1', '2'})
+        self.assertEqual({'0', '1', '2'}, model.states)  # no shared containers
+        self.assertEqual(NFA(self.component, self.ext_nfa).transitions, model.transitions)
+
     def test_init(self):
         model = NFA(self.component, self.ext_nfa)
         expected_nfa = copy.deepcopy(self.ext_nfa)
@@ -94,6 +173,12 @@ class TestNFA(unittest.TestCase):
                           ('4', ('c', None)): {'4'}},
                          model.transitions)
 
+        # non-deterministic transitions are kept track of while renaming
+        model = NFA(self.component, self.ext_nfa2)
+        model.rename_states(padding=0)
+        self.assertEqual({('0', ('a', None)): None}, model._non_det_keys)
+        self.assertEqual({'1', '2'}, model.find_non_deterministic_states())
+
     def test_merge_states_1(self):
         model = NFA(self.component, self.ext_nfa)
         model.merge_states({'1', '2'})
@@ -163,6 +248,19 @@ class TestNFA(unittest.TestCase):
         self.assertEqual(model1.accepting_states, model2.accepting_states)
         self.assertEqual(model1.transitions, model2.transitions)
 
+    def test_merge_states_keeps_dst_sets(self):
+        ext_nfa = {'alphabet': {('a', None), ('b', None)}, 'states': {'0', '1', '2', '3'}, 'initial_state': '0',
+                   'accepting_states': {'3'},
+                   'transitions': {('0', ('a', None)): {'1'}, ('2', ('a', None)): {'3'}, ('1', ('b', None)): {'3'}}}
+        model = NFA(self.component, ext_nfa)
+        kept = model.transitions[('1', ('b', None))]
+        shared = model.transitions[('0', ('a', None))]  # e.g., shared with an appended model
+        model.merge_states({'0', '2'})
+        self.assertEqual({('0,2', ('a', None)): {'1', '3'}, ('1', ('b', None)): {'3'}}, model.transitions)
+        self.assertIs(kept, model.transitions[('1', ('b', None))])  # not copied
+        self.assertEqual({'1'}, shared)  # not updated in place
+        self.assertEqual([('0,2', ('a', None))], list(model.non_deterministic_keys()))
+
     def test_append_1(self):
         model1 = NFA(self.component, self.ext_nfa)
         ext_nfa2 = {'alphabet': {('a', None)},
@@ -222,6 +320,46 @@ class TestNFA(unittest.TestCase):
         model = NFA(self.component, self.ext_nfa)
         self.assertEqual({'3', '2', '1'}, model.find_non_deterministic_states())
 
+    def test_non_deterministic_keys(self):
+        model = NFA(self.component, self.ext_nfa2)
+        self.assertEqual([('s0', ('a', None))], list(model.non_deterministic_keys()))
+
+        # kept up to date by merge_states() without a full scan
+        model.merge_states({'s1', 's2'})
+        self.assertEqual([('s1,s2', ('b', None))], list(model.non_deterministic_keys()))
+        self.assertEqual({'s1,s2', 's3'}, model.find_non_deterministic_states())
+        model.merge_states({'s1,s2', 's3'})
+        self.assertEqual([], list(model.non_deterministic_keys()))
+        self.assertEqual(None, model.find_non_deterministic_states())
+
+    def test_merge_state_groups(self):
+        ext_nfa = {
+            'alphabet': {('a', None), ('b', None), ('c', None)},
+            'states': {'0', '1', '2', '3', '4', '5'},
+            'initial_state': '0',
+            'accepting_states': {'5'},
+            'transitions': {
+                ('0', ('a', None)): {'1', '2'},
+                ('0', ('b', None)): {'2', '3'},
+                ('1', ('c', None)): {'4', '5'},
+                ('4', ('c', None)): {'5'}
+            }
+        }
+        model = NFA(self.component, ext_nfa)
+        groups = model.find_all_non_deterministic_states()
+        self.assertCountEqual([{'1', '2', '3'}, {'4', '5'}], groups)
+
+        # merging the groups at once is the same as merging them one by one
+        model_exp = NFA(self.component, ext_nfa)
+        for group in groups:
+            model_exp.merge_states(group)
+        model.merge_state_groups(groups)
+        self.assertEqual(model_exp.initial_state, model.initial_state)
+        self.assertEqual({'4,5'}, model.accepting_states)
+        self.assertEqual(model_exp.states, model.states)
+        self.assertEqual(model_exp.transitions, model.transitions)
+        self.assertEqual([], model.find_all_non_deterministic_states())
+
     def test_nfa_guarded_transition(self):
         model = NFA(self.component, self.ext_nfa)
         dst_states = model.nfa_guarded_transition('0', {'tid': 'a', 'values': "['1']"})
@@ -255,6 +393,19 @@ class TestNFA(unittest.TestCase):
         self.assertEqual({('a', 'var0=="1"'), ('c', None)}, sliced_model.alphabet)
         self.check_model_equivalence(model, model_exp)
 
+    def test_compile_steps(self):
+        model = NFA(self.component, self.ext_nfa)
+        model.compile_steps()
+        self.assertEqual(('0', ('b', None)), model._steps[('1', 'b')])  # single unguarded transition
+        self.assertEqual([('var0=="1"', {'1'}), ('var0!="1"', {'2'})],
+                         sorted(model._steps[('0', 'a')], reverse=True))  # guarded transitions
+
+        # the steps are rebuilt after the transitions change
+        model.merge_states({'1', '2'})
+        self.assertIsNone(model._steps)
+        sliced_model = model.slice([{'tid': 'b', 'values': "[]"}], {model: '1,2'})
+        self.assertEqual({('1,2', ('b', None)): {'0'}}, sliced_model.transitions)
+
     def test_slice2(self):
         # bug fix: slice()
         ext_nfa = {
@@ -325,6 +476,21 @@ class TestNFA(unittest.TestCase):
         self.assertEqual(self.ext_nfa2['alphabet'], model_dfa.alphabet)
         self.assertEqual(7, len(model_dfa.transitions))
 
+    def test_subset_construction(self):
+        model = NFA(self.component, self.ext_nfa2)
+        ext_dfa = model.subset_construction()
+        # subsets (natsorted by their str): 0=[s0], 1=[s1, s2], 2=[s2, s3], 3=[s2], 4=[s3]
+        self.assertEqual('0', ext_dfa['initial_state'])
+        self.assertEqual({'0', '1', '2', '3', '4'}, ext_dfa['states'])
+        self.assertEqual({'2', '4'}, ext_dfa['accepting_states'])
+        self.assertEqual({('0', ('a', None)): '1',
+                          ('1', ('b', None)): '2',
+                          ('1', ('c', None)): '4',
+                          ('2', ('b', None)): '3',
+                          ('2', ('c', None)): '4',
+                          ('3', ('b', None)): '3',
+                          ('3', ('c', None)): '4'}, ext_dfa['transitions'])
+
     def test_determinize_hybrid(self):
         ext_nfa = {
             'alphabet': {('a', None), ('b', None), ('c', None), ('d', None)},
@@ -385,6 +551,15 @@ class TestNFA(unittest.TestCase):
                           ('1', ('c', None)): {'1'},
                           ('2', ('c', None)): {'0,3'},
                           ('4', ('Y', None)): {'0,3'}}, model.transitions)
+        self.assertEqual({'s0', 's1'}, model2.states)  # the given models are not renamed
+
+        # the initial states are merged along with the renaming; transitions from them may become non-deterministic
+        model3 = NFA(self.component, {'alphabet': {('X', None)}, 'states': {'t0', 't1'}, 'initial_state': 't0',
+                                      'accepting_states': {'t1'}, 'transitions': {('t0', ('X', None)): {'t1'}}})
+        model = NFA.union_nfa_models([model1, model2, model3])
+        self.assertEqual('0,3,5', model.initial_state)
+        self.assertEqual({'4', '6'}, model.transitions[('0,3,5', ('X', None))])
+        self.assertEqual({('0,3,5', ('X', None)): None}, model.non_deterministic_keys())
 
     def check_model_equivalence(self, model, model_exp):
         self.assertEqual(model.transitions, model_exp.transitions)
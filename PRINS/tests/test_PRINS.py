@@ -37,13 +37,13 @@ class TestPRINS(unittest.TestCase):
         with tempfile.TemporaryDirectory() as output_dir:
             instance = PRINS(self.system, self.logs_csv, output_dir)
             component_logs = instance.project()
-            self.assertEqual({'comp1': {1: [{'ts': 1, 'tid': 'E1', 'values': "['x']", 'component': 'comp1'},
-                                            {'ts': 3, 'tid': 'E1', 'values': "['y']", 'component': 'comp1'},
-                                            {'ts': 4, 'tid': 'E3', 'values': '[]', 'component': 'comp1'}],
-                                        2: [{'ts': 1, 'tid': 'E1', 'values': "['z']", 'component': 'comp1'}]},
-                              'comp2': {1: [{'ts': 2, 'tid': 'E2', 'values': '[]', 'component': 'comp2'}],
-                                        2: [{'ts': 3, 'tid': 'E2', 'values': '[]', 'component': 'comp2'}]},
-                              'comp3': {2: [{'ts': 2, 'tid': 'E4', 'values': '[]', 'component': 'comp3'}]}},
+            self.assertEqual({'comp1': {1: [{'ts': 1, 'tid': 'E1', 'values': ('x',), 'component': 'comp1'},
+                                            {'ts': 3, 'tid': 'E1', 'values': ('y',), 'component': 'comp1'},
+                                            {'ts': 4, 'tid': 'E3', 'values': (), 'component': 'comp1'}],
+                                        2: [{'ts': 1, 'tid': 'E1', 'values': ('z',), 'component': 'comp1'}]},
+                              'comp2': {1: [{'ts': 2, 'tid': 'E2', 'values': (), 'component': 'comp2'}],
+                                        2: [{'ts': 3, 'tid': 'E2', 'values': (), 'component': 'comp2'}]},
+                              'comp3': {2: [{'ts': 2, 'tid': 'E4', 'values': (), 'component': 'comp3'}]}},
                              component_logs)
 
     def test_partition_log_by_component(self):
@@ -51,15 +51,15 @@ class TestPRINS(unittest.TestCase):
         l_vectors = convert_df_into_l_vectors(logs_df, include_component=True)
         partitioned_log = PRINS.partition_log_by_component(l_vectors[1])
         self.assertEqual([
-            ('comp1', [{'ts': 1, 'tid': 'E1', 'values': "['x']", 'component': 'comp1'}]),
-            ('comp2', [{'ts': 2, 'tid': 'E2', 'values': '[]', 'component': 'comp2'}]),
-            ('comp1', [{'ts': 3, 'tid': 'E1', 'values': "['y']", 'component': 'comp1'},
-                       {'ts': 4, 'tid': 'E3', 'values': '[]', 'component': 'comp1'}])], partitioned_log)
+            ('comp1', [{'ts': 1, 'tid': 'E1', 'values': ('x',), 'component': 'comp1'}]),
+            ('comp2', [{'ts': 2, 'tid': 'E2', 'values': (), 'component': 'comp2'}]),
+            ('comp1', [{'ts': 3, 'tid': 'E1', 'values': ('y',), 'component': 'comp1'},
+                       {'ts': 4, 'tid': 'E3', 'values': (), 'component': 'comp1'}])], partitioned_log)
         partitioned_log = PRINS.partition_log_by_component(l_vectors[2])
         self.assertEqual([
-            ('comp1', [{'component': 'comp1', 'tid': 'E1', 'ts': 1, 'values': "['z']"}]),
-            ('comp3', [{'component': 'comp3', 'tid': 'E4', 'ts': 2, 'values': '[]'}]),
-            ('comp2', [{'component': 'comp2', 'tid': 'E2', 'ts': 3, 'values': '[]'}])], partitioned_log)
+            ('comp1', [{'component': 'comp1', 'tid': 'E1', 'ts': 1, 'values': ('z',)}]),
+            ('comp3', [{'component': 'comp3', 'tid': 'E4', 'ts': 2, 'values': ()}]),
+            ('comp2', [{'component': 'comp2', 'tid': 'E2', 'ts': 3, 'values': ()}])], partitioned_log)
 
     def test_partition_log_by_component_empty(self):
         self.assertEqual([], PRINS.partition_log_by_component([]))
@@ -22,6 +22,7 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 
 import unittest
+import natsort
 from src.automata.automata_utils import *
 
 
@@ -37,8 +38,74 @@ class TestAutomataUtils(unittest.TestCase):
         values = "[]"
         self.assertEqual(False, evaluate(guard, values))
 
+        # memoized per (guard, values); unhashable values are also accepted
+        self.assertEqual(True, evaluate(guard, ['ok']))
+        self.assertEqual(False, evaluate(guard, ['not-ok']))
+
     def test_evaluate2(self):
         # bug fix: mint's value must not include whitespace, so we should delete whitespace in values in evaluate()
         guard = 'var0=="211.90.241.7user=root" or var0=="squid.netcomputers.rouser=test"'
         values = "['211.90.241.7  user=root']"
         self.assertEqual(True, evaluate(guard, values))
+
+    def test_index_transitions(self):
+        transitions = {
+            ('s0', ('a', 'var0=="1"')): 's1',
+            ('s0', ('a', 'var0!="1"')): 's2',
+            ('s1', ('b', None)): 's0'
+        }
+        self.assertEqual({('s0', 'a'): [('var0=="1"', 's1'), ('var0!="1"', 's2')],
+                          ('s1', 'b'): [(None, 's0')]},
+                         index_transitions(transitions))
+
+    def test_intern_word(self):
+        word = intern_word(('a', 'var0=="1"'))
+        self.assertIs(word, intern_word(('a', 'var0=="1"')))
+        self.assertEqual(('a', 'var0=="1"'), word)
+
+    def test_natural_sorted(self):
+        states = {'10', '2', '1,10', '1,2', '0'}
+        self.assertEqual(['0', '1,2', '1,10', '2', '10'], natural_sorted(states))
+        alphabet = {('E10', None), ('E2', 'var0=="1"'), ('E2', None)}
+        self.assertEqual(natsort.natsorted(alphabet), natural_sorted(alphabet))
+
+    def test_compile_guard(self):
+        guard = 'var0=="ok" and var1!="ok"'
+        self.assertIs(compile_guard(guard), compile_guard(guard))  # compiled once
+        self.assertEqual(True, evaluate(guard, "['ok', 'not-ok']"))
+        self.assertEqual(False, evaluate(guard, "['ok', 'ok']"))
+        self.assertEqual(True, compile_guard(guard)({'var0': 'ok', 'var1': 'not-ok'}))
+        self.assertRaises(KeyError, compile_guard(guard), {'var0': 'ok'})  # not enough values
+
+        # disjunction of equalities (set lookup)
+        guard = 'var0=="2" or var0=="1" or var0=="17"'
+        self.assertEqual(True, evaluate(guard, ('17',)))
+        self.assertEqual(False, evaluate(guard, ('3',)))
+        self.assertEqual(False, evaluate('var0=="1" or var1=="1"', ('0', '0')))  # different variables
+        self.assertEqual(True, evaluate('var0=="1" or var1=="1"', ('0', '1')))
+        self.assertRaises(KeyError, compile_guard(guard), {})
+
+    def test_select_guard(self):
+        guards_list = [('var0=="1"', 'var0!="1"'),
+                       ('var0=="1" or var0=="2"', 'var0=="3"', None),
+                       ('var0!="1" and var0!="2"', 'var0=="1"'),
+                       ('var0!="1" and var0!="2"', 'var0!="2"', 'var0=="2"'),
+                       ('var0=="1"', 'var1=="1"'),  # different variables
+                       ('var0=="1" and var1=="1"', None),  # not a set lookup
+                       (None, 'var0=="1"')]
+        for guards in guards_list:
+            for values in [('1', '1'), ('2', '1'), ('3', '2'), ('4', '4'), ()]:
+                expected = next((i for i, guard in enumerate(guards) if evaluate(guard, values)), -1)
+                self.assertEqual(expected, select_guard(guards, values), (guards, values))
+
+        self.assertEqual(('var0', {'1': 0, '2': 0, '3': 1}, 2), guard_table(guards_list[1]))
+        self.assertEqual(('var0', {'1': 1, '2': -1}, 0), guard_table(guards_list[2]))
+        self.assertIsNone(guard_table(guards_list[4]))
+        self.assertIsNone(guard_table(guards_list[5]))
+
+    def test_parse_values(self):
+        self.assertEqual({'var0': 'ok', 'var1': 'a=b'}, parse_values("['(ok)', 'a = b']"))
+        self.assertEqual({}, parse_values("[]"))
+        self.assertIs(parse_values("['ok']"), parse_values("['ok']"))  # parsed once
+        self.assertEqual({'var0': 'ok', 'var1': 'a=b'}, parse_values(('(ok)', 'a = b')))  # pre-parsed values
+        self.assertEqual(True, evaluate('var0=="ok"', ('ok',)))
@@ -21,8 +21,11 @@ SPDX-FileCopyrightText: 2021 University of Luxembourg
 SPDX-License-Identifier: GPL-3.0-or-later
 """
 
+import random
+import tempfile
 import unittest
 from src.utils.common import *
+from src.utils.common import _multiline_pattern, _compile
 
 
 class TestCommonUtils(unittest.TestCase):
@@ -40,6 +43,33 @@ class TestCommonUtils(unittest.TestCase):
         self.assertEqual('org.apache.hadoop.mapreduce.v2.app.client.MRClientService', m.group('component'))
         self.assertEqual('Instantiated MRClientService at MININT-FNANLI5.fareast.corp.microsoft.com/10.86.169.121:49465', m.group('message'))
 
+    def test_generate_pattern_from_format_whitespace_fields(self):
+        log_format = r'<date> <time> <level> \[<process>\] <component>: <message>'
+        header, pattern = generate_pattern_from_log_format(log_format)
+        self.assertEqual(r'^(?P<date>\S+)\s+(?P<time>\S+)\s+(?P<level>\S+)\s+\[(?P<process>.+?)\]\s+'
+                         r'(?P<component>.+?):\s+(?P<message>.+)$', pattern)
+
+        # fields not followed by whitespace may still include whitespace
+        log_line = '2015-10-17 15:38:07,611 INFO [IPC Server handler 5 on 8020] org.apache.hadoop.ipc.Server: a: b'
+        m = re.match(pattern, log_line)
+        self.assertEqual('IPC Server handler 5 on 8020', m.group('process'))
+        self.assertEqual('org.apache.hadoop.ipc.Server', m.group('component'))
+        self.assertEqual('a: b', m.group('message'))
+
+    def test_multiline_pattern(self):
+        log_format = r'<date> <time> <level> \[<process>\] <component>: <message>'
+        header, pattern = generate_pattern_from_log_format(log_format)
+        text = '  2015-10-17 15:38:07,611 INFO [main] a.B: hello world  \n' \
+               'not a log line\n' \
+               '\n' \
+               '2015-10-17\t15:38:08,611 WARN [IPC Server] a.C:   x\n'
+        matches = [m.group(*header) for m in re.finditer(_multiline_pattern(pattern), text)]
+        expected = [re.match(pattern, line.strip()).group(*header) for line in text.split('\n')
+                    if re.match(pattern, line.strip())]
+        self.assertEqual(2, len(matches))
+        self.assertEqual(expected, matches)
+        self.assertIs(_compile(_multiline_pattern(pattern)), _compile(_multiline_pattern(pattern)))  # compiled once
+
     def test_generate_pattern_from_format_Linux_with_pid(self):
         log_format = r'<month> <date> <time> <level> <component>(\[<pid>\])?: <message>'
         log_line = 'Jun 12 00:07:45 combo ftpd[7720]: connection from 222.33.90.199 () at Sun Jun 12 00:07:45 2005'
@@ -87,11 +117,11 @@ class TestCommonUtils(unittest.TestCase):
 
     def test_get_log_files_under_dir(self):
         log_files = get_log_files_under_dir(os.path.join('tests', 'resources', 'logs'))
-        self.assertEqual([('tests/resources/logs/subdir1', '1.log'),
-                          ('tests/resources/logs/subdir1', '2.log'),
-                          ('tests/resources/logs/subdir1', '3.log'),
-                          ('tests/resources/logs/subdir2', '1.log'),
-                          ('tests/resources/logs/subdir2', '2.log')], log_files)
+        self.assertEqual(['tests/resources/logs/subdir1/1.log',
+                          'tests/resources/logs/subdir1/2.log',
+                          'tests/resources/logs/subdir1/3.log',
+                          'tests/resources/logs/subdir2/1.log',
+                          'tests/resources/logs/subdir2/2.log'], log_files)
 
     def test_load_logs_into_df(self):
         log_files = get_log_files_under_dir(os.path.join('tests', 'resources', 'logs'))
@@ -99,6 +129,22 @@ class TestCommonUtils(unittest.TestCase):
         logs_df = load_logs_into_df(log_format=log_format, log_files=log_files)
         self.assertEqual([1, 2, 3, 4, 5], list(logs_df['logID']))
         self.assertEqual([1, 1, 1, 1, 1], list(logs_df['lineID']))
+        self.assertIsInstance(logs_df['logID'].dtype, pd.CategoricalDtype)
+        self.assertIsInstance(logs_df['component'].dtype, pd.CategoricalDtype)
+
+    def test_load_logs_into_df_cache(self):
+        log_files = get_log_files_under_dir(os.path.join('tests', 'resources', 'logs'))
+        log_format = r'<date> <time> <level> \[<process>\] <component>: <message>'
+        with tempfile.TemporaryDirectory() as cache_dir:
+            logs_df = load_logs_into_df(log_format=log_format, log_files=log_files, cache_dir=cache_dir)
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            cached_df = load_logs_into_df(log_format=log_format, log_files=log_files, cache_dir=cache_dir)
+            pd.testing.assert_frame_equal(logs_df, cached_df)
+
+            # a different log format (or different log files) is not served from the cache
+            load_logs_into_df(log_format=log_format + ' ', log_files=log_files, cache_dir=cache_dir)
+            load_logs_into_df(log_format=log_format, log_files=log_files[:2], cache_dir=cache_dir)
+            self.assertEqual(3, len(os.listdir(cache_dir)))
 
     def test_convert_df_into_l_vectors1(self):
         logs_df = pd.read_csv('tests/resources/test_system_structured_logs.csv')
@@ -106,23 +152,23 @@ class TestCommonUtils(unittest.TestCase):
         self.assertEqual({1: [{'component': 'rpc.statd',
                                'tid': 'E114',
                                'ts': 'Jun 9 06:06:20',
-                               'values': "['1', '0.6']"},
+                               'values': ('1', '0.6')},
                               {'component': 'hcid',
                                'tid': 'E48',
                                'ts': 'Jun 9 06:06:22',
-                               'values': "['2.4']"},
+                               'values': ('2.4',)},
                               {'component': 'sdpd',
                                'tid': 'E95',
                                'ts': 'Jun 9 06:06:22',
-                               'values': "['1.5']"}],
+                               'values': ('1.5',)}],
                           4: [{'component': 'sshd(pam_unix)',
                                'tid': 'E16',
                                'ts': 'Jun 23 02:55:14',
-                               'values': "['200.60.37.201']"},
+                               'values': ('200.60.37.201',)},
                               {'component': 'su(pam_unix)',
                                'tid': 'E102',
                                'ts': 'Jun 23 04:05:28',
-                               'values': "['cyrus', '0']"}]},
+                               'values': ('cyrus', '0')}]},
                          l_vectors)
 
     def test_convert_df_into_l_vectors2(self):
@@ -133,12 +179,38 @@ class TestCommonUtils(unittest.TestCase):
         l_vectors = convert_df_into_l_vectors(logs_df=logs_df)
 
         self.assertEqual({'log1':
-                              [{'ts': 'ts1', 'tid': 'tid1', 'values': "['x', 'y']"},
-                               {'ts': 'ts2', 'tid': 'tid1', 'values': "['a', 'b']"}],
+                              [{'ts': 'ts1', 'tid': 'tid1', 'values': ('x', 'y')},
+                               {'ts': 'ts2', 'tid': 'tid1', 'values': ('a', 'b')}],
                           'log2':
-                              [{'ts': 'ts1', 'tid': 'tid3', 'values': '[]'}]},
+                              [{'ts': 'ts1', 'tid': 'tid3', 'values': ()}]},
                          l_vectors)
 
+        # sampling
+        self.assertEqual(1, len(convert_df_into_l_vectors(logs_df=logs_df, num_logs=1)))
+        self.assertEqual(l_vectors, convert_df_into_l_vectors(logs_df=logs_df, num_logs=5))  # no more than num_logs
+
+    def test_read_csv_into_l_vectors(self):
+        logs_csv = 'tests/resources/test_system_structured_logs.csv'
+        expected = convert_df_into_l_vectors(pd.read_csv(logs_csv, dtype={'tid': str}), include_component=True)
+        self.assertEqual(expected, read_csv_into_l_vectors(logs_csv, include_component=True))
+        # logs span chunks
+        self.assertEqual(expected, read_csv_into_l_vectors(logs_csv, include_component=True, chunksize=2))
+
+        with tempfile.TemporaryDirectory() as cache_dir:
+            self.assertEqual(expected, read_csv_into_l_vectors(logs_csv, include_component=True, cache_dir=cache_dir))
+            self.assertEqual(1, len(os.listdir(cache_dir)))
+            self.assertEqual(expected, read_csv_into_l_vectors(logs_csv, include_component=True, cache_dir=cache_dir))
+            read_csv_into_l_vectors(logs_csv, include_component=False, cache_dir=cache_dir)  # a different cache
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+
+            # the same sample of logs as convert_df_into_l_vectors(); not cached
+            random.seed(0)
+            expected = convert_df_into_l_vectors(pd.read_csv(logs_csv, dtype={'tid': str}), num_logs=1)
+            random.seed(0)
+            self.assertEqual(expected, read_csv_into_l_vectors(logs_csv, chunksize=2, cache_dir=cache_dir, num_logs=1))
+            self.assertEqual(1, len(expected))
+            self.assertEqual(2, len(os.listdir(cache_dir)))
+
     def test_generate_pattern_from_template(self):
         template = 'send <*> <*>'
         pattern = generate_pattern_from_template(template)
@@ -156,3 +228,8 @@ class TestCommonUtils(unittest.TestCase):
         pattern = generate_pattern_from_template(template)
         m = re.match(pattern, 'send done')
         self.assertEqual(None, m)
+
+    def test_parse_values_list(self):
+        for values in ["[]", "['a', 'b']", "['']", "['a','b']", "['a', 1, 'b']", "['it\\'s']", '["it\'s"]', "[1, 2]"]:
+            self.assertEqual(tuple(ast.literal_eval(values)), parse_values_list(values), values)
+        self.assertEqual(('a', 'b'), parse_values_list(['a', 'b']))
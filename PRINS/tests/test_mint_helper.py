@@ -27,6 +27,11 @@ from src.main.mint_helper import *
 
 
 class TestMINTHelper(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        # `java -version` starts a JVM; check it once for all the tests
+        cls.java_installed = os.system('java -version') == 0
+
     def setUp(self) -> None:
         self.component = 'test_component'
         self.l_vectors = {
@@ -105,8 +110,18 @@ class TestMINTHelper(unittest.TestCase):
                               '__END__\n'],
                              contents)
 
+    def test_prepare_mint_input_from_columns(self):
+        log_columns = l_vectors_to_columns(self.l_vectors)
+        self.assertEqual((('e1', 'e0'), ("['X', 'A']", "[]")),
+                         l_vectors_to_columns({'log': [self.l_vectors['log1'][0], self.l_vectors['log1'][2]]})['log'])
+        with tempfile.TemporaryDirectory() as output_dir:
+            with open(prepare_mint_input_from_l_vectors(self.component, self.l_vectors, output_dir)) as f:
+                expected = f.read()
+            with open(prepare_mint_input_from_columns(self.component, log_columns, output_dir)) as f:
+                self.assertEqual(expected, f.read())
+
     def test_infer_model(self):
-        if os.system('java -version') != 0:
+        if not self.java_installed:
             print('No java installed: skip this test')
             pass
         else:
@@ -119,7 +134,7 @@ class TestMINTHelper(unittest.TestCase):
                 self.assertEqual(5, len(model.transitions))
 
     def test_infer_model2(self):
-        if os.system('java -version') != 0:
+        if not self.java_installed:
             print('No java installed: skip this test')
             pass
         else:
@@ -135,3 +150,24 @@ class TestMINTHelper(unittest.TestCase):
                 self.assertEqual({'0'}, model.accepting_states)
                 self.assertEqual({('E20', None), ('E41', None)}, model.alphabet)
                 self.assertEqual({('0', ('E20', None)): '0', ('0', ('E41', None)): '0'}, model.transitions)
+
+    def test_determinize_mint_model(self):
+        # deterministic, except for the unreachable state '3' and the transition without dst_states
+        ext_nfa = {'alphabet': {('a', None), ('b', None)},
+                   'states': {'0', '1', '2', '3', '10'}, 'initial_state': '0', 'accepting_states': {'2', '3'},
+                   'transitions': {('0', ('a', None)): {'10'}, ('10', ('b', None)): {'2'},
+                                   ('2', ('a', None)): {'1'}, ('1', ('b', None)): set(),
+                                   ('3', ('a', None)): {'2'}, ('3', ('b', None)): {'3'}}}
+        dfa = NFA(self.component, ext_nfa).standard_determinize_core()
+        model = determinize_mint_model(NFA(self.component, ext_nfa))  # without subset construction
+        self.assertEqual(dfa.states, model.states)
+        self.assertEqual(dfa.initial_state, model.initial_state)
+        self.assertEqual(dfa.accepting_states, model.accepting_states)
+        self.assertEqual({k: {dst} for k, dst in dfa.transitions.items()}, model.transitions)
+
+        # non-deterministic
+        ext_nfa['transitions'][('0', ('a', None))] = {'10', '3'}
+        dfa = NFA(self.component, ext_nfa).standard_determinize_core()
+        model = determinize_mint_model(NFA(self.component, ext_nfa))
+        self.assertEqual(dfa.states, model.states)
+        self.assertEqual({k: {dst} for k, dst in dfa.transitions.items()}, model.transitions)
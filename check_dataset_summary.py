@@ -24,32 +24,14 @@ SPDX-License-Identifier: GPL-3.0-or-later
 import path_PRINS
 import os
 import math
+import numpy as np
 import pandas as pd
+from collections import Counter, defaultdict
+from concurrent.futures.process import ProcessPoolExecutor
 from scipy.stats import entropy
-from src.main.PRINS import PRINS
 from expr_config import *
-from src.utils.common import convert_df_into_l_vectors
-from natsort import natsorted
 
 
-def check_subsequence(s: list, org: list) -> bool:
-    """Check if a given sequence is a subsequence of another sequence.
-
-    :param s: sub-sequence to check
-    :param org: an original sequence
-    :return: True if s is in org; False otherwise
-    """
-
-    for i in range(len(org)):
-        if org[i] == s[0]:
-            is_subsequence = True
-            for j in range(len(s)):
-                if i+j < len(org) and org[i+j] != s[j]:
-                    is_subsequence = False
-            if is_subsequence:
-                return True
-    return False
-
 def calculate_log_confidence(l_vectors: dict, component: str = None, k: int = 2) -> float:
     """Calculate the log confidence value of a given set of logs (l_vector).
 
@@ -59,74 +41,95 @@ def calculate_log_confidence(l_vectors: dict, component: str = None, k: int = 2)
     :return: log confidence score
     """
 
-    all_templates = set()
     tid_sequences = []
     for log_id, l_vector in l_vectors.items():
         if component:
-            tid_sequence = [e['tid'] for e in l_vector if e['component'] == component]
+            tid_sequences.append([e['tid'] for e in l_vector if e['component'] == component])
         else:
-            tid_sequence = [e['tid'] for e in l_vector]
-        tid_sequences.append(tid_sequence)
-        all_templates = all_templates.union(set(tid_sequence))
-    all_templates = natsorted(all_templates)
-
-    from itertools import product
-    S = product(all_templates, repeat=k)
-    s_sum = 0
-    s_count = 0
-    for s in S:
-        count = 0
-        for tid_sequence in tid_sequences:
-            if check_subsequence(s, tid_sequence):
-                count += 1
-        if count > 0:
-            q_s = count / len(tid_sequences)
-            s_sum += pow(1 - q_s, len(tid_sequences))
-            s_count += 1
-    return 1 - s_sum / s_count
+            tid_sequences.append([e['tid'] for e in l_vector])
+    return calculate_log_confidence_of_sequences(tid_sequences, k)
+
+
+def calculate_log_confidence_of_sequences(tid_sequences: list, k: int = 2) -> float:
+    """Same as calculate_log_confidence(), but for the sequences of template ids of the logs.
+
+    :param tid_sequences: a list of logs, each of which is a list of template ids
+    :param k: the length of message sequences to be used for log property checking (default=2)
+    :return: log confidence score
+    """
+
+    # count, for each message sequence of length k, the number of logs where it occurs as k consecutive messages; only
+    # the sequences that occur are visited, instead of all the |templates|^k candidates
+    observed = Counter()
+    for tid_sequence in tid_sequences:
+        observed.update({tuple(tid_sequence[i:i + k]) for i in range(len(tid_sequence) - k + 1)})
+
+    # (1 - q_s) ** n_logs as exp(n_logs * log1p(-q_s)) for all the sequences at once, which keeps the precision for
+    # large n_logs (log1p(-1) = -inf gives 0 for the sequences in all the logs); math.fsum() does not depend on the
+    # order of the sequences, so they are not (natural) sorted
+    n_logs = len(tid_sequences)
+    q = np.fromiter(observed.values(), dtype=np.float64, count=len(observed)) / n_logs
+    with np.errstate(divide='ignore'):
+        s_sum = math.fsum(np.exp(n_logs * np.log1p(-q)))
+    return 1 - s_sum / len(observed)
+
+
+def summarize_system(system: str) -> list:
+    """Summarize the logs of a given system.
+
+    :param system: system name
+    :return: a row of the summary (system, components, logs, templates, messages, div_score, normalized_entropy,
+             log_confidence)
+    """
+    print(f'[Processing] {system} ...', flush=True)
+
+    # read logs
+    logs_csv = os.path.join('dataset', system, f'{system}_preprocessed_logs.csv')
+    # only the components and the templates of each log are needed, so they are taken from the columns directly
+    # instead of converting logs_df into l_vectors; categories keep each distinct string once (tid as string)
+    logs_df = pd.read_csv(logs_csv, usecols=['logID', 'component', 'tid'], engine='c',
+                          dtype={'logID': 'category', 'component': 'category', 'tid': 'category'})
+
+    # compute set of components appear for each log; from the distinct (log, component) pairs in a single pass, instead
+    # of a frozenset built from a Series for each log
+    components_of_log = defaultdict(set)
+    pairs = logs_df[['logID', 'component']].drop_duplicates()
+    for log_id, component in zip(pairs['logID'].tolist(), pairs['component'].tolist()):
+        components_of_log[log_id].add(component)
+    all_components = [frozenset(components) for components in components_of_log.values()]
+
+    # compute diversity score
+    counts = Counter(all_components)  # number of logs for each distinct set of components
+    div_score = f'{(len(counts) - 1) / (len(all_components) - 1):.3f}'
+    normalized_entropy = f'{entropy(list(counts.values())) / math.log2(len(all_components)):.3f}'
+
+    # compute log confidence; the template ids of each log are collected in a single pass as well
+    tid_sequences = defaultdict(list)
+    for log_id, tid in zip(logs_df['logID'].tolist(), logs_df['tid'].tolist()):
+        tid_sequences[log_id].append(tid)
+    log_confidence = calculate_log_confidence_of_sequences(list(tid_sequences.values()))
+
+    # save the results
+    n_components = logs_df.component.nunique()
+    n_logs = logs_df.logID.nunique()
+    n_templates = logs_df.tid.nunique()
+    n_messages = len(logs_df)  # one log entry (message) per row
+    return [system,
+            n_components,
+            n_logs,
+            n_templates,
+            n_messages,
+            div_score,
+            normalized_entropy,
+            log_confidence]
+
 
 def main():
     print('Analyze log diversity in terms of components (div_score, entropy)')
 
-    summary = list()
-    for system in SYSTEMS:
-        print(f'[Processing] {system} ...')
-
-        # read logs
-        logs_csv = os.path.join('dataset', system, f'{system}_preprocessed_logs.csv')
-        logs_df = pd.read_csv(logs_csv, dtype={'tid': str})  # to fix the datatype of tid as string
-        l_vectors = convert_df_into_l_vectors(logs_df, include_component=True)
-
-        # initialize variables for diversity score calculation
-        all_components = []
-
-        # compute set of components appear for each log
-        for log_id, l_vector in l_vectors.items():
-            partitioned_log = PRINS.partition_log_by_component(l_vector)
-            components = frozenset({component for component, _ in partitioned_log})
-            all_components.append(components)
-
-        # compute diversity score
-        div_score = f'{(len(set(all_components)) - 1) / (len(all_components) - 1):.3f}'
-        counts = pd.Series(all_components).value_counts()
-        normalized_entropy = f'{entropy(counts) / math.log2(len(all_components)):.3f}'
-
-        # compute log confidence
-        log_confidence = calculate_log_confidence(l_vectors)
-
-        # save the results
-        n_components = logs_df.component.nunique()
-        n_logs = logs_df.logID.nunique()
-        n_templates = logs_df.tid.nunique()
-        n_messages = logs_df.message.size
-        summary.append([system,
-                        n_components,
-                        n_logs,
-                        n_templates,
-                        n_messages,
-                        div_score,
-                        normalized_entropy,
-                        log_confidence])
+    # the systems are independent of each other; the summary keeps the order of SYSTEMS
+    with ProcessPoolExecutor(max_workers=PRINS_NUM_WORKERS) as executor:
+        summary = list(executor.map(summarize_system, SYSTEMS))
 
     print('\n=== Dataset Summary ===')
     summary_df = pd.DataFrame(summary, columns=['system',
@@ -22,14 +22,15 @@ SPDX-License-Identifier: GPL-3.0-or-later
 """
 
 import os
+import shutil
 import pandas as pd
 from natsort import natsorted
 from tqdm import trange
 
-# all system available in the dataset
-SYSTEMS = ['Hadoop', 'HDFS', 'Linux', 'Spark', 'Zookeeper', 'CoreSync', 'NGLClient', 'Oobelib', 'PDApp']
+# all system available in the dataset (same as in expr_config, which is not importable when run from this directory)
+SYSTEMS = ('Hadoop', 'HDFS', 'Linux', 'Spark', 'Zookeeper', 'CoreSync', 'NGLClient', 'Oobelib', 'PDApp')
 
-def duplicate_logs_for_system(dataset_dir: str, system: str, duplication_factor: int = 8):
+def duplicate_logs_for_system(dataset_dir: str, system: str, duplication_factor: int = 8, skip_existing=False):
     """Duplicate logs for a given system.
 
     *NOTE*: column *logID* in the input log file (csv) should contain consecutive log ids starting from 1.
@@ -37,6 +38,8 @@ def duplicate_logs_for_system(dataset_dir: str, system: str, duplication_factor:
     :param dataset_dir: dataset directory
     :param system: target system
     :param duplication_factor: duplication factor (default=10)
+    :param skip_existing: (optional, default=False) True to keep the duplicated log files that already exist (e.g.,
+                          generated by a previous run) and generate only the missing ones
     :return: None (internally generates duplicated logs in the form of csv)
     """
     print(f'processing {system} logs ...')
@@ -45,25 +48,32 @@ def duplicate_logs_for_system(dataset_dir: str, system: str, duplication_factor:
     # read logs
     org_log_file = os.path.join(dataset_dir, system, f'{system}_preprocessed_logs.csv')
     df = pd.read_csv(org_log_file)
-    new_df = df.copy()
 
     sorted_logIDs = natsorted(df['logID'].unique())
     assert sorted_logIDs[0] == 1 and sorted_logIDs[-1] == len(sorted_logIDs)
+
+    # the file for d+1 is the file for d followed by one more copy of the logs; so each copy is converted to csv
+    # only once and appended to a copy of the previous file, instead of rewriting all the copies every time
+    prev_file = None
     for d in trange(1, duplication_factor):
-        # duplicate log ids
-        start_id = len(sorted_logIDs) * d
-        new_ids_dict = {}
-        for i in range(len(sorted_logIDs)):
-            new_ids_dict[sorted_logIDs[i]] = i+1+start_id
-
-        # duplicate logs
-        df_duplicated = df.copy()
-        df_duplicated['logID'] = df['logID'].map(new_ids_dict)
-
-        # append duplicated logs
-        assert len(set(new_df['logID'].unique()).intersection(set(df_duplicated['logID'].unique()))) == 0
-        new_df = new_df.append(df_duplicated)
-        new_df.to_csv(os.path.join(dataset_dir, system, f'{system}_preprocessed_logs_dup{d+1}.csv'), index=False)
+        new_file = os.path.join(dataset_dir, system, f'{system}_preprocessed_logs_dup{d+1}.csv')
+        if skip_existing and os.path.isfile(new_file):
+            prev_file = new_file
+            continue
+
+        # duplicate logs; the log ids are consecutive, so shifting them gives the new ids
+        df_duplicated = df.assign(logID=df['logID'] + len(sorted_logIDs) * d)
+
+        # append duplicated logs; written into a temporary file first, so that a partially written file is never
+        # taken as an existing one (e.g., by another run generating the same file at the same time)
+        tmp_file = f'{new_file}.{os.getpid()}.tmp'
+        if prev_file is None:
+            df.to_csv(tmp_file, index=False)
+        else:
+            shutil.copyfile(prev_file, tmp_file)
+        df_duplicated.to_csv(tmp_file, mode='a', header=False, index=False)
+        os.replace(tmp_file, new_file)
+        prev_file = new_file
 
 
 if __name__ == '__main__':
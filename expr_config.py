@@ -23,9 +23,12 @@ SPDX-License-Identifier: GPL-3.0-or-later
 
 # model inference experiment variables
 DATASET = 'dataset'
-SYSTEMS = ['Hadoop', 'HDFS', 'Linux', 'Spark', 'Zookeeper', 'CoreSync', 'NGLClient', 'Oobelib', 'PDApp']
+SYSTEMS = ('Hadoop', 'HDFS', 'Linux', 'Spark', 'Zookeeper', 'CoreSync', 'NGLClient', 'Oobelib', 'PDApp')
 MINT_PARAM = 2
 IGNORE_VALUES = False
 SAVE_PDF = False  # saving pdf is time consuming, especially for large models
+SAVE_PDF_IN_BACKGROUND = True  # render pdf files (graphviz) in a background thread, one at a time
 MINT_TIMEOUT = 36000  # sec
 PRINS_NUM_WORKERS = 4  # multiprocessing
+POSTPROCESS_NUM_WORKERS = 4  # k-folds CV: hybrid determinizations run in parallel, each on its own copy of the model
+L_VECTORS_CACHE_DIR = 'output/cache'  # l_vectors read from the csv files are reused across runs (None: no cache)
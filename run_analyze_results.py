@@ -26,9 +26,14 @@ import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib import rc
-from natsort import natsorted
 from scipy.stats import entropy
 
+try:
+    import pyarrow  # optional: multi-threaded csv parsing for pd.read_csv(engine='pyarrow')
+    CSV_ENGINE = 'pyarrow'
+except ImportError:
+    CSV_ENGINE = 'c'
+
 latex_figures = './'
 latex_data = './'
 SYSTEMS = ['Hadoop', 'HDFS', 'Linux', 'Zookeeper', 'CoreSync', 'NGLClient', 'Oobelib', 'PDApp']
@@ -39,90 +44,92 @@ rc('text', usetex=True)
 plt.style.use('bmh')
 plt.rcParams["font.family"] = "Times New Roman"
 
+# font sizes of the subplots, set once per figure instead of per axes
+LABEL_SIZES = {'axes.titlesize': 14, 'axes.labelsize': 13}
+TICK_SIZES = {'xtick.labelsize': 13, 'ytick.labelsize': 13}
+
 
 def message_distribution():
     results = []
     for system in SYSTEMS:
-        logs_df = pd.read_csv(f'dataset/{system}/{system}_preprocessed_logs.csv')
-        counts = natsorted(logs_df.groupby(by='component')['message'].count(), reverse=True)
-        dist = np.array(counts[:4])/sum(counts[:4])
+        logs_df = pd.read_csv(f'dataset/{system}/{system}_preprocessed_logs.csv', usecols=['component', 'message'],
+                              dtype={'component': 'category'}, engine=CSV_ENGINE)
+        # the four largest numbers of messages per component (in descending order)
+        counts = np.sort(logs_df.groupby(by='component', observed=True)['message'].count().to_numpy())[::-1]
+        dist = counts[:4]/counts[:4].sum()
         results.append((system, f'{np.std(dist):.3f}', f'{np.mean(np.absolute(dist - np.mean(dist))):.3f}', f'{entropy(dist, base=2)/2:.3f}', dist))
     df = pd.DataFrame(results, columns=['system', 'std', 'MAD', 'norm_entropy', 'dist'])
     df.to_csv('message_distribution.csv', index=False)
 
 
+@plt.rc_context({**LABEL_SIZES, **TICK_SIZES})
 def rq1_boxplot(ncols=4):
     file = 'expr_output/summary_model_inference.csv'
     df = pd.read_csv(file)
-    grouped = df.groupby(by=['system', 'technique'])
+    time_s = df.groupby(by=['system', 'technique'])['time_s'].apply(list)  # all the execution times per group, at once
 
     nrows = math.ceil(len(SYSTEMS) / ncols)
     fig, axs = plt.subplots(nrows=nrows, ncols=ncols, figsize=(10, 5))
 
-    for system in SYSTEMS:
-        i, j = divmod(SYSTEMS.index(system), ncols)
+    for n, system in enumerate(SYSTEMS):
+        i, j = divmod(n, ncols)
 
         labels = [1, 2, 3, 4]
-        data = []
-        for w in labels:
-            technique = f'PRINS-w{w}'
-            data.append(grouped.get_group((system, technique))['time_s'])
+        data = [time_s[system, f'PRINS-w{w}'] for w in labels]
 
         axs[i][j].boxplot(data, labels=labels, sym='.')
-        axs[i][j].set_title(system, size=14)
+        axs[i][j].set_title(system)
         if j == 0:
-            axs[i][j].set_ylabel('Execution Time (s)', fontsize=13)
+            axs[i][j].set_ylabel('Execution Time (s)')
         if i == nrows-1:
-            axs[i][j].set_xlabel('Workers', fontsize=13)
-        axs[i][j].tick_params(axis='both', which='major', labelsize=13)
+            axs[i][j].set_xlabel('Workers')
 
     plt.tight_layout()
     plt.show()
     fig.savefig(latex_figures + 'rq1-boxplot.pdf', dpi=300)
 
 
+@plt.rc_context({**LABEL_SIZES, **TICK_SIZES})
 def rq2_boxplot(ncols=4):
     file = 'expr_output/summary_model_inference.csv'
     df = pd.read_csv(file)
-    grouped = df.groupby(by=['system', 'technique'])
+    time_s = df.groupby(by=['system', 'technique'])['time_s'].apply(list)  # all the execution times per group, at once
 
     nrows = math.ceil(len(SYSTEMS) / ncols)
     fig, axs = plt.subplots(nrows=nrows, ncols=ncols, figsize=(10, 5))
 
-    for system in SYSTEMS:
-        i, j = divmod(SYSTEMS.index(system), ncols)
+    for n, system in enumerate(SYSTEMS):
+        i, j = divmod(n, ncols)
 
         labels = [x for x in range(0, 11)]
-        data = []
-        for w in labels:
-            technique = f'hybrid-{w}'
-            data.append(grouped.get_group((system, technique))['time_s'])
+        data = [time_s[system, f'hybrid-{w}'] for w in labels]
 
         axs[i][j].boxplot(data, labels=labels, sym='.')
-        axs[i][j].set_title(system, size=14)
+        axs[i][j].set_title(system)
         if j == 0:
-            axs[i][j].set_ylabel('Execution time (s)', fontsize=13)
+            axs[i][j].set_ylabel('Execution time (s)')
         if i == nrows-1:
-            axs[i][j].set_xlabel('Parameter', fontsize=13)
-        axs[i][j].tick_params(axis='both', which='major', labelsize=13)
+            axs[i][j].set_xlabel('Parameter')
 
     plt.tight_layout()
     plt.show()
     fig.savefig(latex_figures + 'rq2-boxplot.pdf', dpi=300)
 
 
+@plt.rc_context({**LABEL_SIZES, **TICK_SIZES})
 def rq3_line():
     file = 'expr_output/summary_k_folds_cv.csv'
     df = pd.read_csv(file)
-    grouped = df.groupby(by=['system', 'technique'])
+    # the first result of each (system, technique)
+    first = df.drop_duplicates(subset=['system', 'technique']).set_index(['system', 'technique'])
 
     fig, axs = plt.subplots(nrows=6, ncols=4, figsize=(10, 12))
 
     metrics = ['recall', 'specificity', 'BA']
-    for metric in metrics:
-        for system in SYSTEMS:
-            i, j = divmod(SYSTEMS.index(system), 4)
-            i += metrics.index(metric) * 2
+    for m, metric in enumerate(metrics):
+        for n, system in enumerate(SYSTEMS):
+            i, j = divmod(n, 4)
+            i += m * 2
 
             labels = ['PRINS']
             for u in range(1, 11):
@@ -131,41 +138,43 @@ def rq3_line():
             y_values = []
             for technique in labels:
                 if metric == 'BA':
-                    value = (grouped.get_group((system, technique))['recall'].values[0] +
-                             grouped.get_group((system, technique))['specificity'].values[0]) / 2
+                    value = (first.at[(system, technique), 'recall'] +
+                             first.at[(system, technique), 'specificity']) / 2
                 else:
-                    value = grouped.get_group((system, technique))[metric].values[0]
+                    value = first.at[(system, technique), metric]
                 y_values.append(value)
 
             # axs[i][j].plot([x for x in range(11)], y_values, '.k', markersize=3)
             axs[i][j].plot([x for x in range(11)], y_values, linestyle='-', color='gray', linewidth=1, zorder=1)
             axs[i][j].scatter([x for x in range(11)], y_values, color='black', s=10, zorder=2)
-            axs[i][j].set_title(system, size=14)
+            axs[i][j].set_title(system)
             if i == 5:
-                axs[i][j].set_xlabel('Parameter', fontsize=13)
+                axs[i][j].set_xlabel('Parameter')
             if j == 0:
-                axs[i][j].set_ylabel(metric, fontsize=13)
+                axs[i][j].set_ylabel(metric)
             axs[i][j].set_xticks([x for x in range(0, 11, 2)])
             axs[i][j].set_yticks([y / 10 for y in range(0, 11, 2)])
-            axs[i][j].tick_params(axis='both', which='major', labelsize=13)
 
     plt.tight_layout()
     plt.show()
     fig.savefig(latex_figures + 'rq3-boxplot.pdf', dpi=300)
 
 
+@plt.rc_context(LABEL_SIZES)
 def rq4_line(ncols=4):
     file = 'expr_output/summary_model_inference_duplicated_logs.csv'
-    df = pd.read_csv(file, na_values=['timeout', 'crash'])
-    grouped = df.groupby(by=['system', 'technique', 'duplicated'])
+    # 'reused': the determinization time is not measured (run_model_inference.py --reuse_determinization); hybrid-1 is
+    # always measured
+    df = pd.read_csv(file, na_values=['timeout', 'crash', 'reused'])
+    mean_time_s = df.groupby(by=['system', 'technique', 'duplicated'])['time_s'].mean()
 
     techniques = ['MINT-SYS', 'PRINS-w1', 'PRINS-w4']
 
     nrows = math.ceil(len(SYSTEMS) / ncols)
     fig, axs = plt.subplots(nrows=nrows, ncols=ncols, figsize=(10, 5))
 
-    for system in SYSTEMS:
-        i, j = divmod(SYSTEMS.index(system), ncols)
+    for n, system in enumerate(SYSTEMS):
+        i, j = divmod(n, ncols)
 
         X = sorted(df.loc[df['system'] == system]['duplicated'].unique())
         Y = {}
@@ -173,12 +182,12 @@ def rq4_line(ncols=4):
             Y[technique] = []
             for x in X:
                 try:
-                    y = grouped.get_group((system, technique, x))['time_s'].mean()
+                    y = mean_time_s[system, technique, x]
                 except KeyError as e:
                     print(f'KeyError: {e}')
                     y = np.nan
-                if y is not np.nan and 'PRINS' in technique:
-                    y += grouped.get_group((system, 'hybrid-1', x))['time_s'].mean()
+                if not np.isnan(y) and 'PRINS' in technique:
+                    y += mean_time_s[system, 'hybrid-1', x]
 
                 Y[technique].append(y)
 
@@ -187,12 +196,12 @@ def rq4_line(ncols=4):
         axs[i][j].plot(X, Y['PRINS-w4'], label=r'\textit{PRINS-P}', marker='v', ls='-', c='g', linewidth=1)
 
         axs[i][j].legend()
-        axs[i][j].set_title(system, size=14)
+        axs[i][j].set_title(system)
 
         if j == 0:
-            axs[i][j].set_ylabel('Execution Time (s)', fontsize=13)
+            axs[i][j].set_ylabel('Execution Time (s)')
         if i == nrows-1:
-            axs[i][j].set_xlabel('Duplication Factor', fontsize=13)
+            axs[i][j].set_xlabel('Duplication Factor')
 
     plt.tight_layout()
     plt.show()
@@ -204,28 +213,18 @@ def rq5_table(det: str = 'hybrid-1'):
     df = pd.read_csv(file)
     df = df.set_index(['system', 'technique'])
 
-    summary = []
-    for system in SYSTEMS:
-        if system == 'Spark':
-            continue
-        recall_m = df.loc[system, 'MINT-SYS']['recall']
-        recall_p = df.loc[system, f'PRINS:{det}']['recall']
-        recall_diff = (recall_p - recall_m) * 100
-
-        spec_m = df.loc[system, 'MINT-SYS']['specificity']
-        spec_p = df.loc[system, f'PRINS:{det}']['specificity']
-        spec_diff = (spec_p - spec_m) * 100
-
-        ba_m = (recall_m + spec_m) / 2
-        ba_p = (recall_p + spec_p) / 2
-        ba_diff = (ba_p - ba_m) * 100
-
-        summary.append((system, recall_m, recall_p, recall_diff, spec_m, spec_p, spec_diff, ba_m, ba_p, ba_diff))
-    df = pd.DataFrame(summary, columns=['system',
-                                        'r_mint', 'r_prins', 'r_diff',
-                                        's_mint', 's_prins', 's_diff',
-                                        'ba_mint', 'ba_prins', 'ba_diff'])
-    df = df.set_index('system')
+    # recall and specificity of MINT and PRINS for each system (except Spark), computed column-wise
+    systems = [system for system in SYSTEMS if system != 'Spark']
+    mint = df.xs('MINT-SYS', level='technique').loc[systems, ['recall', 'specificity']]
+    prins = df.xs(f'PRINS:{det}', level='technique').loc[systems, ['recall', 'specificity']]
+    ba_m = mint.mean(axis=1)
+    ba_p = prins.mean(axis=1)
+    df = pd.DataFrame({'r_mint': mint['recall'], 'r_prins': prins['recall'],
+                       'r_diff': (prins['recall'] - mint['recall']) * 100,
+                       's_mint': mint['specificity'], 's_prins': prins['specificity'],
+                       's_diff': (prins['specificity'] - mint['specificity']) * 100,
+                       'ba_mint': ba_m, 'ba_prins': ba_p, 'ba_diff': (ba_p - ba_m) * 100})
+    df.index.name = 'system'
 
     # load log confidence scores
     df2 = pd.read_csv('dataset/dataset_summary.csv', index_col='system')
@@ -239,18 +238,19 @@ def rq5_table(det: str = 'hybrid-1'):
 def rq5_model_size(det: str = 'hybrid-1'):
     file = 'expr_output/summary_model_inference.csv'
     df = pd.read_csv(file)
-    grouped = df.groupby(by=['system', 'technique']).mean()
+    grouped = df.groupby(by=['system', 'technique'])[['states', 'transitions']].mean()
 
     summary = []
     for system in SYSTEMS:
         if system == 'Spark':
             continue
 
-        states_m = grouped.loc[system, 'MINT-SYS']['states']
-        states_p = grouped.loc[system, det]['states']
+        mint, prins = grouped.loc[(system, 'MINT-SYS')], grouped.loc[(system, det)]
+        states_m = mint['states']
+        states_p = prins['states']
 
-        trans_m = grouped.loc[system, 'MINT-SYS']['transitions']
-        trans_p = grouped.loc[system, det]['transitions']
+        trans_m = mint['transitions']
+        trans_p = prins['transitions']
 
         summary.append((system,
                         states_m, states_p, states_p/states_m,
@@ -23,7 +23,6 @@ SPDX-License-Identifier: GPL-3.0-or-later
 
 import path_PRINS
 import os
-import copy
 import math
 import time
 import random
@@ -32,16 +31,19 @@ import argparse
 import concurrent
 import subprocess
 import pandas as pd
+from collections import defaultdict
 from expr_config import *
-from natsort import natsorted
+from natsort import natsort_keygen
 from src.main.PRINS import PRINS
 from src.automata.NFA import NFA
 from src.automata.DFA import DFA
 from func_timeout import FunctionTimedOut
 from src.main.mint_helper import infer_model_by_mint
-from concurrent.futures.process import ProcessPoolExecutor
+from concurrent.futures.process import ProcessPoolExecutor, BrokenProcessPool
 from src.utils.common import convert_df_into_l_vectors, common_logger
 
+NATSORT_KEY = natsort_keygen()  # sorted(x, key=NATSORT_KEY) is natsorted(x)
+
 
 def split_execution_ids_into_k_folds(execution_ids: list, k: int, seed: int = None):
     if len(execution_ids) < k:
@@ -51,7 +53,7 @@ def split_execution_ids_into_k_folds(execution_ids: list, k: int, seed: int = No
     no_tests = math.floor(len(execution_ids) / k)
 
     # sort
-    execution_ids = natsorted(execution_ids)
+    execution_ids = sorted(execution_ids, key=NATSORT_KEY)
     if seed is None:
         seed = os.getpid()
     random.seed(seed)  # randomize splitting k-folds, but using a certain seed
@@ -59,26 +61,17 @@ def split_execution_ids_into_k_folds(execution_ids: list, k: int, seed: int = No
     logger.info(f'split_execution_ids_into_k_folds(): random.seed={seed}')
     print(f'split_execution_ids_into_k_folds(): random.seed={seed}')
 
-    # split
-    k_folds = []
-    remaining = copy.deepcopy(execution_ids)
-    i = 0
-    while len(k_folds) < k:
-        testing_ids = execution_ids[i:i + no_tests]
-        k_folds.append(testing_ids)
-        for testing_id in testing_ids:
-            remaining.remove(testing_id)
-        i += no_tests
-
-    i = 0
-    for remained_id in remaining:
+    # split; the remaining ids (after k folds of no_tests ids) are distributed to the first folds, one for each
+    remaining = execution_ids[k * no_tests:]
+    k_folds = [execution_ids[i * no_tests:(i + 1) * no_tests] for i in range(k)]
+    for i, remained_id in enumerate(remaining):
         k_folds[i].append(remained_id)
-        i += 1
 
     return k_folds
 
 
-def generate_pnn_l_vectors(testing_l_vectors: dict, testing_id: int, templates_df: pd.DataFrame):
+def generate_pnn_l_vectors(testing_l_vectors: dict, testing_id: int, templates_df: pd.DataFrame,
+                           encoded_l_vectors: tuple = None):
     """
     Generate positive and negative logs.
     To generate negative logs, either (1) randomly add one entry or (2) randomly swap two entries.
@@ -86,47 +79,83 @@ def generate_pnn_l_vectors(testing_l_vectors: dict, testing_id: int, templates_d
     :param testing_l_vectors: all testing logs
     :param testing_id: testing log id
     :param templates_df: all templates
+    :param encoded_l_vectors: (optional) encode_l_vectors(testing_l_vectors), to be shared by the testing logs
     :return: positive log, negative log
     """
 
     positive_l_vector = testing_l_vectors[testing_id]
+    if encoded_l_vectors is None:
+        encoded_l_vectors = encode_l_vectors(testing_l_vectors)
+
+    # computed once for all trials: the templates (with their tids) to choose from, and the natural sort keys of the
+    # timestamps (all the timestamps of a negative log are taken from the positive log)
+    templates = list(zip(templates_df['template'], templates_df.index))
+    ts_keys = {ts: NATSORT_KEY(ts) for ts in {e['ts'] for e in positive_l_vector}}
+
+    # the results of the substring search for the encoded negative logs tried so far; a trial often gives the positive
+    # log back (e.g., swapping two entries of the same timestamp), which is in testing_l_vectors
+    checked = {}
+    if encoded_l_vectors:
+        checked[''.join(encoded_l_vectors[0][frozenset(e.items())] for e in positive_l_vector)] = False
 
     trial = 0
     negative_l_vector = None
     negative_confirmed = False
     while not negative_confirmed:
-        negative_l_vector = copy.deepcopy(positive_l_vector)
+        negative_l_vector = [dict(e) for e in positive_l_vector]  # entries are modified, but not their values
         random_action_indicator = random.random()
 
         try:
             if random_action_indicator < 1/3:
                 # randomly add one entry
-                selected_template = random.choice(list(templates_df['template']))
-                selected_tid = templates_df[templates_df['template'] == selected_template].index.item()
+                selected_template, selected_tid = random.choice(templates)
                 selected_timestamp = random.choice([e['ts'] for e in negative_l_vector])
                 negative_l_vector.append({'ts': selected_timestamp,
                                           'tid': selected_tid,
-                                          'values': []})
+                                          'values': ()})
             elif 1/3 <= random_action_indicator < 2/3:
                 # randomly delete one entry
                 if len(negative_l_vector) == 1:
                     continue
+                # NOTE: remove() deletes the first entry equal to the selected one, which is not always the selected
+                #       entry itself when a log has duplicate entries; it is kept so that a seed reproduces the
+                #       negative logs
                 selected_entry = random.choice(negative_l_vector)
                 negative_l_vector.remove(selected_entry)
             else:
                 # randomly swap two entries
                 if len(negative_l_vector) < 2:
                     continue
-                x = random.choice(negative_l_vector)
-                y = random.choice([e for e in negative_l_vector if e != x])
+                i = random.randrange(len(negative_l_vector))  # same draw as random.choice()
+                x = negative_l_vector[i]
+                if negative_l_vector.count(x) == 1:
+                    # the entries other than x are the ones except the i-th; same draw as random.choice() of them
+                    j = random.randrange(len(negative_l_vector) - 1)
+                    y = negative_l_vector[j + 1 if j >= i else j]
+                else:
+                    y = random.choice([e for e in negative_l_vector if e != x])
                 x['ts'], y['ts'] = y['ts'], x['ts']  # swap timestamps
 
-            # sort negative_l_vector using timestamps
-            negative_l_vector = natsorted(negative_l_vector, key=lambda entry: entry['ts'])
+            # sort negative_l_vector using timestamps (same as natsorted() with entry['ts'] as the key)
+            negative_l_vector.sort(key=lambda entry: ts_keys[entry['ts']])
 
             # check if negative_l_vector is not in testing_l_vectors
-            negative_confirmed = all(not is_subsequence(negative_l_vector, l_vector)
-                                     for _, l_vector in testing_l_vectors.items())
+            if encoded_l_vectors:
+                # same as is_subsequence(), by substring search; an entry that is not in any testing log is not encoded,
+                # and only the testing logs that contain the first entry of negative_l_vector can contain it
+                codes, logs_by_code = encoded_l_vectors
+                negative_codes = [codes.get(frozenset(e.items())) for e in negative_l_vector]
+                if None in negative_codes:
+                    negative_confirmed = True
+                else:
+                    negative_log = ''.join(negative_codes)
+                    if negative_log not in checked:
+                        checked[negative_log] = all(negative_log not in encoded_log
+                                                    for encoded_log in logs_by_code[negative_codes[0]])
+                    negative_confirmed = checked[negative_log]
+            else:
+                negative_confirmed = all(not is_subsequence(negative_l_vector, l_vector)
+                                         for _, l_vector in testing_l_vectors.items())
 
             trial += 1
             if trial == 100:
@@ -146,6 +175,34 @@ def generate_pnn_l_vectors(testing_l_vectors: dict, testing_id: int, templates_d
     return positive_l_vector, negative_l_vector
 
 
+def encode_l_vectors(l_vectors: dict):
+    """
+    Encode each log as a string of one character per log entry, the same character for equal log entries, so that
+    is_subsequence() for the logs is decided by substring search.
+
+    :param l_vectors: logs
+    :return: (codes, logs_by_code) where codes maps the items of a log entry (frozenset) to its character and
+             logs_by_code maps each character to the encoded logs that contain it; None if there are too many distinct
+             log entries to be encoded
+    """
+    codes = dict()
+    logs_by_code = defaultdict(list)
+    for l_vector in l_vectors.values():
+        encoded_log = []
+        for e in l_vector:
+            key = frozenset(e.items())
+            code = codes.get(key)
+            if code is None:
+                if len(codes) > 0x10ffff:  # the largest code point
+                    return None
+                code = codes[key] = chr(len(codes))
+            encoded_log.append(code)
+        encoded_log = ''.join(encoded_log)
+        for code in set(encoded_log):
+            logs_by_code[code].append(encoded_log)
+    return codes, logs_by_code
+
+
 def is_subsequence(x: list, y: list) -> bool:
     """
     Decide whether x is a subsequence of y or not.
@@ -169,15 +226,20 @@ def is_subsequence(x: list, y: list) -> bool:
     return False
 
 
-def save_cv_result(technique, system, num_logs, recall, specificity):
-    if not os.path.isdir('output'):
-        os.mkdir('output')
+def save_cv_results(results: list):
+    """
+    Append the CV results to output/summary_k_folds_cv.csv (by a single write).
+
+    :param results: a list of (technique, system, num_logs, recall, specificity)
+    """
+    os.makedirs('output', exist_ok=True)
     result_file = os.path.join('output', f'summary_k_folds_cv.csv')
     header = 'technique,system,num_logs,recall,specificity,log-timestamp\n'
     if os.path.isfile(result_file):
         header = ''
     with open(result_file, 'a') as f:
-        f.write(header + f'{technique},{system},{num_logs},{recall},{specificity},{timestamp}\n')
+        f.write(header + ''.join(f'{technique},{system},{num_logs},{recall},{specificity},{timestamp}\n'
+                                 for technique, system, num_logs, recall, specificity in results))
 
 
 def main(seed: int = None, single_fold_no: int = None):
@@ -212,7 +274,7 @@ def main(seed: int = None, single_fold_no: int = None):
     logs_df = pd.read_csv(logs_csv, dtype={'tid': str})  # dtype to fix the datatype of tid as string
     l_vectors = convert_df_into_l_vectors(logs_df=logs_df, num_logs=args.num_logs, include_component=True)
     templates_df = logs_df[['tid', 'template']].drop_duplicates().set_index('tid')
-    templates_df.reindex(index=natsorted(templates_df.index))  # this sorts the templates using their tid
+    templates_df.reindex(index=sorted(templates_df.index, key=NATSORT_KEY))  # this sorts the templates using their tid
     args.num_logs = len(l_vectors.keys())
 
     # initialize TECHNIQUES
@@ -232,8 +294,7 @@ def main(seed: int = None, single_fold_no: int = None):
             cv_results[metric][technique] = 0
 
     # for each fold, call run_one_fold
-    for testing_ids in k_folds:
-        no_fold = k_folds.index(testing_ids) + 1
+    for no_fold, testing_ids in enumerate(k_folds, start=1):
         if single_fold_no and no_fold != single_fold_no:
             continue  # for debugging
 
@@ -241,7 +302,7 @@ def main(seed: int = None, single_fold_no: int = None):
         print(f'Processing fold_no={no_fold} ...')
         logger.info(f'Processing fold_no={no_fold} ...')
         logger.debug(f'testing_ids={testing_ids}')
-        training_ids = natsorted(list(set(l_vectors.keys()).difference(set(testing_ids))))
+        testing_id_set = set(testing_ids)
 
         # initialize one fold results
         one_fold_results = {}
@@ -250,19 +311,16 @@ def main(seed: int = None, single_fold_no: int = None):
             for technique in TECHNIQUES:
                 one_fold_results[metric][technique] = 0
 
-        # prepare testing/training l_vectors and templates
-        training_l_vectors = dict()
-        testing_l_vectors = dict()
-        for ex_id in l_vectors.keys():
-            if ex_id in training_ids:
-                training_l_vectors[ex_id] = l_vectors[ex_id]
-            elif ex_id in testing_ids:
-                testing_l_vectors[ex_id] = l_vectors[ex_id]
+        # prepare testing/training l_vectors and templates (in the order of l_vectors)
+        training_l_vectors = {ex_id: l_vector for ex_id, l_vector in l_vectors.items() if ex_id not in testing_id_set}
+        testing_l_vectors = {ex_id: l_vector for ex_id, l_vector in l_vectors.items() if ex_id in testing_id_set}
 
         # prepare negative_l_vectors
         negative_l_vectors = dict()
+        encoded_l_vectors = encode_l_vectors(testing_l_vectors)  # once for all the testing logs of this fold
         for testing_id in testing_l_vectors.keys():
-            _, negative_l_vector = generate_pnn_l_vectors(testing_l_vectors, testing_id, templates_df)
+            _, negative_l_vector = generate_pnn_l_vectors(testing_l_vectors, testing_id, templates_df,
+                                                          encoded_l_vectors)
             negative_l_vectors[testing_id] = negative_l_vector
         logger.info(f'prepare negative_l_vectors: total {len(negative_l_vectors.keys())} logs')
 
@@ -298,6 +356,7 @@ def main(seed: int = None, single_fold_no: int = None):
             technique = 'PRINS'
             if type(cv_results['recall'][technique]) != str:
                 try:
+                    # the pdf file is saved before returning (no pdf_executor), as working_dir is removed right after
                     with tempfile.TemporaryDirectory() as working_dir:
                         instance = PRINS(args.system, training_l_vectors, working_dir)
                         model[technique], _, _, _ = instance.run(mint_timeout=timeout,
@@ -320,14 +379,20 @@ def main(seed: int = None, single_fold_no: int = None):
                             cv_results['recall'][technique] = 'mint-oom'
                             cv_results['specificity'][technique] = 'mint-oom'
 
-            # PRINS with hybrid determinization
-            for technique in TECHNIQUES:
-                if 'hybrid' in technique:
-                    if model['PRINS'] and type(cv_results['recall'][technique]) != str:
+            # PRINS with hybrid determinization (independent of each other, so run in parallel)
+            hybrid_techniques = [technique for technique in TECHNIQUES
+                                 if 'hybrid' in technique and type(cv_results['recall'][technique]) != str]
+            if model['PRINS'] and hybrid_techniques:
+                with ProcessPoolExecutor(max_workers=POSTPROCESS_NUM_WORKERS, initializer=init_postprocess_worker,
+                                         initargs=(model['PRINS'],)) as executor:
+                    futures = {technique: executor.submit(postprocess_worker, technique.split(':')[1])
+                               for technique in hybrid_techniques}
+                    for technique, future in futures.items():
                         try:
-                            model[technique], _ = PRINS.postprocess(model['PRINS'],
-                                                                    determinize_technique=technique.split(':')[1])
-                        except MemoryError:
+                            model[technique], _ = future.result()
+                        except (MemoryError, BrokenProcessPool):
+                            # a worker killed for running out of memory breaks the pool: all the determinizations
+                            # not finished by then fail with BrokenProcessPool
                             print(f'{technique} ran out of memory\n')
                             logger.info(f'{technique} ran out of memory\n')
                             cv_results['recall'][technique] = 'post-oom'
@@ -337,14 +402,16 @@ def main(seed: int = None, single_fold_no: int = None):
         print('Checking acceptance of positive/negative logs ...', end=' ', flush=True)
         logger.info('Checking acceptance of positive/negative logs ...')
         acceptance_start_time = time.time()
-        with ProcessPoolExecutor() as executor:
-            futures = {executor.submit(
-                acceptance_checker,
-                m_sys, technique, testing_l_vectors[testing_id], negative_l_vectors[testing_id]
-            )
-                for technique, m_sys in model.items() if m_sys
-                for testing_id in testing_l_vectors.keys()
-            }
+        testing_ids = list(testing_l_vectors.keys())
+        batch_size = max(1, -(-len(testing_ids) // (os.cpu_count() or 1)))  # one batch per worker and model
+        # the models and the logs are sent to each worker once (by the initializer), and each task is a batch of them
+        with ProcessPoolExecutor(initializer=init_acceptance_checker,
+                                 initargs=({technique: m_sys for technique, m_sys in model.items() if m_sys},
+                                           [testing_l_vectors[testing_id] for testing_id in testing_ids],
+                                           [negative_l_vectors[testing_id] for testing_id in testing_ids])) as executor:
+            futures = {executor.submit(acceptance_checker, technique, i, i + batch_size)
+                       for technique, m_sys in model.items() if m_sys
+                       for i in range(0, len(testing_ids), batch_size)}
 
             for future in concurrent.futures.as_completed(futures):
                 if future.result():
@@ -372,6 +439,7 @@ def main(seed: int = None, single_fold_no: int = None):
         logger.info(f'End one fold. [Time taken: {one_fold_time:.3f} sec]')
 
     print(f'{args.num_folds}-fold CV Summary: {args.system} ' + '-'*(29-len(args.system)))
+    results = []
     for technique in TECHNIQUES:
         if type(cv_results['recall'][technique]) != str:
             recall = cv_results['recall'][technique] / args.num_folds
@@ -383,34 +451,77 @@ def main(seed: int = None, single_fold_no: int = None):
             specificity = cv_results['specificity'][technique]
             print(f"{technique:8s}: recall={recall}, specificity={specificity}")
             logger.info(f"{technique:8s}: recall={recall}, specificity={specificity}")
-        save_cv_result(technique, args.system, args.num_logs, recall, specificity)
+        results.append((technique, args.system, args.num_logs, recall, specificity))
+    save_cv_results(results)
     print('-'*50+'\n')
     logger.info('run_k_folds_cv: ends without errors')
 
 
-def acceptance_checker(m_sys, technique: str, positive: list, negative: list) -> (str, int, int):
+# the PRINS model of the current fold, set in each worker by init_postprocess_worker()
+_postprocess_model = None
+
+
+def init_postprocess_worker(m_sys):
+    """
+    Set the model to be determinized by postprocess_worker() (multiprocessing worker initializer).
+
+    :param m_sys: system model in the form of NFA
+    """
+    global _postprocess_model
+    _postprocess_model = m_sys
+
+
+def postprocess_worker(determinize_technique: str):
+    """
+    Same as PRINS.postprocess() for the model given to init_postprocess_worker() (multiprocessing worker).
+
+    :param determinize_technique: determinization technique
+    :return: system model in the form of DFA, and the time taken
+    """
+    return PRINS.postprocess(_postprocess_model, determinize_technique=determinize_technique)
+
+
+# the models and the positive/negative logs of the current fold, set in each worker by init_acceptance_checker()
+_acceptance_models = {}
+_acceptance_positives = []
+_acceptance_negatives = []
+
+
+def init_acceptance_checker(models: dict, positives: list, negatives: list):
+    """
+    Set the models and the logs to be checked by acceptance_checker() (multiprocessing worker initializer).
+
+    :param models: models (technique -> model)
+    :param positives: a list of positive logs
+    :param negatives: a list of negative logs (in the same order as positives)
+    """
+    global _acceptance_models, _acceptance_positives, _acceptance_negatives
+    _acceptance_models = models
+    _acceptance_positives = positives
+    _acceptance_negatives = negatives
+
+
+def acceptance_checker(technique: str, start: int, end: int) -> (str, int, int):
     """
-    Check acceptance of positive and negative logs for the given model (multiprocessing worker).
+    Check acceptance of a batch of positive and negative logs for the given model (multiprocessing worker).
 
-    :param m_sys: a model
-    :param technique: a technique
-    :param positive: a positive log
-    :param negative: a negative log
-    :return:
+    :param technique: a technique (of the models given to init_acceptance_checker())
+    :param start: the index of the first log of the batch
+    :param end: the index after the last log of the batch
+    :return: technique, the number of accepted positive logs, and the number of rejected negative logs
     """
+    m_sys = _acceptance_models[technique]
+    positives = _acceptance_positives[start:end]
+    negatives = _acceptance_negatives[start:end]
     true_positive = 0
     true_negative = 0
 
     if isinstance(m_sys, NFA):
-        if m_sys.nfa_check_acceptance(positive):
-            true_positive = 1
-        if not m_sys.nfa_check_acceptance(negative):
-            true_negative = 1
+        true_positive = sum(1 for positive in positives if m_sys.nfa_check_acceptance(positive))
+        true_negative = sum(1 for negative in negatives if not m_sys.nfa_check_acceptance(negative))
     elif isinstance(m_sys, DFA):
-        if m_sys.dfa_check_acceptance(positive):
-            true_positive = 1
-        if not m_sys.dfa_check_acceptance(negative):
-            true_negative = 1
+        true_positive = int(m_sys.batch_check_acceptance(positives).sum())
+        true_negative = len(negatives) - int(m_sys.batch_check_acceptance(negatives).sum())
 
     return technique, true_positive, true_negative
 
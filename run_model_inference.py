@@ -23,25 +23,62 @@ SPDX-License-Identifier: GPL-3.0-or-later
 
 import path_PRINS
 import os
+import csv
 import time
 import subprocess
+from concurrent.futures.thread import ThreadPoolExecutor
 import pandas as pd
-from src.utils.common import convert_df_into_l_vectors, common_logger, common_arg_parser
+from src.utils.common import read_csv_into_l_vectors, common_logger, common_arg_parser
 from src.main.mint_helper import infer_model_by_mint
 from expr_config import *
 from src.main.PRINS import PRINS
+from src.automata.automata_utils import PDF_MAX_TRANSITIONS
 
 
-def run_MINT_sys(logger, timestamp, args, summary, system, duplicate_factor, logs_csv):
-    logs_df = pd.read_csv(logs_csv, dtype={'tid': str})  # to fix the datatype of tid as string
-    l_vectors = convert_df_into_l_vectors(logs_df, num_logs=args.num_logs, include_component=True)
+# determinization techniques run on m_sys (hybrid-0 == standard determinization)
+DET_TECHNIQUES = tuple(f'hybrid-{i}' for i in range(0, 11))
+# determinization technique always run (and timed) on m_sys, even when the determinization results are reused, as its
+# time is added to the inference time of PRINS in rq4_line()
+TIMED_DET_TECHNIQUE = 'hybrid-1'
+
+# logs_csv -> (modification time, l_vectors) of the last logs csv file read; see load_l_vectors()
+_l_vectors_memo = {}
+
+
+def load_l_vectors(logs_csv: str, num_logs=None) -> dict:
+    """
+    Read the logs csv file into l_vectors (with components) as read_csv_into_l_vectors() does, but reuse the l_vectors
+    of the last logs csv file read as long as it is not modified (e.g., in the repetitions and between MINT-SYS and
+    PRINS); the sampled logs (num_logs) are read every time.
+
+    :param logs_csv: structured logs (csv file)
+    :param num_logs: (optional) the number of logs to sample
+    :return: l_vectors (the log entries are copies, so the memoized l_vectors are never changed)
+    """
+    if num_logs:
+        return read_csv_into_l_vectors(logs_csv, include_component=True, cache_dir=L_VECTORS_CACHE_DIR,
+                                       num_logs=num_logs)
+
+    mtime = os.path.getmtime(logs_csv)
+    if logs_csv not in _l_vectors_memo or _l_vectors_memo[logs_csv][0] != mtime:
+        _l_vectors_memo.clear()  # only the last one is kept, as the logs csv files are read one after another
+        _l_vectors_memo[logs_csv] = mtime, read_csv_into_l_vectors(logs_csv, include_component=True,
+                                                                   cache_dir=L_VECTORS_CACHE_DIR)
+    return {log_id: [dict(e) for e in l_vector] for log_id, l_vector in _l_vectors_memo[logs_csv][1].items()}
+
+
+def run_MINT_sys(logger, timestamp, args, summary, system, duplicate_factor, logs_csv, pdf_executor=None):
+    # all logs (the same as the ones of PRINS) or the sampled ones if args.num_logs is given
+    l_vectors = load_l_vectors(logs_csv, num_logs=args.num_logs)
+    num_logs = len(l_vectors)
+    output_dir = os.path.join('output', system, f'{timestamp}_MINT-SYS')
     # tid_to_components = generate_map_from_tid_to_components(l_vectors)
 
     # check the error code from the previous run and skip this time if needed
     error = get_error_from_the_last_run(summary, 'MINT-SYS')
     if error:
         # do not actually run MINT considering the error occurred in previous configs
-        summary.append([system, 'MINT-SYS', len(l_vectors.keys()), duplicate_factor, error, pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
+        summary.append([system, 'MINT-SYS', num_logs, duplicate_factor, error, pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
         return
 
     start_time = time.time()
@@ -49,7 +86,7 @@ def run_MINT_sys(logger, timestamp, args, summary, system, duplicate_factor, log
         print(f'running MINT-SYS ...')
         model = infer_model_by_mint(component=system,
                                     l_vectors=l_vectors,
-                                    output_dir=os.path.join('output', system, f'{timestamp}_MINT-SYS'),
+                                    output_dir=output_dir,
                                     allow_non_det=True,  # meaning NFA is accepted as the output of MINT
                                     ignore_values=IGNORE_VALUES,
                                     timeout=MINT_TIMEOUT,
@@ -57,7 +94,7 @@ def run_MINT_sys(logger, timestamp, args, summary, system, duplicate_factor, log
         print(f'state={len(model.states)}, transitions={len(model.transitions)}')
         summary.append([system,
                         'MINT-SYS',
-                        len(l_vectors.keys()),
+                        num_logs,
                         duplicate_factor,
                         f'{time.time() - start_time:.3f}',
                         pd.NA,
@@ -67,21 +104,24 @@ def run_MINT_sys(logger, timestamp, args, summary, system, duplicate_factor, log
                         get_dfa_transition_size(model.transitions)])
         if SAVE_PDF:
             model.save_pdf(
-                output_dir=os.path.join('output', system, f'{timestamp}_MINT-SYS'),
+                output_dir=output_dir,
                 # label_dict=tid_to_components
+                executor=pdf_executor
             )
     except subprocess.TimeoutExpired:
         print(f'MINT-SYS timeout ({MINT_TIMEOUT} sec)\n')
         logger.info(f'MINT-SYS timeout ({MINT_TIMEOUT} sec)')
-        summary.append([system, 'MINT-SYS', len(l_vectors.keys()), duplicate_factor, 'timeout', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
+        summary.append([system, 'MINT-SYS', num_logs, duplicate_factor, 'timeout', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
     except subprocess.CalledProcessError:
         print(f'MINT-SYS crashes\n')
         logger.info(f'MINT-SYS crashes')
-        summary.append([system, 'MINT-SYS', len(l_vectors.keys()), duplicate_factor, 'crash', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
+        summary.append([system, 'MINT-SYS', num_logs, duplicate_factor, 'crash', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
 
 
-def run_PRINS(logger, timestamp, summary, system, duplicate_factor, logs_csv):
-    instance = PRINS(system, logs_csv, os.path.join('output', system, f'{timestamp}_PRINS'))
+def run_PRINS(logger, timestamp, summary, system, duplicate_factor, logs_csv, pdf_executor=None, det_cache=None):
+    output_dir = os.path.join('output', system, f'{timestamp}_PRINS')
+    instance = PRINS(system, load_l_vectors(logs_csv), output_dir)
+    num_logs = len(instance.l_vectors)
 
     print(f'\nrunning PRINS ...')
     # PRINS - main algorithm
@@ -93,19 +133,19 @@ def run_PRINS(logger, timestamp, summary, system, duplicate_factor, logs_csv):
         error = get_error_from_the_last_run(summary, technique)
         if error:
             # do not actually run PRINS considering the error occurred in previous sessions
-            summary.append([system, technique, len(instance.l_vectors.keys()), duplicate_factor, error, pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
+            summary.append([system, technique, num_logs, duplicate_factor, error, pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
             continue
 
         try:
             m_sys, p_time, i_time, s_time = instance.run(mint_timeout=MINT_TIMEOUT,
                                                          mint_param=MINT_PARAM,
                                                          ignore_values=IGNORE_VALUES,
-                                                         save_pdf=SAVE_PDF,
+                                                         save_pdf=False,  # saved once below
                                                          num_workers=num_workers)
 
             summary.append([system,
                             technique,
-                            len(instance.l_vectors.keys()),
+                            num_logs,
                             duplicate_factor,
                             f'{p_time + i_time + s_time:.3f}',
                             f'{p_time:.3f}',
@@ -117,58 +157,165 @@ def run_PRINS(logger, timestamp, summary, system, duplicate_factor, logs_csv):
         except subprocess.TimeoutExpired:
             print(f'PRINS (MINT-component) timeout ({MINT_TIMEOUT} sec)\n')
             logger.info(f'PRINS (MINT-component) timeout ({MINT_TIMEOUT} sec)')
-            summary.append([system, technique, len(instance.l_vectors.keys()), duplicate_factor, 'timeout', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
+            summary.append([system, technique, num_logs, duplicate_factor, 'timeout', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
         except subprocess.CalledProcessError:
             print(f'PRINS crashes due to MINT\n')
             logger.info(f'PRINS crashes due to MINT')
-            summary.append([system, technique, len(instance.l_vectors.keys()), duplicate_factor, 'crash', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
+            summary.append([system, technique, num_logs, duplicate_factor, 'crash', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
         except ValueError as e:
             print(f'PRINS crashes due to {e}\n')
             logger.info(f'PRINS crashes due to {e}')
-            summary.append([system, technique, len(instance.l_vectors.keys()), duplicate_factor, 'crash', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
+            summary.append([system, technique, num_logs, duplicate_factor, 'crash', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA])
 
     if m_sys:
+        # m_sys and the models of all the techniques are saved into the same pdf file, so only the last model that is
+        # not too large to be rendered (m_sys as in PRINS.run()) is kept; the others are not rendered at all
+        pdf_model = m_sys if len(m_sys.states) < 1000 and len(m_sys.transitions) <= PDF_MAX_TRANSITIONS else None
+
         # PRINS - determinization
-        det_techniques = []
-        for i in range(0, 11):  # hybrid-0 == standard determinization
-            det_techniques.append(f'hybrid-{i}')
-        for det_tech in det_techniques:
+        cached = det_cache.get(system) if det_cache is not None and duplicate_factor > 1 else None
+        reused = bool(cached) and cached[0] == model_structure(m_sys)
+        if reused:
+            # m_sys inferred from the duplicated logs is the same as for duplicate_factor=1, and so are the
+            # determinized models; the results of duplicate_factor=1 are reused instead of determinizing m_sys again,
+            # except for TIMED_DET_TECHNIQUE. The other determinization times are not measured (time_s is 'reused')
+            print(f'm_sys is the same as for duplicate_factor=1: determinization results are reused\n')
+            logger.info(f'm_sys is the same as for duplicate_factor=1: determinization results are reused')
+            if cached[2]:
+                pdf_model = cached[2]
+
+        det_rows = []
+        for i, det_tech in enumerate(DET_TECHNIQUES):  # one at a time, not in parallel, as the time taken is measured
+            if reused and det_tech != TIMED_DET_TECHNIQUE:
+                summary.append([system, det_tech, num_logs, duplicate_factor, 'reused'] + cached[1][i][5:])
+                continue
             dfa_sys, hybrid_det_time = PRINS.postprocess(m_sys, determinize_technique=det_tech)
-            summary.append([system,
-                            det_tech,
-                            len(instance.l_vectors.keys()),
-                            duplicate_factor,
-                            f'{hybrid_det_time:.3f}',
-                            pd.NA,
-                            pd.NA,
-                            pd.NA,
-                            len(dfa_sys.states),
-                            get_dfa_transition_size(dfa_sys.transitions)])
-            if SAVE_PDF:
-                dfa_sys.save_pdf(
-                    output_dir=os.path.join('output', system, f'{timestamp}_PRINS'),
-                    # label_dict=tid_to_components
-                )
-
-def save_summary(summary: list, timestamp: str) -> pd.DataFrame:
-    summary_df = pd.DataFrame(summary,
-                              columns=[
-                                  'system',
-                                  'technique',
-                                  'num_logs',
-                                  'duplicated',
-                                  'time_s',
-                                  'PR_time',
-                                  'IN_time',
-                                  'S_time',
-                                  'states',
-                                  'transitions'
-                              ])
-    summary_df.to_csv(os.path.join('output', f'summary_model_inference_{timestamp}.csv'), index=False)
-    return summary_df
-
-
-def get_error_from_the_last_run(summary: list, technique: str):
+            det_rows.append([system,
+                             det_tech,
+                             num_logs,
+                             duplicate_factor,
+                             f'{hybrid_det_time:.3f}',
+                             pd.NA,
+                             pd.NA,
+                             pd.NA,
+                             len(dfa_sys.states),
+                             get_dfa_transition_size(dfa_sys.transitions)])
+            summary.append(det_rows[-1])
+            if not reused and len(dfa_sys.transitions) <= PDF_MAX_TRANSITIONS:
+                pdf_model = dfa_sys
+
+        if det_cache is not None and duplicate_factor == 1:
+            det_cache[system] = (model_structure(m_sys), det_rows, pdf_model if pdf_model is not m_sys else None)
+
+        if SAVE_PDF and pdf_model:
+            pdf_model.save_pdf(
+                output_dir=output_dir,
+                # label_dict=tid_to_components
+                executor=pdf_executor
+            )
+
+
+def model_structure(model) -> tuple:
+    """
+    Return the structure of the given model, to check whether two models are the same.
+
+    :param model: model (NFA or DFA)
+    :return: (states, initial_state, accepting_states, transitions)
+    """
+    return model.states, model.initial_state, model.accepting_states, model.transitions
+
+
+SUMMARY_COLUMNS = [
+    'system',
+    'technique',
+    'num_logs',
+    'duplicated',
+    'time_s',
+    'PR_time',
+    'IN_time',
+    'S_time',
+    'states',
+    'transitions'
+]
+
+
+def summary_rows(rows: list) -> list:
+    # pd.NA is written as an empty field, as pandas does
+    return [['' if value is pd.NA else value for value in row] for row in rows]
+
+
+def save_summary(summary: list, timestamp: str):
+    with open(os.path.join('output', f'summary_model_inference_{timestamp}.csv'), 'w', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')  # as pandas does
+        writer.writerow(SUMMARY_COLUMNS)
+        writer.writerows(summary_rows(summary))
+
+
+def append_summary(summary: list, timestamp: str, start: int) -> int:
+    """
+    Append the rows of the summary from the given index to the summary csv file (checkpoint), instead of writing the
+    whole summary again as save_summary() does.
+
+    :param summary: the collection of the running history
+    :param timestamp: timestamp of the summary csv file
+    :param start: the number of rows already written (the header is written if 0)
+    :return: the number of rows written so far
+    """
+    with open(os.path.join('output', f'summary_model_inference_{timestamp}.csv'), 'a', newline='') as f:
+        writer = csv.writer(f, lineterminator='\n')  # as pandas does
+        if start == 0:
+            writer.writerow(SUMMARY_COLUMNS)
+        writer.writerows(summary_rows(summary[start:]))
+    return len(summary)
+
+
+def load_summary(timestamp: str):
+    """
+    Load the summary csv file (checkpoint) of a previous run, to resume the run.
+
+    :param timestamp: timestamp of the summary csv file
+    :return: the collection of the running history (the values are strings, and empty fields are pd.NA)
+    """
+    summary = Summary()
+    with open(os.path.join('output', f'summary_model_inference_{timestamp}.csv'), newline='') as f:
+        reader = csv.reader(f)
+        next(reader)  # header
+        for row in reader:
+            summary.append([pd.NA if value == '' else value for value in row])
+    return summary
+
+
+def count_runs(summary: list, system: str, technique: str, duplicate_factor: int) -> int:
+    """
+    Count the runs of the given technique in the summary.
+
+    :param summary: the collection of the running history
+    :param system: system name
+    :param technique: the target technique ('MINT-SYS' | 'PRINS-w1', the last row of run_PRINS() for each run)
+    :param duplicate_factor: duplication factor of the logs
+    :return: the number of the runs
+    """
+    return sum(1 for row in summary
+               if row[0] == system and row[1] == technique and str(row[3]) == str(duplicate_factor))
+
+
+class Summary(list):
+    """
+    The collection of the running history (the rows of the summary), which also keeps the last row of each technique.
+    The rows are stored as tuples, which are smaller than lists and cannot be changed once recorded.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.last_rows = {}
+
+    def append(self, row: list):
+        row = tuple(row)
+        super().append(row)
+        self.last_rows[row[1]] = row
+
+
+def get_error_from_the_last_run(summary: Summary, technique: str):
     """
     Return the error code from the last run of the given technique.
 
@@ -176,14 +323,9 @@ def get_error_from_the_last_run(summary: list, technique: str):
     :param technique: the target technique ('MINT-SYS' | 'PRINS')
     :return: error code ('timeout' | 'crash' | None)
     """
-    for i in reversed(range(len(summary))):
-        if technique == summary[i][1]:
-            if 'timeout' == summary[i][4]:
-                return 'timeout'
-            elif 'crash' == summary[i][4]:
-                return 'crash'
-            else:
-                return None
+    last_row = summary.last_rows.get(technique)
+    if last_row is not None and last_row[4] in ('timeout', 'crash'):
+        return last_row[4]
     return None
 
 
@@ -193,7 +335,22 @@ def main():
     # argument parsing & specify target systems
     args, systems = common_arg_parser(SYSTEMS, 'run_model_inference')
 
-    summary = []
+    # pdf files are rendered one at a time (in the order of submission, as the same file can be saved more than once)
+    # while the next models are being inferred
+    pdf_executor = ThreadPoolExecutor(max_workers=1) if SAVE_PDF and SAVE_PDF_IN_BACKGROUND else None
+
+    if args.resume:
+        # continue the summary csv file of the previous run, skipping the repetitions already done
+        timestamp = args.resume
+        summary = load_summary(timestamp)
+        print(f'Resume the run {timestamp} ({len(summary)} rows in the summary)')
+        logger.info(f'resume the run {timestamp} ({len(summary)} rows in the summary)')
+    else:
+        summary = Summary()
+    # system -> (structure of m_sys, determinization rows, model to render) for duplicate_factor=1, to be reused for
+    # the duplicated logs (only if --reuse_determinization is specified)
+    det_cache = {} if args.reuse_determinization else None
+    num_saved = len(summary)  # the number of rows of the summary already written to the csv file
     for system in systems:
         print('-' * 80)
         print(f'{system}')
@@ -203,7 +360,14 @@ def main():
 
         duplicate_range = [int(x) for x in args.duplicate_range.split(',')]
         for duplicate_factor in range(duplicate_range[0], duplicate_range[1]+1):
+            mint_sys_done = count_runs(summary, system, 'MINT-SYS', duplicate_factor)
+            prins_done = count_runs(summary, system, 'PRINS-w1', duplicate_factor)
             for r in range(args.repetitions):
+                run_mint_sys = not args.prins_only and r >= mint_sys_done
+                run_prins = not args.mint_sys_only and r >= prins_done
+                if not (run_mint_sys or run_prins):
+                    print(f'duplicate_factor={duplicate_factor}, repetition={r}: already done')
+                    continue
                 print(f'duplicate_factor={duplicate_factor}, repetition={r}')
 
                 # read logs
@@ -212,31 +376,46 @@ def main():
                 else:
                     logs_csv = os.path.join(DATASET, system, f'{system}_preprocessed_logs_dup{duplicate_factor}.csv')
                     if not os.path.isfile(logs_csv):
-                        # if duplicated logs are not yet generated, then generate duplicate logs
+                        # if duplicated logs are not yet generated, then generate duplicate logs (only the missing
+                        # ones up to duplicate_factor)
                         from dataset.duplicate_logs import duplicate_logs_for_system
-                        duplicate_logs_for_system(DATASET, system)
+                        duplicate_logs_for_system(DATASET, system, duplication_factor=duplicate_factor,
+                                                  skip_existing=True)
 
                 # run model inference approaches
-                if not args.prins_only:
+                if run_mint_sys:
                     # MINT-SYS
-                    run_MINT_sys(logger, timestamp, args, summary, system, duplicate_factor, logs_csv)
-                    save_summary(summary, timestamp)
+                    run_MINT_sys(logger, timestamp, args, summary, system, duplicate_factor, logs_csv, pdf_executor)
+                    num_saved = append_summary(summary, timestamp, num_saved)
 
-                if not args.mint_sys_only:
+                if run_prins:
                     # PRINS
-                    run_PRINS(logger, timestamp, summary, system, duplicate_factor, logs_csv)
-                    save_summary(summary, timestamp)
+                    run_PRINS(logger, timestamp, summary, system, duplicate_factor, logs_csv, pdf_executor, det_cache)
+                    num_saved = append_summary(summary, timestamp, num_saved)
+
+    if pdf_executor:
+        print('Waiting for the pdf files to be saved ...')
+        pdf_executor.shutdown()
 
     print('\n=== Model Inference Summary ===')
-    summary_df = save_summary(summary, timestamp)
-    print(summary_df)
+    save_summary(summary, timestamp)
+    print(pd.DataFrame(summary, columns=SUMMARY_COLUMNS))
     logger.info('run_model_inference: ends without errors')
 
 
 def get_dfa_transition_size(transitions: dict) -> int:
     unique_transitions = set()
-    for (src, word), dst in transitions.items():
-        unique_transitions.add((src, frozenset(dst)))
+    if transitions and isinstance(next(iter(transitions.values())), str):
+        # DFA: the destinations are state names shared by many transitions, so frozenset(dst) is computed once per state
+        dst_sets = {}
+        for (src, word), dst in transitions.items():
+            dst_set = dst_sets.get(dst)
+            if dst_set is None:
+                dst_set = dst_sets[dst] = frozenset(dst)
+            unique_transitions.add((src, dst_set))
+    else:
+        for (src, word), dst in transitions.items():
+            unique_transitions.add((src, frozenset(dst)))
     return len(unique_transitions)
 
 